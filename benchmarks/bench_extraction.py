@@ -0,0 +1,78 @@
+"""
+Compare HTML extraction backends over a corpus of saved pages.
+
+For every *.html file in the corpus directory, each backend is run several
+times; the table reports mean parse time, extracted characters and the
+estimated prompt tokens the extracted text would cost.
+
+Usage:
+    uv run python benchmarks/bench_extraction.py [CORPUS_DIR] [--repeat N]
+"""
+
+from __future__ import annotations
+
+import argparse
+import statistics
+import time
+from pathlib import Path
+
+from sparsemap.services.extraction import available_backends, extract_text
+from sparsemap.services.llm_utils import estimate_tokens
+
+DEFAULT_CORPUS = Path(__file__).parent / "corpus"
+
+
+def bench_page(html: bytes, backend: str, max_chars: int, repeat: int) -> dict:
+    timings = []
+    text = ""
+    for _ in range(repeat):
+        start = time.perf_counter()
+        text = extract_text(html, max_chars, backend=backend)
+        timings.append((time.perf_counter() - start) * 1000)
+    return {
+        "ms": statistics.mean(timings),
+        "chars": len(text),
+        "tokens": estimate_tokens(text),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("corpus", nargs="?", type=Path, default=DEFAULT_CORPUS)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--max-chars", type=int, default=8000)
+    parser.add_argument(
+        "--backends", nargs="+", default=available_backends(), metavar="NAME"
+    )
+    args = parser.parse_args()
+
+    pages = sorted(args.corpus.glob("*.html"))
+    if not pages:
+        raise SystemExit(f"No *.html files found in {args.corpus}")
+
+    header = f"{'page':<32} {'backend':<8} {'parse ms':>10} {'chars':>8} {'tokens':>8}"
+    print(header)
+    print("-" * len(header))
+
+    totals = {backend: {"ms": 0.0, "tokens": 0} for backend in args.backends}
+    for page in pages:
+        html = page.read_bytes()
+        for backend in args.backends:
+            result = bench_page(html, backend, args.max_chars, args.repeat)
+            totals[backend]["ms"] += result["ms"]
+            totals[backend]["tokens"] += result["tokens"]
+            print(
+                f"{page.name[:32]:<32} {backend:<8} {result['ms']:>10.2f} "
+                f"{result['chars']:>8} {result['tokens']:>8}"
+            )
+
+    print("-" * len(header))
+    for backend, total in totals.items():
+        print(
+            f"{'TOTAL':<32} {backend:<8} {total['ms']:>10.2f} "
+            f"{'':>8} {total['tokens']:>8}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,274 @@
+"""
+Load-test the API with a mixed workload and report per-endpoint latency.
+
+Concurrent closed-loop clients send a weighted mix of /api/analyze,
+/api/history, /api/recall, /api/export and /api/node-details requests.
+Each concurrency level runs for a fixed time. For every endpoint the
+report shows throughput, p50/p95/p99 latency and the error rate.
+
+By default the app runs in-process over ASGI and must use a provider that
+needs no network (LLM_PROVIDER=stub, or replay). The database is the one
+in DATABASE_URL: use a local Postgres, since /api/recall needs pgvector.
+With --url, an already running server is loaded over HTTP instead.
+
+Usage:
+    LLM_PROVIDER=stub STUB_LATENCY_MS=800 STUB_LATENCY_DISTRIBUTION=lognormal \\
+        uv run python benchmarks/loadtest.py --concurrency 1 4 16 --duration 30
+    uv run python benchmarks/loadtest.py --url http://localhost:8003 --json out.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import math
+import random
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, List, Optional
+
+import httpx
+
+DEFAULT_MIX = "analyze=2,history=3,recall=2,export=2,node-details=3"
+EXPORT_FORMATS = ("mermaid", "d2", "json", "markdown")
+WORDS = (
+    "graph embedding tokenizer latency cache schema index query vector "
+    "pipeline retry backoff throughput replica shard queue worker prompt "
+    "gradient transformer attention compiler runtime kernel memory"
+).split()
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an ascending list (0 if empty)"""
+    if not sorted_values:
+        return 0.0
+    rank = max(math.ceil(pct / 100 * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+
+def parse_mix(spec: str) -> Dict[str, int]:
+    mix = {}
+    for entry in spec.split(","):
+        name, _, weight = entry.partition("=")
+        if name.strip() not in WORKLOAD or not weight.strip().isdigit():
+            raise SystemExit(f"Invalid --mix entry: {entry!r}")
+        mix[name.strip()] = int(weight)
+    return mix
+
+
+class LoadState:
+    """Analyses created so far, shared by the clients to build requests"""
+
+    def __init__(self, seed: int):
+        self.random = random.Random(seed)
+        self.analyses: List[dict] = []  # {"id": int, "node_ids": [...]}
+        self.counter = 0
+
+    def text(self) -> str:
+        """A new text, so analyses are not answered from the duplicate cache"""
+        self.counter += 1
+        words = self.random.choices(WORDS, k=120)
+        return f"Load test document {self.counter} ({time.time_ns()}). " + " ".join(
+            words
+        )
+
+    def remember(self, body: dict) -> None:
+        if body.get("analysis_id") and body.get("data"):
+            node_ids = [node["id"] for node in body["data"].get("nodes", [])]
+            self.analyses.append({"id": body["analysis_id"], "node_ids": node_ids})
+
+    def pick_analysis(self) -> Optional[dict]:
+        return self.random.choice(self.analyses) if self.analyses else None
+
+
+async def _analyze(client: httpx.AsyncClient, state: LoadState) -> httpx.Response:
+    response = await client.post("/api/analyze", json={"texts": [state.text()]})
+    if response.status_code == 200:
+        state.remember(response.json())
+    return response
+
+
+async def _history(client: httpx.AsyncClient, state: LoadState) -> httpx.Response:
+    return await client.get("/api/history")
+
+
+async def _recall(client: httpx.AsyncClient, state: LoadState) -> httpx.Response:
+    query = " ".join(state.random.choices(WORDS, k=3))
+    return await client.get("/api/recall", params={"query": query, "top_k": 5})
+
+
+async def _export(client: httpx.AsyncClient, state: LoadState) -> httpx.Response:
+    analysis = state.pick_analysis()
+    return await client.get(
+        f"/api/export/{analysis['id']}",
+        params={"format": state.random.choice(EXPORT_FORMATS)},
+    )
+
+
+async def _node_details(client: httpx.AsyncClient, state: LoadState) -> httpx.Response:
+    analysis = state.pick_analysis()
+    return await client.post(
+        "/api/node-details",
+        json={
+            "analysis_id": analysis["id"],
+            "node_id": state.random.choice(analysis["node_ids"]),
+        },
+    )
+
+
+WORKLOAD = {
+    "analyze": _analyze,
+    "history": _history,
+    "recall": _recall,
+    "export": _export,
+    "node-details": _node_details,
+}
+# These need a stored analysis to request
+NEEDS_ANALYSIS = {"export", "node-details"}
+
+
+async def run_level(
+    client: httpx.AsyncClient,
+    state: LoadState,
+    mix: Dict[str, int],
+    concurrency: int,
+    duration: float,
+) -> dict:
+    """Run concurrency closed-loop clients for duration seconds"""
+    latencies: Dict[str, List[float]] = {name: [] for name in mix}
+    errors: Dict[str, int] = {name: 0 for name in mix}
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    deadline = time.perf_counter() + duration
+
+    async def client_loop() -> None:
+        while time.perf_counter() < deadline:
+            name = state.random.choices(names, weights)[0]
+            if name in NEEDS_ANALYSIS and not state.analyses:
+                name = "analyze"
+            started = time.perf_counter()
+            try:
+                response = await WORKLOAD[name](client, state)
+                failed = response.status_code >= 400
+            except httpx.HTTPError:
+                failed = True
+            latencies.setdefault(name, []).append(
+                (time.perf_counter() - started) * 1000
+            )
+            if failed:
+                errors[name] = errors.get(name, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client_loop() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    endpoints = {}
+    for name, values in latencies.items():
+        if not values:
+            continue
+        values.sort()
+        endpoints[name] = {
+            "requests": len(values),
+            "rps": len(values) / elapsed,
+            "p50_ms": percentile(values, 50),
+            "p95_ms": percentile(values, 95),
+            "p99_ms": percentile(values, 99),
+            "error_rate": errors.get(name, 0) / len(values),
+        }
+    total = sum(endpoint["requests"] for endpoint in endpoints.values())
+    return {
+        "concurrency": concurrency,
+        "seconds": elapsed,
+        "requests": total,
+        "rps": total / elapsed,
+        "endpoints": endpoints,
+    }
+
+
+def format_level(level: dict) -> str:
+    header = (
+        f"{'endpoint':<14} {'requests':>9} {'req/s':>8} {'p50 ms':>9} "
+        f"{'p95 ms':>9} {'p99 ms':>9} {'errors':>7}"
+    )
+    lines = [
+        f"\nconcurrency {level['concurrency']}: {level['requests']} requests in "
+        f"{level['seconds']:.1f}s ({level['rps']:.1f} req/s)",
+        header,
+        "-" * len(header),
+    ]
+    for name, stats in sorted(level["endpoints"].items()):
+        lines.append(
+            f"{name:<14} {stats['requests']:>9} {stats['rps']:>8.2f} "
+            f"{stats['p50_ms']:>9.1f} {stats['p95_ms']:>9.1f} "
+            f"{stats['p99_ms']:>9.1f} {stats['error_rate']:>6.1%}"
+        )
+    return "\n".join(lines)
+
+
+@asynccontextmanager
+async def open_client(url: Optional[str]) -> AsyncIterator[httpx.AsyncClient]:
+    timeout = httpx.Timeout(300.0)
+    if url:
+        async with httpx.AsyncClient(base_url=url, timeout=timeout) as client:
+            yield client
+        return
+
+    from sparsemap.api.app import create_app
+    from sparsemap.core.config import get_settings
+
+    provider = get_settings().llm_provider.lower()
+    if provider not in ("stub", "replay"):
+        raise SystemExit(
+            f"LLM_PROVIDER={provider} would call a real API; set LLM_PROVIDER=stub "
+            "(or replay) for in-process load tests, or use --url"
+        )
+    app = create_app()
+    async with app.router.lifespan_context(app):
+        # Errors become 500 responses, as they would under uvicorn
+        transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://loadtest", timeout=timeout
+        ) as client:
+            yield client
+
+
+async def run(args: argparse.Namespace) -> List[dict]:
+    mix = parse_mix(args.mix)
+    state = LoadState(args.seed)
+    levels = []
+    async with open_client(args.url) as client:
+        # Stored analyses for export and node-details
+        for _ in range(args.warmup):
+            await _analyze(client, state)
+        for concurrency in args.concurrency:
+            level = await run_level(client, state, mix, concurrency, args.duration)
+            print(format_level(level), flush=True)
+            levels.append(level)
+    return levels
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--url", help="Load a running server instead of in-process")
+    parser.add_argument(
+        "--concurrency", type=int, nargs="+", default=[1, 4, 16], metavar="N"
+    )
+    parser.add_argument(
+        "--duration", type=float, default=30.0, help="Seconds per concurrency level"
+    )
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"Default: {DEFAULT_MIX}")
+    parser.add_argument(
+        "--warmup", type=int, default=3, help="Analyses created before measuring"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", type=argparse.FileType("w"), help="Write the report")
+    args = parser.parse_args()
+
+    levels = asyncio.run(run(args))
+    if args.json:
+        json.dump({"mix": parse_mix(args.mix), "levels": levels}, args.json, indent=2)
+
+
+if __name__ == "__main__":
+    main()
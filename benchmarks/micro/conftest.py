@@ -0,0 +1,71 @@
+"""Inputs for the micro-benchmarks, built once and shaped like real LLM output."""
+
+from __future__ import annotations
+
+import json
+import random
+
+import pytest
+
+from sparsemap.domain.models import Graph
+
+GRAPH_SIZES = [10, 100, 1000, 10000]
+NODE_TYPES = ["main", "dependency", "suggested_best_practice"]
+EDGE_TYPES = ["depends_on", "references", "implements", "supports"]
+
+
+def graph_payload(size: int, seed: int = 0) -> dict:
+    """A graph dict of the given node count, as a provider would return it"""
+    rng = random.Random(seed)
+    nodes = [
+        {
+            "id": f"n{i}",
+            "label": f'Concept {i}: "quoted" [brackets] and 中文标签',
+            "type": rng.choice(NODE_TYPES),
+            "priority": "critical" if i % 3 else "optional",
+            "reason": "Needed because the surrounding material depends on it. " * 2,
+            "description": f"Description of concept {i}.\nSecond line with `code`.",
+            "source": f"text{i % 4 + 1}",
+            "level": i % 3,
+            "expandable": i % 2 == 0,
+            "parent_id": f"n{i // 2}" if i % 3 == 2 else None,
+        }
+        for i in range(size)
+    ]
+    edges = [
+        {
+            "source": f"n{rng.randrange(i)}",
+            "target": f"n{i}",
+            "type": rng.choice(EDGE_TYPES),
+            "reason": f"Concept {i} builds on an earlier one",
+        }
+        for i in range(1, size)
+    ]
+    return {"nodes": nodes, "edges": edges, "summary": f"A graph of {size} concepts"}
+
+
+def malformed_response(size: int) -> str:
+    """
+    A fenced response with the defects repair_json handles
+
+    Trailing commas and raw newlines inside string values, wrapped in prose
+    and a ```json block.
+    """
+    payload = json.dumps(graph_payload(size), ensure_ascii=False, indent=2)
+    payload = payload.replace("\\n", "\n").replace('"\n    }', '",\n    }')
+    return f"Here is the knowledge graph:\n```json\n{payload}\n```\nLet me know!"
+
+
+@pytest.fixture(scope="session")
+def malformed() -> dict:
+    return {size: malformed_response(size) for size in (10, 100)}
+
+
+@pytest.fixture(scope="session")
+def payloads() -> dict:
+    return {size: graph_payload(size) for size in GRAPH_SIZES}
+
+
+@pytest.fixture(scope="session")
+def graphs(payloads) -> dict:
+    return {size: Graph.model_validate(payload) for size, payload in payloads.items()}
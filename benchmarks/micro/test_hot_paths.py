@@ -0,0 +1,66 @@
+"""
+Micro-benchmarks of the CPU-bound hot paths: JSON repair, graph validation,
+exporters and the small helpers run once per node or analysis.
+"""
+
+from __future__ import annotations
+
+import pytest
+
+from sparsemap.domain.models import Graph
+from sparsemap.services.embedding import generate_node_text
+from sparsemap.services.exporter import ExportFormat, export_graph
+from sparsemap.services.llm_utils import (
+    escape_newlines_in_strings,
+    extract_json,
+    repair_json,
+)
+from sparsemap.services.repository import extract_title
+
+from conftest import GRAPH_SIZES
+
+
+@pytest.mark.parametrize("size", [10, 100])
+class TestJsonRepair:
+    def test_extract_json(self, benchmark, malformed, size):
+        result = benchmark(extract_json, malformed[size])
+        assert result.startswith("{")
+
+    def test_escape_newlines_in_strings(self, benchmark, malformed, size):
+        payload = extract_json(malformed[size])
+        result = benchmark(escape_newlines_in_strings, payload)
+        assert "\n" in result
+
+    def test_repair_json(self, benchmark, malformed, size):
+        payload = extract_json(malformed[size])
+        result = benchmark(repair_json, payload)
+        assert len(result["nodes"]) == size
+
+
+@pytest.mark.parametrize("size", GRAPH_SIZES)
+def test_graph_model_validate(benchmark, payloads, size):
+    graph = benchmark(Graph.model_validate, payloads[size])
+    assert len(graph.nodes) == size
+
+
+@pytest.mark.parametrize("size", [100, 1000])
+@pytest.mark.parametrize("format", list(ExportFormat), ids=lambda f: f.value)
+def test_export_graph(benchmark, graphs, format, size):
+    result = benchmark(export_graph, graphs[size], format)
+    assert result
+
+
+def test_generate_node_text(benchmark, graphs):
+    nodes = graphs[1000].nodes
+    texts = benchmark(lambda: [generate_node_text(node) for node in nodes])
+    assert len(texts) == len(nodes)
+
+
+@pytest.mark.parametrize("source", ["url", "graph", "text"])
+def test_extract_title(benchmark, graphs, source):
+    kwargs = {
+        "url": {"url": "https://example.com/docs/guide/getting-started"},
+        "graph": {"graph": graphs[10]},
+        "text": {"text": "A long pasted article body. " * 400},
+    }[source]
+    assert benchmark(extract_title, **kwargs) != "Untitled"
@@ -0,0 +1,58 @@
+"""add_fetch_cache_and_content_hash
+
+Revision ID: 3f9c2a7d1b64
+Revises: 0e7ab7b15f5e
+Create Date: 2026-10-19 09:12:41.503218
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+
+# revision identifiers, used by Alembic.
+revision: str = "3f9c2a7d1b64"
+down_revision: Union[str, Sequence[str], None] = "0e7ab7b15f5e"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "fetch_cache",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("url_hash", sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column("url", sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column("etag", sqlmodel.sql.sqltypes.AutoString(), nullable=True),
+        sa.Column("last_modified", sqlmodel.sql.sqltypes.AutoString(), nullable=True),
+        sa.Column("content_hash", sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column("text", sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column("fetched_at", sa.DateTime(), nullable=False),
+        sa.Column("validated_at", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        op.f("ix_fetch_cache_url_hash"), "fetch_cache", ["url_hash"], unique=True
+    )
+
+    op.add_column(
+        "analysisresult", sa.Column("content_hash", sa.String(), nullable=True)
+    )
+    op.create_index(
+        op.f("ix_analysisresult_content_hash"),
+        "analysisresult",
+        ["content_hash"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f("ix_analysisresult_content_hash"), table_name="analysisresult")
+    op.drop_column("analysisresult", "content_hash")
+    op.drop_index(op.f("ix_fetch_cache_url_hash"), table_name="fetch_cache")
+    op.drop_table("fetch_cache")
@@ -0,0 +1,31 @@
+"""add_source_text_to_analysisresult
+
+Revision ID: 8b1e4d0c5a29
+Revises: 3f9c2a7d1b64
+Create Date: 2026-10-19 11:02:17.318842
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "8b1e4d0c5a29"
+down_revision: Union[str, Sequence[str], None] = "3f9c2a7d1b64"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column(
+        "analysisresult", sa.Column("source_text", sa.String(), nullable=True)
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column("analysisresult", "source_text")
@@ -0,0 +1,31 @@
+"""add_heartbeat_to_analysis_job
+
+Revision ID: b7d3f1a9c642
+Revises: 9a4c2e7f1b58
+Create Date: 2026-10-19 22:10:37.281544
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "b7d3f1a9c642"
+down_revision: Union[str, Sequence[str], None] = "9a4c2e7f1b58"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column(
+        "analysis_job", sa.Column("heartbeat_at", sa.DateTime(), nullable=True)
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column("analysis_job", "heartbeat_at")
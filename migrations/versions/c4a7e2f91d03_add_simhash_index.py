@@ -0,0 +1,51 @@
+"""add_simhash_index
+
+Revision ID: c4a7e2f91d03
+Revises: 8b1e4d0c5a29
+Create Date: 2026-10-19 13:40:05.127354
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "c4a7e2f91d03"
+down_revision: Union[str, Sequence[str], None] = "8b1e4d0c5a29"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column(
+        "analysisresult", sa.Column("simhash", sa.BigInteger(), nullable=True)
+    )
+    op.create_table(
+        "simhash_band",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("analysis_id", sa.Integer(), nullable=False),
+        sa.Column("band", sa.Integer(), nullable=False),
+        sa.Column("value", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        op.f("ix_simhash_band_analysis_id"),
+        "simhash_band",
+        ["analysis_id"],
+        unique=False,
+    )
+    op.create_index(
+        "ix_simhash_band_band_value", "simhash_band", ["band", "value"], unique=False
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_simhash_band_band_value", table_name="simhash_band")
+    op.drop_index(op.f("ix_simhash_band_analysis_id"), table_name="simhash_band")
+    op.drop_table("simhash_band")
+    op.drop_column("analysisresult", "simhash")
@@ -0,0 +1,40 @@
+"""rebuild_simhash_bands
+
+Revision ID: d8e2a5c7f310
+Revises: b7d3f1a9c642
+Create Date: 2026-10-20 10:12:48.503217
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "d8e2a5c7f310"
+down_revision: Union[str, Sequence[str], None] = "b7d3f1a9c642"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _rebuild_bands(bands: int, bits: int) -> None:
+    """Re-split the stored fingerprints into bands of the given width"""
+    op.execute("DELETE FROM simhash_band")
+    op.execute(
+        "INSERT INTO simhash_band (analysis_id, band, value) "
+        f"SELECT a.id, b.band, (a.simhash >> (b.band * {bits})) & {(1 << bits) - 1} "
+        f"FROM analysisresult a CROSS JOIN generate_series(0, {bands - 1}) AS b(band) "
+        "WHERE a.simhash IS NOT NULL"
+    )
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # 4 bands of 16 bits -> 8 bands of 8 bits
+    _rebuild_bands(8, 8)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    _rebuild_bands(4, 16)
@@ -0,0 +1,66 @@
+"""add_node_details_and_expansion
+
+Revision ID: e1b6c93d7a40
+Revises: 5d2f8a3c9e17
+Create Date: 2026-10-19 17:12:31.406215
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+
+# revision identifiers, used by Alembic.
+revision: str = "e1b6c93d7a40"
+down_revision: Union[str, Sequence[str], None] = "5d2f8a3c9e17"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "node_details",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("analysis_id", sa.Integer(), nullable=False),
+        sa.Column("node_id", sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column("node_label", sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column("details", sa.JSON(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("analysis_id", "node_id"),
+    )
+    op.create_index(
+        op.f("ix_node_details_analysis_id"),
+        "node_details",
+        ["analysis_id"],
+        unique=False,
+    )
+    op.create_table(
+        "node_expansion",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("analysis_id", sa.Integer(), nullable=False),
+        sa.Column("node_id", sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column("node_label", sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column("expansion", sa.JSON(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("analysis_id", "node_id"),
+    )
+    op.create_index(
+        op.f("ix_node_expansion_analysis_id"),
+        "node_expansion",
+        ["analysis_id"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f("ix_node_expansion_analysis_id"), table_name="node_expansion")
+    op.drop_table("node_expansion")
+    op.drop_index(op.f("ix_node_details_analysis_id"), table_name="node_details")
+    op.drop_table("node_details")
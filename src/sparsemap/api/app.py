@@ -1,17 +1,84 @@
+import time
+from contextlib import asynccontextmanager
 from pathlib import Path
+from typing import Optional
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import FileResponse
 from fastapi.staticfiles import StaticFiles
+from sqlalchemy.pool import QueuePool
+from starlette.routing import Match
 
+from sparsemap.core.config import get_settings
 from sparsemap.core.logging import configure_logging
+from sparsemap.core.metrics import observe_request, register_gauge
 from sparsemap.api.routes.analyze import router as analyze_router
+from sparsemap.api.routes.jobs import router as jobs_router
+from sparsemap.api.routes.metrics import prometheus_router
+from sparsemap.api.routes.metrics import router as metrics_router
+from sparsemap.infra.db import get_engine
+from sparsemap.services.extractor import extraction_pending, shutdown_extraction_pool
+from sparsemap.services.jobs import get_job_runner, start_job_runner, stop_job_runner
+from sparsemap.services.usage import (
+    llm_endpoint,
+    start_usage_recording,
+    stop_usage_recording,
+)
+
+
+def _register_gauges(engine) -> None:
+    pool = engine.pool
+    # SQLite pools do not count their connections
+    if isinstance(pool, QueuePool):
+        register_gauge(
+            "sparsemap_db_pool_size", "Connections the pool keeps open", pool.size
+        )
+        register_gauge(
+            "sparsemap_db_pool_checked_out",
+            "Connections currently in use",
+            pool.checkedout,
+        )
+        register_gauge(
+            "sparsemap_db_pool_overflow",
+            "Connections open beyond the pool size",
+            lambda: max(pool.overflow(), 0),
+        )
+    register_gauge(
+        "sparsemap_job_queue_depth",
+        "Analysis jobs waiting for a worker",
+        lambda: get_job_runner().queued if get_job_runner() else 0,
+    )
+    register_gauge(
+        "sparsemap_extraction_pending",
+        "Pages waiting for or undergoing HTML extraction in the pool",
+        extraction_pending,
+    )
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    _register_gauges(get_engine())
+    start_usage_recording(get_engine())
+    await start_job_runner(get_engine(), get_settings().job_workers)
+    yield
+    await stop_job_runner()
+    stop_usage_recording()
+    shutdown_extraction_pool()
+
+
+def _route_path(request: Request) -> Optional[str]:
+    """Route template of a request, e.g. /api/analysis/{analysis_id}"""
+    for route in request.app.router.routes:
+        match, _ = route.matches(request.scope)
+        if match == Match.FULL:
+            return getattr(route, "path", None)
+    return None
 
 
 def create_app() -> FastAPI:
     configure_logging()
-    app = FastAPI(title="SparseMap API")
+    app = FastAPI(title="SparseMap API", lifespan=lifespan)
 
     # Enable CORS for development
     app.add_middleware(
@@ -22,6 +89,26 @@ def create_app() -> FastAPI:
         allow_headers=["*"],
     )
 
+    @app.middleware("http")
+    async def instrument_requests(request: Request, call_next):
+        path = _route_path(request)
+        start = time.perf_counter()
+        status = 500
+        try:
+            # LLM calls made while handling the request count towards its route
+            with llm_endpoint(f"{request.method} {path or request.url.path}"):
+                response = await call_next(request)
+            status = response.status_code
+            return response
+        finally:
+            # Unmatched paths share one label so scanners cannot add series
+            observe_request(
+                request.method,
+                path or "unmatched",
+                status,
+                time.perf_counter() - start,
+            )
+
     static_dir = Path(__file__).resolve().parents[3] / "static"
     if static_dir.exists():
         app.mount("/static", StaticFiles(directory=str(static_dir)), name="static")
@@ -36,4 +123,7 @@ def create_app() -> FastAPI:
             return {"status": "running"}
 
     app.include_router(analyze_router, prefix="/api")
+    app.include_router(jobs_router, prefix="/api")
+    app.include_router(metrics_router, prefix="/api")
+    app.include_router(prometheus_router)
     return app
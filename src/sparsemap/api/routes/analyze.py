@@ -1,15 +1,18 @@
 from __future__ import annotations
 
+import asyncio
 from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, Query, BackgroundTasks
-from fastapi.responses import PlainTextResponse
+from fastapi import APIRouter, Depends, HTTPException, Query, BackgroundTasks, Response
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 from sqlmodel import Session
 
 from sparsemap.domain.models import (
     AnalyzeRequest,
     AnalyzeResponse,
+    BatchAnalyzeRequest,
+    BatchAnalyzeResponse,
     Graph,
     Node,
     Edge,
@@ -18,6 +21,9 @@ from sparsemap.domain.models import (
     EdgeType,
     NodeDetails,
     DetailsRequest,
+    BatchDetailsRequest,
+    BatchDetailsResponse,
+    NodeDetailsResult,
     URLInput,
     HistoryListResponse,
     IntegrateConceptRequest,
@@ -27,26 +33,50 @@ from sparsemap.domain.models import (
     LinkedEdge,
     ExpandNodeRequest,
     ExpandNodeResponse,
-    ExpandedNodeData,
+    ExpandNodesRequest,
+    ExpandNodesResponse,
+    NodeContentResponse,
+    RefreshRequest,
+    RefreshResponse,
 )
+from sparsemap.core.config import get_settings
 from sparsemap.infra.db import get_session
-from sparsemap.services.extractor import fetch_url_content, hash_url
+from sparsemap.services.extractor import (
+    fetch_page,
+    fetch_url_content,
+    hash_content,
+    url_cache_key,
+)
+from sparsemap.services.expansion import expand_tree
+from sparsemap.services.graph_context import describe_node, find_node
 from sparsemap.services.exporter import ExportFormat, export_graph, get_mime_type
+from sparsemap.services.analysis import refresh_record, run_analysis, run_batch
 from sparsemap.services.llm import (
     analyze_contents,
     generate_node_details,
+    generate_node_details_batch,
     integrate_concept,
     expand_node,
 )
 from sparsemap.services.repository import (
     get_analysis_by_hash,
     get_analysis_by_id,
+    get_fetch_cache,
     save_analysis,
+    save_fetch_cache,
+    update_analysis_graph,
     list_analyses,
     count_analyses,
     delete_analysis,
+    extract_title,
+    get_node_details as get_stored_node_details,
+    get_node_content,
+    get_node_expansion,
+    save_node_details,
+    save_node_expansion,
 )
 from sparsemap.services.embedding import (
+    get_embeddings_for_analysis,
     store_node_embeddings,
     search_similar_nodes,
     has_embeddings,
@@ -83,95 +113,160 @@ class EmbedResponse(BaseModel):
     count: int
 
 
-def _extract_title(url: str = None, text: str = None, graph: Graph = None) -> str:
-    """Extract a meaningful title from URL, text, or graph summary"""
-    if url:
-        # Extract domain or path from URL
-        from urllib.parse import urlparse
-
-        parsed = urlparse(url)
-        path = parsed.path.strip("/")
-        if path:
-            # Use last path segment
-            return path.split("/")[-1][:50] or parsed.netloc
-        return parsed.netloc
-    if graph and graph.summary:
-        # Use first 50 chars of summary
-        return graph.summary[:50] + ("..." if len(graph.summary) > 50 else "")
-    if text:
-        # Use first 50 chars of text
-        clean = text.strip()[:50]
-        return clean + ("..." if len(text) > 50 else "")
-    return "Untitled"
-
-
 @router.post("/analyze", response_model=AnalyzeResponse)
 async def analyze(
     request: AnalyzeRequest,
     background_tasks: BackgroundTasks,
+    response: Response,
     session: Session = Depends(get_session),
 ) -> AnalyzeResponse:
-    contents = []
-    sources = []
+    return await run_analysis(session, request, background_tasks, response=response)
 
-    if not request.urls and not request.texts:
+
+@router.post("/analyze/batch", response_model=BatchAnalyzeResponse)
+async def analyze_batch(
+    request: BatchAnalyzeRequest,
+    background_tasks: BackgroundTasks,
+    session: Session = Depends(get_session),
+):
+    """
+    Analyze many sources independently, one graph per source.
+    With "stream": true, results are sent as NDJSON lines as they complete.
+    """
+    total = len(request.urls) + len(request.texts)
+    if not total:
         raise HTTPException(status_code=400, detail="至少提供一个 URL 或文本。")
+    max_items = get_settings().batch_max_items
+    if total > max_items:
+        raise HTTPException(
+            status_code=400, detail=f"单次批量最多支持 {max_items} 个来源。"
+        )
+
+    results = run_batch(session.get_bind(), request, background_tasks)
+    if request.stream:
+
+        async def lines():
+            async for result in results:
+                yield result.model_dump_json() + "\n"
 
-    for idx, url in enumerate(request.urls, start=1):
-        url_hash = hash_url(url)
-        cached = get_analysis_by_hash(session, url_hash)
-        if cached and len(request.urls) == 1 and not request.texts:
-            graph = Graph.model_validate(cached.graph_data)
-            return AnalyzeResponse(success=True, data=graph, sources=[f"url{idx}"])
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+    collected = sorted([result async for result in results], key=lambda r: r.index)
+    succeeded = sum(result.success for result in collected)
+    return BatchAnalyzeResponse(
+        success=succeeded > 0,
+        results=collected,
+        succeeded=succeeded,
+        failed=len(collected) - succeeded,
+    )
+
+
+@router.post("/node-details", response_model=NodeDetails)
+async def get_node_details(
+    request: DetailsRequest, session: Session = Depends(get_session)
+) -> NodeDetails:
+    """
+    Explain a node in depth.
+    For nodes of a saved analysis (analysis_id and node_id given) the label
+    may be omitted and the context is built from the stored graph; their
+    details are stored, and answered from storage the next time.
+    """
+    record = (
+        get_analysis_by_id(session, request.analysis_id)
+        if request.analysis_id is not None and request.node_id
+        else None
+    )
+    graph = Graph.model_validate(record.graph_data) if record else None
+    node = find_node(graph, request.node_id) if graph else None
 
-        text, _ = await fetch_url_content(url)
-        contents.append({"source": f"url{idx}", "text": text})
-        sources.append(f"url{idx}")
+    label = request.node_label or (node.label if node else "")
+    if not label.strip():
+        raise HTTPException(status_code=400, detail="节点标签不能为空")
 
-    for idx, text in enumerate(request.texts, start=1):
-        contents.append({"source": f"text{idx}", "text": text})
-        sources.append(f"text{idx}")
+    if record:
+        stored = get_stored_node_details(session, record.id, request.node_id, label)
+        if stored:
+            return stored
 
+    context = (describe_node(graph, request.node_id, label) if graph else None) or (
+        request.node_context or request.node_description or label
+    )
     try:
-        graph = analyze_contents(contents)
-    except ValueError as exc:
+        details = generate_node_details(label, context)
+    except Exception as exc:
         raise HTTPException(status_code=400, detail=str(exc)) from exc
 
-    # Save with metadata
-    for url in request.urls:
-        url_hash = hash_url(url)
-        if not get_analysis_by_hash(session, url_hash):
-            title = _extract_title(url=url, graph=graph)
-            record = save_analysis(
-                session,
-                url_hash,
-                graph,
-                title=title,
-                original_url=url,
-                source_type="url",
-            )
-            background_tasks.add_task(store_node_embeddings, session, record.id, graph)
-
-    for text in request.texts:
-        text_hash = hash_url(text)
-        if not get_analysis_by_hash(session, text_hash):
-            title = _extract_title(text=text, graph=graph)
-            record = save_analysis(
-                session, text_hash, graph, title=title, source_type="text"
-            )
-            background_tasks.add_task(store_node_embeddings, session, record.id, graph)
+    if record:
+        save_node_details(session, record.id, request.node_id, label, details)
+    return details
 
-    return AnalyzeResponse(success=True, data=graph, sources=sources)
 
+@router.post("/node-details/batch", response_model=BatchDetailsResponse)
+async def get_node_details_batch(
+    request: BatchDetailsRequest, session: Session = Depends(get_session)
+) -> BatchDetailsResponse:
+    """
+    Generate details for many nodes at once.
+    Nodes are grouped into few LLM calls; a node that fails reports an error
+    without failing the others. With analysis_id, contexts are built from
+    the stored graph, details are stored, and nodes with stored details are
+    not generated again.
+    """
+    if not request.nodes:
+        raise HTTPException(status_code=400, detail="至少提供一个节点。")
 
-@router.post("/node-details", response_model=NodeDetails)
-async def get_node_details(request: DetailsRequest) -> NodeDetails:
+    record = (
+        get_analysis_by_id(session, request.analysis_id)
+        if request.analysis_id is not None
+        else None
+    )
+    analysis_id = record.id if record else None
+    graph = Graph.model_validate(record.graph_data) if record else None
+
+    found = {}
+    if analysis_id is not None:
+        for node in request.nodes:
+            stored = get_stored_node_details(
+                session, analysis_id, node.node_id, node.node_label
+            )
+            if stored:
+                found[node.node_id] = stored
+
+    missing = [node for node in request.nodes if node.node_id not in found]
+    nodes = [
+        {
+            "label": node.node_label,
+            "context": (
+                describe_node(graph, node.node_id, node.node_label) if graph else None
+            )
+            or node.node_context
+            or node.node_description
+            or node.node_label,
+        }
+        for node in missing
+    ]
     try:
-        context = request.node_context or request.node_description or request.node_label
-        return generate_node_details(request.node_label, context)
-    except Exception as exc:
+        generated = (
+            await asyncio.to_thread(generate_node_details_batch, nodes) if nodes else []
+        )
+    except ValueError as exc:
         raise HTTPException(status_code=400, detail=str(exc)) from exc
 
+    for node, item in zip(missing, generated):
+        found[node.node_id] = item
+        if analysis_id is not None and isinstance(item, NodeDetails):
+            save_node_details(session, analysis_id, node.node_id, node.node_label, item)
+
+    results = [
+        NodeDetailsResult(node_id=node.node_id, details=found[node.node_id])
+        if isinstance(found[node.node_id], NodeDetails)
+        else NodeDetailsResult(node_id=node.node_id, error=found[node.node_id])
+        for node in request.nodes
+    ]
+    return BatchDetailsResponse(
+        success=any(result.details for result in results), results=results
+    )
+
 
 @router.get("/history", response_model=HistoryListResponse)
 async def get_history(
@@ -195,6 +290,22 @@ async def get_history_item(
     return AnalyzeResponse(success=True, data=graph, sources=[record.source_type])
 
 
+@router.get("/analysis/{analysis_id}/node-content", response_model=NodeContentResponse)
+async def get_analysis_node_content(
+    analysis_id: int, session: Session = Depends(get_session)
+) -> NodeContentResponse:
+    """
+    Stored details and expansions of the nodes of an analysis, keyed by node ID.
+    Lets a reopened analysis show earlier deep-dives without new LLM calls.
+    """
+    record = get_analysis_by_id(session, analysis_id)
+    if not record:
+        raise HTTPException(status_code=404, detail="Analysis not found")
+    graph = Graph.model_validate(record.graph_data)
+    details, expansions = get_node_content(session, analysis_id, graph)
+    return NodeContentResponse(success=True, details=details, expansions=expansions)
+
+
 @router.delete("/history/{analysis_id}")
 async def delete_history_item(
     analysis_id: int, session: Session = Depends(get_session)
@@ -370,7 +481,7 @@ async def add_url(
 ) -> AnalyzeResponse:
     """Add a new URL to existing canvas."""
     try:
-        text, _ = await fetch_url_content(request.url)
+        text, url_hash = await fetch_url_content(request.url)
     except HTTPException:
         raise
     except Exception as exc:
@@ -385,9 +496,8 @@ async def add_url(
     except ValueError as exc:
         raise HTTPException(status_code=400, detail=str(exc)) from exc
 
-    url_hash = hash_url(request.url)
     if not get_analysis_by_hash(session, url_hash):
-        title = _extract_title(url=request.url, graph=graph)
+        title = extract_title(url=request.url, graph=graph)
         record = save_analysis(
             session,
             url_hash,
@@ -395,6 +505,8 @@ async def add_url(
             title=title,
             original_url=request.url,
             source_type="url",
+            content_hash=hash_content(text),
+            source_text=text,
         )
         background_tasks.add_task(store_node_embeddings, session, record.id, graph)
 
@@ -403,11 +515,13 @@ async def add_url(
 
 @router.post("/integrate-concept", response_model=IntegrateConceptResponse)
 async def integrate_concept_endpoint(
-    request: IntegrateConceptRequest,
+    request: IntegrateConceptRequest, session: Session = Depends(get_session)
 ) -> IntegrateConceptResponse:
     """
     Integrate a new concept into the existing knowledge graph.
     Uses AI to analyze relationships between the new concept and existing nodes.
+    On large graphs only the most similar nodes are sent; with analysis_id
+    their stored embeddings are reused.
     """
     if not request.new_concept.strip():
         raise HTTPException(status_code=400, detail="概念名称不能为空")
@@ -422,8 +536,22 @@ async def integrate_concept_endpoint(
             for node in request.existing_nodes
         ]
 
+        node_vectors = {}
+        if request.analysis_id is not None:
+            labels = {node.id: node.label for node in request.existing_nodes}
+            node_vectors = {
+                emb.node_id: list(emb.embedding)
+                for emb in get_embeddings_for_analysis(session, request.analysis_id)
+                if labels.get(emb.node_id) == emb.node_label
+            }
+
         # Call LLM to analyze relationships
-        result = integrate_concept(request.new_concept.strip(), existing_nodes_dicts)
+        result = await asyncio.to_thread(
+            integrate_concept,
+            request.new_concept.strip(),
+            existing_nodes_dicts,
+            node_vectors,
+        )
 
         # Parse and validate the result
         node_data = result.get("node", {})
@@ -544,67 +672,67 @@ async def recall_similar_nodes(
 
 @router.post("/expand-node", response_model=ExpandNodeResponse)
 async def expand_node_endpoint(
-    request: ExpandNodeRequest,
+    request: ExpandNodeRequest, session: Session = Depends(get_session)
 ) -> ExpandNodeResponse:
     """
     Expand a node to reveal its sub-concepts.
-    Uses AI to analyze and generate child nodes.
+    Uses AI to analyze and generate child nodes. For nodes of a saved
+    analysis (analysis_id given) the label may be omitted and the context
+    is built from the stored graph; their expansions are stored and answered
+    from storage the next time.
     """
-    if not request.node_label.strip():
+    record = (
+        get_analysis_by_id(session, request.analysis_id)
+        if request.analysis_id is not None
+        else None
+    )
+    graph = Graph.model_validate(record.graph_data) if record else None
+    node = find_node(graph, request.node_id) if graph else None
+
+    label = (request.node_label or (node.label if node else "")).strip()
+    if not label:
         raise HTTPException(status_code=400, detail="节点标签不能为空")
 
+    if record:
+        stored = get_node_expansion(session, record.id, request.node_id, label)
+        if stored:
+            return ExpandNodeResponse(success=True, data=stored)
+
+    description = request.node_description
+    graph_context = request.graph_context
+    node_context = describe_node(graph, request.node_id, label) if graph else None
+    if node_context:
+        # Already describes the node, its neighborhood and the summary
+        description, graph_context = None, node_context
+
     try:
-        result = expand_node(
+        data = expand_node(
             node_id=request.node_id,
-            node_label=request.node_label.strip(),
-            node_description=request.node_description,
-            graph_context=request.graph_context,
+            node_label=label,
+            node_description=description,
+            graph_context=graph_context,
         )
-
-        # Parse child nodes into Node objects
-        child_nodes = []
-        for n in result.get("child_nodes", []):
-            try:
-                node = Node(
-                    id=n.get("id", f"{request.node_id}_sub"),
-                    label=n.get("label", "Unknown"),
-                    type=NodeType(n.get("type", "dependency")),
-                    priority=Priority(n.get("priority", "optional")),
-                    reason=n.get("reason", ""),
-                    description=n.get("description"),
-                    level=n.get("level", 1),
-                    expandable=n.get("expandable", False),
-                    parent_id=n.get("parent_id", request.node_id),
-                )
-                child_nodes.append(node)
-            except Exception:
-                # Skip invalid nodes
-                pass
-
-        # Parse edges
-        new_edges = []
-        for e in result.get("new_edges", []):
-            try:
-                edge = Edge(
-                    source=e.get("source", request.node_id),
-                    target=e.get("target", ""),
-                    type=EdgeType(e.get("type", "implements")),
-                    reason=e.get("reason", ""),
-                )
-                if edge.target:  # Only add edges with valid targets
-                    new_edges.append(edge)
-            except Exception:
-                # Skip invalid edges
-                pass
-
-        data = ExpandedNodeData(child_nodes=child_nodes, new_edges=new_edges)
-        return ExpandNodeResponse(success=True, data=data)
-
     except Exception as exc:
         raise HTTPException(
             status_code=500, detail=f"展开节点失败: {str(exc)}"
         ) from exc
 
+    if record and data.child_nodes:
+        save_node_expansion(session, record.id, request.node_id, label, data)
+    return ExpandNodeResponse(success=True, data=data)
+
+
+@router.post("/expand-nodes", response_model=ExpandNodesResponse)
+async def expand_nodes_endpoint(
+    request: ExpandNodesRequest, session: Session = Depends(get_session)
+) -> ExpandNodesResponse:
+    """
+    Expand several nodes, optionally several levels deep, in one request.
+    Nodes of one level share LLM calls and the graph context; children get
+    stable IDs ({parent}_sub1, ...) and are merged into one node/edge list.
+    """
+    return await expand_tree(session, request)
+
 
 @router.patch("/analysis/{analysis_id}")
 async def update_analysis(
@@ -614,13 +742,58 @@ async def update_analysis(
 ):
     """
     Update an analysis with edited graph data.
-    Used for saving edits made in the graph editor.
+    Used for saving edits made in the graph editor. Stored details and
+    expansions of edited or removed nodes are discarded.
     """
     record = get_analysis_by_id(session, analysis_id)
     if not record:
         raise HTTPException(status_code=404, detail="Analysis not found")
 
-    record.graph_data = graph_data.model_dump()
-    session.commit()
+    update_analysis_graph(session, record, graph_data)
 
     return {"success": True, "message": "Analysis updated"}
+
+
+@router.post("/analysis/{analysis_id}/refresh", response_model=RefreshResponse)
+async def refresh_analysis(
+    analysis_id: int,
+    request: RefreshRequest,
+    background_tasks: BackgroundTasks,
+    session: Session = Depends(get_session),
+) -> RefreshResponse:
+    """
+    Refresh an analysis after its source changed.
+    The new text (given, or re-fetched for URL analyses) is diffed against the
+    stored version and only changed paragraphs are sent to the LLM.
+    """
+    record = get_analysis_by_id(session, analysis_id)
+    if not record:
+        raise HTTPException(status_code=404, detail="Analysis not found")
+
+    if request.text is not None:
+        new_text = request.text
+    elif record.source_type == "url" and record.original_url:
+        url_hash = url_cache_key(record.original_url)
+        page = await fetch_page(
+            record.original_url, cached=get_fetch_cache(session, url_hash)
+        )
+        save_fetch_cache(session, url_hash, page)
+        new_text = page.text
+    else:
+        raise HTTPException(status_code=400, detail="请提供更新后的文本。")
+
+    refreshed = await refresh_record(
+        session,
+        background_tasks,
+        record,
+        new_text,
+        source="url1" if record.source_type == "url" else "text1",
+    )
+    return RefreshResponse(
+        success=True,
+        data=refreshed.graph,
+        mode=refreshed.mode,
+        changed_chunks=refreshed.changed_chunks,
+        added_nodes=refreshed.added_nodes,
+        removed_nodes=refreshed.removed_nodes,
+    )
@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+import asyncio
+
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
+from sqlmodel import Session
+
+from sparsemap.domain.models import AnalyzeRequest, JobResponse
+from sparsemap.infra.db import get_engine, get_session
+from sparsemap.services.jobs import FINISHED_STATUSES, get_job_runner, job_response
+from sparsemap.services.repository import create_job, get_job
+
+router = APIRouter()
+
+# Without in-process updates (job running in another process), the event
+# stream re-reads the job this often; it doubles as an SSE keep-alive
+_EVENTS_POLL_SECONDS = 5.0
+
+
+@router.post("/jobs", response_model=JobResponse, status_code=202)
+async def submit_job(
+    request: AnalyzeRequest, session: Session = Depends(get_session)
+) -> JobResponse:
+    """
+    Queue an analysis and return immediately.
+    Poll GET /api/jobs/{id} or subscribe to /api/jobs/{id}/events for the result.
+    """
+    if not request.urls and not request.texts:
+        raise HTTPException(status_code=400, detail="至少提供一个 URL 或文本。")
+
+    job = create_job(session, request)
+    runner = get_job_runner()
+    if runner:
+        runner.submit(job.id)
+    return job_response(job)
+
+
+@router.get("/jobs/{job_id}", response_model=JobResponse)
+async def get_job_status(
+    job_id: int, session: Session = Depends(get_session)
+) -> JobResponse:
+    job = get_job(session, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job_response(job)
+
+
+def _sse(state: JobResponse) -> str:
+    return f"event: job\ndata: {state.model_dump_json()}\n\n"
+
+
+@router.get("/jobs/{job_id}/events")
+async def stream_job_events(job_id: int) -> StreamingResponse:
+    """
+    Server-Sent Events stream of job state changes.
+    Each event is a JobResponse; the stream ends once the job finished.
+    """
+    session = Session(get_engine())
+    job = get_job(session, job_id)
+    if not job:
+        session.close()
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    runner = get_job_runner()
+    updates = runner.subscribe(job_id) if runner else None
+
+    async def events():
+        try:
+            # Read after subscribing so no update falls in between
+            session.refresh(job)
+            state = job_response(job)
+            yield _sse(state)
+            while state.status not in FINISHED_STATUSES:
+                if updates is not None:
+                    try:
+                        latest = await asyncio.wait_for(
+                            updates.get(), timeout=_EVENTS_POLL_SECONDS
+                        )
+                    except asyncio.TimeoutError:
+                        latest = None
+                else:
+                    await asyncio.sleep(_EVENTS_POLL_SECONDS)
+                    latest = None
+                if latest is None:
+                    session.refresh(job)
+                    latest = job_response(job)
+                if latest != state:
+                    state = latest
+                    yield _sse(state)
+                else:
+                    yield ": keep-alive\n\n"
+        finally:
+            if updates is not None:
+                runner.unsubscribe(job_id, updates)
+            session.close()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
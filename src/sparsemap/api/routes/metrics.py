@@ -0,0 +1,43 @@
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlmodel import Session
+
+from sparsemap.core.metrics import render_metrics
+from sparsemap.domain.models import LLMUsageResponse
+from sparsemap.infra.db import get_session
+from sparsemap.services.repository import llm_usage_by_endpoint
+
+router = APIRouter()
+# Mounted without the /api prefix, where Prometheus scrapes by default
+prometheus_router = APIRouter()
+
+
+@router.get("/metrics/llm", response_model=LLMUsageResponse)
+def get_llm_usage(
+    hours: int = Query(default=24, ge=1, le=24 * 90, description="Window in hours"),
+    session: Session = Depends(get_session),
+) -> LLMUsageResponse:
+    """
+    LLM tokens, latency, retries and cost per endpoint over the last hours.
+    """
+    since = datetime.utcnow() - timedelta(hours=hours)
+    return LLMUsageResponse(
+        since=since, endpoints=llm_usage_by_endpoint(session, since)
+    )
+
+
+@prometheus_router.get("/metrics", include_in_schema=False)
+def get_prometheus_metrics() -> Response:
+    """
+    Request, stage, database pool and queue metrics for Prometheus.
+    """
+    rendered = render_metrics()
+    if rendered is None:
+        raise HTTPException(
+            status_code=404, detail="未安装 prometheus-client，指标不可用。"
+        )
+    body, content_type = rendered
+    return Response(content=body, media_type=content_type)
@@ -0,0 +1,104 @@
+"""OpenAI-compatible stub LLM server (`sparsemap stub-llm`).
+
+Serves /v1/chat/completions and /v1/embeddings from StubLLM, so a SparseMap
+server configured with LLM_PROVIDER=deepseek and LLM_BASE_URL pointing here
+runs its real HTTP client path against deterministic, configurable answers.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+import uuid
+from typing import List, Optional, Union
+
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+from sparsemap.services.llm_utils import estimate_tokens
+from sparsemap.services.stub_llm import StubLLM, stub_embedding
+
+
+class ChatMessage(BaseModel):
+    role: str
+    content: str = ""
+
+
+class ChatCompletionRequest(BaseModel):
+    model: str = "stub"
+    messages: List[ChatMessage]
+    temperature: Optional[float] = None
+    max_tokens: Optional[int] = None
+
+
+class EmbeddingRequest(BaseModel):
+    model: str = "stub"
+    input: Union[str, List[str]]
+    dimensions: Optional[int] = None
+
+
+def _usage(prompt_tokens: int, completion_tokens: int) -> dict:
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+    }
+
+
+def create_stub_app(stub: Optional[StubLLM] = None) -> FastAPI:
+    stub = stub or StubLLM.from_settings()
+    app = FastAPI(title="SparseMap stub LLM")
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: ChatCompletionRequest):
+        await asyncio.sleep(stub.next_latency())
+        if stub.should_fail():
+            return JSONResponse(
+                status_code=500,
+                content={
+                    "error": {
+                        "message": "Injected stub failure",
+                        "type": "server_error",
+                    }
+                },
+            )
+
+        prompt = next(
+            (m.content for m in reversed(request.messages) if m.role == "user"), ""
+        )
+        content = stub.complete(prompt)
+        prompt_tokens = sum(estimate_tokens(m.content) for m in request.messages)
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.model,
+            "choices": [
+                {
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": "stop",
+                }
+            ],
+            "usage": _usage(prompt_tokens, estimate_tokens(content)),
+        }
+
+    @app.post("/v1/embeddings")
+    async def embeddings(request: EmbeddingRequest):
+        texts = [request.input] if isinstance(request.input, str) else request.input
+        return {
+            "object": "list",
+            "data": [
+                {
+                    "object": "embedding",
+                    "index": index,
+                    "embedding": stub_embedding(text),
+                }
+                for index, text in enumerate(texts)
+            ],
+            "model": request.model,
+            "usage": _usage(sum(estimate_tokens(text) for text in texts), 0),
+        }
+
+    return app
@@ -20,13 +20,76 @@ class Settings(BaseSettings):
     llm_temperature: float = 0.2
     llm_max_tokens: int = 4000  # Increased for complex prompts
     llm_max_retries: int = 2
+    llm_max_concurrency: int = 4  # Analysis LLM calls in flight per process
+    llm_requests_per_minute: int = 0  # Start rate of those calls (0 = unlimited)
+    llm_context_cache_ttl: int = 0  # Gemini system-prompt cache, seconds (0 = off)
+    # Analysis model by prompt size: "max_input_tokens:model,...", "*" = any size.
+    # Prompts larger than every bound use llm_model. Empty = always llm_model.
+    llm_model_routes: str = ""
+    # Analysis output budget: base + ratio * input tokens, capped at llm_max_tokens.
+    # Off by default (ratio 0 = always llm_max_tokens): a graph cut short by a
+    # small budget costs a second, full-budget call.
+    llm_output_base_tokens: int = 1500
+    llm_output_tokens_ratio: float = 0.0
+    # USD per million tokens, for the cost column of LLM usage metrics
+    llm_price_prompt_per_mtok: float = 0.0
+    llm_price_cached_per_mtok: float = 0.0
+    llm_price_completion_per_mtok: float = 0.0
+    node_details_max_batch: int = 8  # Nodes per batched node-details request
+    prefetch_enabled: bool = False  # Generate critical-node content after analysis
+    prefetch_top_n: int = 5  # Critical nodes prefetched per analysis
+    prefetch_expansions: bool = False  # Also expand the expandable ones
+    integrate_max_candidates: int = 30  # Nodes sent to integrate-concept (0 = all)
+    node_context_hops: int = 2  # Neighborhood described in node prompts
+    node_context_max_tokens: int = 300  # Budget of that description
+    expand_max_batch: int = 5  # Nodes expanded per LLM call in /api/expand-nodes
+    expand_max_depth: int = 3  # Deepest expansion /api/expand-nodes allows
+    expand_max_nodes: int = 40  # Nodes one /api/expand-nodes request may expand
 
     # DeepSeek specific (only used when llm_provider="deepseek")
     llm_base_url: str = "https://space.ai-builders.com/backend/v1"
 
+    # Stub provider (llm_provider="stub" and `sparsemap stub-llm`): synthetic
+    # answers for load tests, no API calls
+    stub_graph_nodes: int = 12  # Nodes per synthetic graph
+    stub_latency_ms: float = 0.0  # Mean (median for lognormal) call latency
+    stub_latency_distribution: str = "fixed"  # fixed, uniform, exponential, lognormal
+    stub_error_rate: float = 0.0  # Share of calls that fail
+    stub_seed: int = 0  # Seed of the latency and failure sequence
+
+    # Record/replay: LLM_RECORD appends real exchanges to llm_cassette (JSON
+    # lines); llm_provider="replay" answers from it without network access
+    llm_cassette: str = ""
+    llm_record: bool = False
+    llm_replay_latency: bool = False  # Replay also sleeps the recorded latency
+
     # Content Extractor
     extractor_max_chars: int = 8000
     extractor_min_chars: int = 200
+    extractor_backend: str = "bs4"  # Options: "bs4" or "lxml" (faster, needs lxml)
+    extractor_max_bytes: int = 2_000_000  # Stop downloading a page past this size
+    extractor_fetch_concurrency: int = 4  # Parallel downloads per request
+    extractor_fetch_deadline: float = 45.0  # Seconds for all URLs of one request
+    extractor_pool: str = "process"  # Options: "process", "thread" or "inline"
+    extractor_pool_workers: int = 2
+    extractor_pool_queue_limit: int = 32  # Pages waiting for a worker before 503
+
+    # Incremental refresh: re-analyze everything if more of the text changed
+    incremental_max_change_ratio: float = 0.5
+
+    # Reuse the graph of a pasted text within this many SimHash bits (0 = off).
+    # Up to 7 is guaranteed to be found by the band index.
+    near_duplicate_max_distance: int = 7
+
+    # Background analysis jobs (/api/jobs) run concurrently per server process
+    job_workers: int = 2
+    job_heartbeat_interval: float = 15.0  # Seconds between running-job heartbeats
+    job_stale_after: float = 120.0  # Requeue running jobs silent for this long
+    job_max_attempts: int = 3  # Fail a job once this many executions were cut short
+
+    # Batch analysis (/api/analyze/batch)
+    batch_max_items: int = 200
+    batch_concurrency: int = 8  # Items of one batch processed at once
 
 
 @lru_cache
@@ -0,0 +1,136 @@
+"""Prometheus metrics for /metrics.
+
+Per-route request latency and status, time spent in each analysis stage
+(fetch, parse, prompt, llm, repair, validate, save, embed) and gauges of the
+database pool and the work queues.
+
+prometheus_client is optional (the "metrics" extra). Without it every
+function here is a no-op and /metrics answers 404.
+"""
+
+from __future__ import annotations
+
+import logging
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Seconds; LLM calls and whole analyses run far past the default 10 s bucket
+LATENCY_BUCKETS = (
+    0.001,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+    30,
+    60,
+    120,
+    300,
+)
+
+
+class _Metrics:
+    """The metric objects, created once in the default registry"""
+
+    def __init__(self, prometheus_client):
+        self.client = prometheus_client
+        self.requests = prometheus_client.Histogram(
+            "sparsemap_http_request_duration_seconds",
+            "Time until the response headers were sent, per route and status",
+            ["method", "route", "status"],
+            buckets=LATENCY_BUCKETS,
+        )
+        self.stages = prometheus_client.Histogram(
+            "sparsemap_stage_duration_seconds",
+            "Time spent in one stage of an analysis",
+            ["stage"],
+            buckets=LATENCY_BUCKETS,
+        )
+        self.gauges: Dict[str, object] = {}
+
+
+_metrics: Optional[_Metrics] = None
+_unavailable = False
+
+
+def _get_metrics() -> Optional[_Metrics]:
+    global _metrics, _unavailable
+    if _metrics is None and not _unavailable:
+        try:
+            import prometheus_client
+        except ImportError:
+            logger.info("prometheus_client is not installed; metrics are disabled")
+            _unavailable = True
+            return None
+        _metrics = _Metrics(prometheus_client)
+    return _metrics
+
+
+def metrics_enabled() -> bool:
+    return _get_metrics() is not None
+
+
+def observe_request(method: str, route: str, status: int, seconds: float) -> None:
+    metrics = _get_metrics()
+    if metrics is not None:
+        metrics.requests.labels(method, route, str(status)).observe(seconds)
+
+
+def observe_stage(stage: str, seconds: float) -> None:
+    metrics = _get_metrics()
+    if metrics is not None:
+        metrics.stages.labels(stage).observe(seconds)
+
+
+@contextmanager
+def stage_timer(stage: str) -> Iterator[None]:
+    """Observe the duration of the block as the given analysis stage"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - start)
+
+
+def register_gauge(name: str, documentation: str, read: Callable[[], float]) -> None:
+    """
+    Expose a value read at scrape time
+
+    Registering a name again replaces its read function, so an app created
+    twice in one process (tests) reports its latest state.
+
+    Args:
+        name: Metric name
+        documentation: Help text
+        read: Returns the current value
+    """
+    metrics = _get_metrics()
+    if metrics is None:
+        return
+    gauge = metrics.gauges.get(name)
+    if gauge is None:
+        gauge = metrics.client.Gauge(name, documentation)
+        metrics.gauges[name] = gauge
+    gauge.set_function(read)
+
+
+def render_metrics() -> Optional[Tuple[bytes, str]]:
+    """
+    The metrics in the Prometheus text format
+
+    Returns:
+        (body, content type), or None when prometheus_client is not installed
+    """
+    metrics = _get_metrics()
+    if metrics is None:
+        return None
+    return metrics.client.generate_latest(), metrics.client.CONTENT_TYPE_LATEST
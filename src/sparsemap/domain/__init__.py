@@ -1,3 +1,19 @@
-from sparsemap.domain.models import AnalysisResult  # noqa: F401
+from sparsemap.domain.models import (  # noqa: F401
+    AnalysisJob,
+    AnalysisResult,
+    FetchCache,
+    LLMCall,
+    NodeDetailsRecord,
+    NodeExpansionRecord,
+    SimhashBand,
+)
 
-__all__ = ["AnalysisResult"]
+__all__ = [
+    "AnalysisJob",
+    "AnalysisResult",
+    "FetchCache",
+    "LLMCall",
+    "NodeDetailsRecord",
+    "NodeExpansionRecord",
+    "SimhashBand",
+]
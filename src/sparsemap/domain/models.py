@@ -2,10 +2,10 @@ from __future__ import annotations
 
 from datetime import datetime
 from enum import Enum
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 from pydantic import BaseModel, Field as PydanticField
-from sqlalchemy import Column, Index
+from sqlalchemy import BigInteger, Column, Index, UniqueConstraint
 from sqlmodel import Field, SQLModel
 from sqlmodel import JSON as SQLModelJSON
 from pgvector.sqlalchemy import Vector
@@ -59,12 +59,68 @@ class Graph(BaseModel):
 class AnalyzeRequest(BaseModel):
     urls: List[str] = PydanticField(default_factory=list)
     texts: List[str] = PydanticField(default_factory=list)
+    # Revalidate cached URLs and re-analyze only if their content changed
+    refresh: bool = False
+    # Return the graph of a near-identical, previously analyzed text
+    reuse_similar: bool = True
+
+
+class SourceError(BaseModel):
+    """A source that could not be included in the analysis"""
+
+    source: str
+    url: Optional[str] = None
+    detail: str
 
 
 class AnalyzeResponse(BaseModel):
     success: bool
     data: Graph
     sources: List[str]
+    errors: List[SourceError] = PydanticField(default_factory=list)
+    analysis_id: Optional[int] = None  # Saved analysis holding the graph
+
+
+class BatchAnalyzeRequest(BaseModel):
+    """Sources analyzed independently, one graph each"""
+
+    urls: List[str] = PydanticField(default_factory=list)
+    texts: List[str] = PydanticField(default_factory=list)
+    refresh: bool = False
+    reuse_similar: bool = True
+    # Stream one NDJSON line per item as it completes instead of one response
+    stream: bool = False
+
+
+class BatchItemResult(BaseModel):
+    """Outcome of one source of a batch"""
+
+    index: int  # Position in urls + texts
+    source: str  # "url1", "text2", ... as in AnalyzeResponse.sources
+    url: Optional[str] = None
+    success: bool
+    data: Optional[Graph] = None
+    error: Optional[str] = None
+
+
+class BatchAnalyzeResponse(BaseModel):
+    success: bool
+    results: List[BatchItemResult]  # In request order
+    succeeded: int
+    failed: int
+
+
+class JobResponse(BaseModel):
+    """State of a background analysis job"""
+
+    id: int
+    status: JobStatus
+    stage: Optional[str] = None
+    result: Optional[AnalyzeResponse] = None  # Set once the job succeeded
+    error: Optional[str] = None  # Set once the job failed
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
 
 
 class SourceType(str, Enum):
@@ -78,10 +134,117 @@ class AnalysisResult(SQLModel, table=True):
     title: str = Field(default="Untitled")  # Display title
     original_url: Optional[str] = Field(default=None)  # Original URL if source is URL
     source_type: str = Field(default="text")  # "url" or "text"
+    content_hash: Optional[str] = Field(default=None, index=True)  # Analyzed text
+    source_text: Optional[str] = Field(default=None)  # Kept for incremental refresh
+    simhash: Optional[int] = Field(default=None, sa_type=BigInteger)  # Signed 64-bit
     graph_data: dict = Field(sa_column=Column(SQLModelJSON))
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
 
+class FetchCache(SQLModel, table=True):
+    """Last extracted text of a URL with the validators for conditional GETs."""
+
+    __tablename__ = "fetch_cache"
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    url_hash: str = Field(index=True, unique=True)
+    url: str
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    content_hash: str  # Hash of the extracted text
+    text: str
+    fetched_at: datetime = Field(default_factory=datetime.utcnow)  # Last 200
+    validated_at: datetime = Field(default_factory=datetime.utcnow)  # Last 200/304
+
+
+class SimhashBand(SQLModel, table=True):
+    """One band of an analysis' SimHash, indexed for near-duplicate lookup."""
+
+    __tablename__ = "simhash_band"
+    __table_args__ = (Index("ix_simhash_band_band_value", "band", "value"),)
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    analysis_id: int = Field(index=True)  # Foreign key to AnalysisResult
+    band: int  # Band position, 0..SIMHASH_BANDS-1
+    value: int  # Bits of the fingerprint in this band
+
+
+class JobStatus(str, Enum):
+    queued = "queued"
+    running = "running"
+    succeeded = "succeeded"
+    failed = "failed"
+
+
+class AnalysisJob(SQLModel, table=True):
+    """An /api/analyze request executed in the background by the job workers."""
+
+    __tablename__ = "analysis_job"
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    status: str = Field(default=JobStatus.queued.value, index=True)
+    stage: Optional[str] = None  # Progress of a running job, e.g. "analyzing"
+    request_data: dict = Field(sa_column=Column(SQLModelJSON))  # AnalyzeRequest
+    result_data: Optional[dict] = Field(
+        default=None, sa_column=Column(SQLModelJSON)
+    )  # AnalyzeResponse
+    error: Optional[str] = None
+    attempts: int = 0  # Executions started, including ones cut short by a restart
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    started_at: Optional[datetime] = None
+    # Refreshed by the worker running the job; a stale one means it is gone
+    heartbeat_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+
+class NodeDetailsRecord(SQLModel, table=True):
+    """Generated details of one node of a stored analysis."""
+
+    __tablename__ = "node_details"
+    __table_args__ = (UniqueConstraint("analysis_id", "node_id"),)
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    analysis_id: int = Field(index=True)  # Foreign key to AnalysisResult
+    node_id: str
+    node_label: str  # Label the details were generated for
+    details: dict = Field(sa_column=Column(SQLModelJSON))  # NodeDetails
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+class NodeExpansionRecord(SQLModel, table=True):
+    """Generated sub-concepts of one node of a stored analysis."""
+
+    __tablename__ = "node_expansion"
+    __table_args__ = (UniqueConstraint("analysis_id", "node_id"),)
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    analysis_id: int = Field(index=True)  # Foreign key to AnalysisResult
+    node_id: str
+    node_label: str  # Label the expansion was generated for
+    expansion: dict = Field(sa_column=Column(SQLModelJSON))  # ExpandedNodeData
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+class LLMCall(SQLModel, table=True):
+    """One request to the LLM provider, for usage and cost accounting."""
+
+    __tablename__ = "llm_call"
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    endpoint: str = Field(index=True)  # API route or background task that made it
+    provider: str
+    model: str
+    operation: str  # Provider method, e.g. "generate_graph"
+    attempt: int = 0  # 0 for the first try, n for the n-th retry
+    success: bool = True
+    prompt_tokens: int = 0
+    cached_tokens: int = 0  # Part of prompt_tokens served from the provider cache
+    completion_tokens: int = 0
+    latency_ms: int = 0
+    cost_usd: float = 0.0  # At the prices configured when the call was made
+    created_at: datetime = Field(default_factory=datetime.utcnow, index=True)
+
+
 # Embedding dimension for text-embedding-3-small (OpenAI) or text-embedding-004 (Gemini)
 EMBEDDING_DIM = 768
 
@@ -138,11 +301,46 @@ class NodeDetails(BaseModel):
 
 
 class DetailsRequest(BaseModel):
+    node_label: Optional[str] = None  # Optional for nodes of a saved analysis
+    node_context: Optional[str] = None
+    node_description: Optional[str] = None
+    # Node of a saved analysis: the context is built from the stored graph and
+    # stored details are returned when available
+    analysis_id: Optional[int] = None
+    node_id: Optional[str] = None
+
+
+class DetailsNode(BaseModel):
+    """A node of a batched node-details request"""
+
+    node_id: str
     node_label: str
     node_context: Optional[str] = None
     node_description: Optional[str] = None
 
 
+class BatchDetailsRequest(BaseModel):
+    """Request for batched node-details endpoint"""
+
+    nodes: List[DetailsNode]
+    analysis_id: Optional[int] = None  # Saved analysis the nodes belong to
+
+
+class NodeDetailsResult(BaseModel):
+    """Details of one node, or why they could not be generated"""
+
+    node_id: str
+    details: Optional[NodeDetails] = None
+    error: Optional[str] = None
+
+
+class BatchDetailsResponse(BaseModel):
+    """Response for batched node-details endpoint"""
+
+    success: bool
+    results: List[NodeDetailsResult]  # In request order
+
+
 class URLInput(BaseModel):
     """URL input for add-url endpoint"""
 
@@ -162,6 +360,7 @@ class IntegrateConceptRequest(BaseModel):
 
     new_concept: str
     existing_nodes: List[ExistingNode]
+    analysis_id: Optional[int] = None  # Saved analysis; reuses its node embeddings
 
 
 class LinkedNode(BaseModel):
@@ -197,13 +396,33 @@ class IntegrateConceptResponse(BaseModel):
     error: Optional[str] = None
 
 
+class RefreshRequest(BaseModel):
+    """Request for refreshing a stored analysis"""
+
+    text: Optional[str] = None  # New text; URL analyses are re-fetched if omitted
+
+
+class RefreshResponse(BaseModel):
+    """Response for refresh endpoint"""
+
+    success: bool
+    data: Graph
+    mode: str  # "unchanged", "incremental" or "full"
+    changed_chunks: int = 0
+    added_nodes: int = 0
+    removed_nodes: int = 0
+
+
 class ExpandNodeRequest(BaseModel):
     """Request for expand-node endpoint"""
 
     node_id: str
-    node_label: str
+    node_label: Optional[str] = None  # Optional for nodes of a saved analysis
     node_description: Optional[str] = None
     graph_context: Optional[str] = None  # Summary of the current graph
+    # Saved analysis: the context is built from the stored graph, and
+    # expansions are stored
+    analysis_id: Optional[int] = None
 
 
 class ExpandedNodeData(BaseModel):
@@ -219,3 +438,59 @@ class ExpandNodeResponse(BaseModel):
     success: bool
     data: Optional[ExpandedNodeData] = None
     error: Optional[str] = None
+
+
+class ExpandTarget(BaseModel):
+    """A node to expand in a multi-node expand request"""
+
+    node_id: str
+    node_label: str
+    node_description: Optional[str] = None
+    level: int = 0  # Children get level + 1
+
+
+class ExpandNodesRequest(BaseModel):
+    """Request for the multi-node expand endpoint"""
+
+    nodes: List[ExpandTarget]
+    depth: int = 1  # 2 also expands the children, and so on
+    graph_context: Optional[str] = None  # Summary of the current graph
+    analysis_id: Optional[int] = None  # Saved analysis; enables stored expansions
+
+
+class ExpandNodesResponse(BaseModel):
+    """Merged result of a multi-node expand request"""
+
+    success: bool
+    data: ExpandedNodeData  # Children (and descendants) of all expanded nodes
+    failed: List[str] = PydanticField(default_factory=list)  # Node IDs
+
+
+class NodeContentResponse(BaseModel):
+    """Stored details and expansions of the nodes of an analysis"""
+
+    success: bool
+    details: Dict[str, NodeDetails] = PydanticField(default_factory=dict)
+    expansions: Dict[str, ExpandedNodeData] = PydanticField(default_factory=dict)
+
+
+class LLMEndpointUsage(BaseModel):
+    """LLM usage of one endpoint over the reporting window"""
+
+    endpoint: str
+    calls: int
+    failures: int
+    retries: int
+    prompt_tokens: int
+    cached_tokens: int
+    completion_tokens: int
+    avg_latency_ms: float
+    max_latency_ms: int
+    cost_usd: float
+
+
+class LLMUsageResponse(BaseModel):
+    """Response of the LLM usage metrics endpoint"""
+
+    since: datetime
+    endpoints: List[LLMEndpointUsage]  # Most expensive (by tokens) first
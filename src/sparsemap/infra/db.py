@@ -1,11 +1,18 @@
+from functools import lru_cache
+
 from sqlmodel import Session, SQLModel, create_engine
 
 from sparsemap.core.config import get_settings
 
 
+@lru_cache
+def _create_engine(database_url: str):
+    return create_engine(database_url, echo=False)
+
+
 def get_engine():
-    settings = get_settings()
-    return create_engine(settings.database_url, echo=False)
+    """The process-wide engine of the configured database (one connection pool)"""
+    return _create_engine(get_settings().database_url)
 
 
 def init_db() -> None:
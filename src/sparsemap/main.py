@@ -1,12 +1,130 @@
+import argparse
+import asyncio
+from pathlib import Path
+
 from sparsemap.api.app import create_app
 
 
-def main() -> None:
+def serve() -> None:
     app = create_app()
     import uvicorn
 
     uvicorn.run(app, host="0.0.0.0", port=8003, log_level="info")
 
 
+def serve_stub_llm(args: argparse.Namespace) -> None:
+    """Run the OpenAI-compatible stub LLM used for load tests."""
+    import uvicorn
+
+    from sparsemap.api.stub import create_stub_app
+
+    uvicorn.run(create_stub_app(), host=args.host, port=args.port, log_level="warning")
+
+
+def ingest(args: argparse.Namespace) -> int:
+    """Run the offline ingestion pipeline; returns the process exit code."""
+    from sqlmodel import Session
+
+    from sparsemap.core.config import get_settings
+    from sparsemap.core.logging import configure_logging
+    from sparsemap.infra.db import get_engine
+    from sparsemap.services.extractor import shutdown_extraction_pool
+    from sparsemap.services.pipeline import (
+        Checkpoint,
+        IngestPipeline,
+        format_report,
+        read_items,
+    )
+    from sparsemap.services.usage import (
+        llm_endpoint,
+        start_usage_recording,
+        stop_usage_recording,
+    )
+
+    configure_logging()
+    try:
+        items = read_items(args.input)
+    except (OSError, ValueError) as exc:
+        print(f"error: {exc}")
+        return 2
+
+    checkpoint_path = args.checkpoint or args.input.with_name(
+        f"{args.input.name}.checkpoint.jsonl"
+    )
+    checkpoint = Checkpoint(None if args.no_checkpoint else checkpoint_path)
+    start_usage_recording(get_engine())
+    try:
+        with Session(get_engine()) as session, llm_endpoint("ingest"):
+            pipeline = IngestPipeline(
+                session,
+                checkpoint,
+                fetch_concurrency=args.fetch_concurrency
+                or get_settings().extractor_fetch_concurrency,
+                analyze_concurrency=args.analyze_concurrency,
+                embed_concurrency=args.embed_concurrency,
+                embed=not args.no_embed,
+            )
+            report = asyncio.run(pipeline.run(items))
+    finally:
+        stop_usage_recording()
+        checkpoint.close()
+        shutdown_extraction_pool()
+
+    print(format_report(report))
+    return 1 if report.failed else 0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="sparsemap")
+    commands = parser.add_subparsers(dest="command")
+    commands.add_parser("serve", help="Run the API server (default)")
+
+    ingest_parser = commands.add_parser(
+        "ingest", help="Analyze a file of URLs/texts without going through the API"
+    )
+    ingest_parser.add_argument(
+        "input",
+        type=Path,
+        help='One URL per line, or JSON lines like {"url": ...} / {"text": ..., "title": ...}',
+    )
+    ingest_parser.add_argument(
+        "--checkpoint",
+        type=Path,
+        help="Progress file for resuming (default: <input>.checkpoint.jsonl)",
+    )
+    ingest_parser.add_argument(
+        "--no-checkpoint", action="store_true", help="Do not read or write progress"
+    )
+    ingest_parser.add_argument(
+        "--fetch-concurrency",
+        type=int,
+        help="Parallel downloads (default: EXTRACTOR_FETCH_CONCURRENCY)",
+    )
+    ingest_parser.add_argument(
+        "--analyze-concurrency", type=int, default=2, help="Parallel LLM calls"
+    )
+    ingest_parser.add_argument(
+        "--embed-concurrency", type=int, default=2, help="Parallel embedding jobs"
+    )
+    ingest_parser.add_argument(
+        "--no-embed", action="store_true", help="Skip node embeddings"
+    )
+
+    stub_parser = commands.add_parser(
+        "stub-llm",
+        help="Run an OpenAI-compatible stub LLM for load tests (STUB_* settings)",
+    )
+    stub_parser.add_argument("--host", default="127.0.0.1")
+    stub_parser.add_argument("--port", type=int, default=8010)
+
+    args = parser.parse_args()
+    if args.command == "ingest":
+        raise SystemExit(ingest(args))
+    if args.command == "stub-llm":
+        serve_stub_llm(args)
+        return
+    serve()
+
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,371 @@
+"""The /api/analyze flow: cache lookups, fetching, LLM analysis and saving.
+
+Shared by the synchronous endpoint and the background job workers.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import AsyncIterator, Callable, Optional
+
+from fastapi import BackgroundTasks, HTTPException, Response
+from sqlmodel import Session
+
+from sparsemap.core.config import get_settings
+from sparsemap.domain.models import (
+    AnalysisResult,
+    AnalyzeRequest,
+    AnalyzeResponse,
+    BatchAnalyzeRequest,
+    BatchItemResult,
+    Graph,
+    SourceError,
+)
+from sparsemap.services.embedding import (
+    refresh_node_embeddings,
+    store_node_embeddings,
+)
+from sparsemap.services.extractor import (
+    fetch_url_contents,
+    hash_content,
+    hash_url,
+    url_cache_key,
+)
+from sparsemap.services.incremental import RefreshResult, refresh_graph
+from sparsemap.services.limits import get_llm_limiter
+from sparsemap.services.llm import analyze_contents
+from sparsemap.services.prefetch import prefetch_node_content
+from sparsemap.services.repository import (
+    extract_title,
+    find_near_duplicate,
+    get_analysis_by_content_hash,
+    get_analysis_by_hash,
+    get_fetch_cache,
+    save_analysis,
+    save_fetch_cache,
+    update_analysis_graph,
+)
+
+logger = logging.getLogger(__name__)
+
+
+async def refresh_record(
+    session: Session,
+    background_tasks: BackgroundTasks,
+    record: AnalysisResult,
+    new_text: str,
+    source: str,
+) -> RefreshResult:
+    """
+    Re-analyze a stored analysis against new text and persist the result
+
+    Raises:
+        HTTPException: 400 if LLM generation or parsing fails
+    """
+    try:
+        async with get_llm_limiter().slot():
+            refreshed = await asyncio.to_thread(
+                refresh_graph,
+                Graph.model_validate(record.graph_data),
+                record.source_text,
+                new_text,
+                source=source,
+            )
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+
+    if refreshed.mode != "unchanged":
+        update_analysis_graph(
+            session,
+            record,
+            refreshed.graph,
+            content_hash=hash_content(new_text),
+            source_text=new_text,
+        )
+        background_tasks.add_task(
+            refresh_node_embeddings, session, record.id, refreshed.graph
+        )
+    return refreshed
+
+
+async def run_analysis(
+    session: Session,
+    request: AnalyzeRequest,
+    background_tasks: BackgroundTasks,
+    response: Optional[Response] = None,
+    on_stage: Optional[Callable[[str], None]] = None,
+) -> AnalyzeResponse:
+    """
+    Analyze the URLs and texts of a request into one graph
+
+    Cached, duplicate and near-duplicate sources are answered from the
+    database; otherwise the URLs are fetched, everything is sent to the LLM
+    in one call and the result is saved. Embeddings, and prefetching of
+    critical node content if enabled, are added to background_tasks.
+
+    Args:
+        session: Database session
+        request: Sources to analyze
+        background_tasks: Receives the embedding work to run after responding
+        response: If given, gets a Server-Timing header with HTML parse time
+        on_stage: Called with "fetching", "analyzing" and "saving" as the
+            analysis progresses
+
+    Returns:
+        AnalyzeResponse with the graph, the id of the analysis holding it
+        and per-source fetch errors
+
+    Raises:
+        HTTPException: 400 if there is nothing to analyze or analysis fails
+    """
+
+    def stage(name: str) -> None:
+        if on_stage:
+            on_stage(name)
+
+    contents = []
+    sources = []
+
+    if not request.urls and not request.texts:
+        raise HTTPException(status_code=400, detail="至少提供一个 URL 或文本。")
+
+    single_source = len(request.urls) + len(request.texts) == 1
+
+    cached = None
+    if single_source and request.urls:
+        cached = get_analysis_by_hash(session, url_cache_key(request.urls[0]))
+        if cached and not request.refresh:
+            graph = Graph.model_validate(cached.graph_data)
+            return AnalyzeResponse(
+                success=True, data=graph, sources=["url1"], analysis_id=cached.id
+            )
+
+    if single_source and request.texts:
+        # Same text (up to whitespace) was analyzed before
+        duplicate = get_analysis_by_content_hash(
+            session, hash_content(request.texts[0])
+        )
+        max_distance = get_settings().near_duplicate_max_distance
+        if not duplicate and request.reuse_similar and max_distance > 0:
+            # Almost the same text (a typo fixed, a line added)
+            duplicate = find_near_duplicate(session, request.texts[0], max_distance)
+        if duplicate:
+            graph = Graph.model_validate(duplicate.graph_data)
+            return AnalyzeResponse(
+                success=True, data=graph, sources=["text1"], analysis_id=duplicate.id
+            )
+
+    # Fetch all URLs concurrently; a failing URL is reported, not fatal.
+    # Previously fetched URLs are revalidated with conditional GETs.
+    fetch_caches = {}
+    for url in request.urls:
+        fetch_cache = get_fetch_cache(session, url_cache_key(url))
+        if fetch_cache:
+            fetch_caches[url] = fetch_cache
+
+    errors = []
+    fetched = []
+    if request.urls:
+        stage("fetching")
+    results = await fetch_url_contents(request.urls, fetch_caches)
+    for idx, result in enumerate(results, start=1):
+        if result.error:
+            errors.append(
+                SourceError(source=f"url{idx}", url=result.url, detail=result.error)
+            )
+            continue
+        save_fetch_cache(session, url_cache_key(result.url), result)
+        contents.append({"source": f"url{idx}", "text": result.text})
+        sources.append(f"url{idx}")
+        fetched.append(result)
+    if results and response is not None:
+        # Total HTML parse time for this request, visible in browser devtools
+        parse_ms = sum(result.parse_ms for result in results)
+        response.headers["Server-Timing"] = f"parse;dur={parse_ms:.1f}"
+
+    if cached and (not fetched or cached.content_hash == fetched[0].content_hash):
+        # Refresh found the page unchanged (or unreachable): keep the stored analysis
+        graph = Graph.model_validate(cached.graph_data)
+        return AnalyzeResponse(
+            success=True,
+            data=graph,
+            sources=["url1"],
+            errors=errors,
+            analysis_id=cached.id,
+        )
+
+    if cached:
+        # Refresh of a changed page: re-analyze only what changed
+        stage("analyzing")
+        refreshed = await refresh_record(
+            session, background_tasks, cached, fetched[0].text, source="url1"
+        )
+        return AnalyzeResponse(
+            success=True,
+            data=refreshed.graph,
+            sources=["url1"],
+            errors=errors,
+            analysis_id=cached.id,
+        )
+
+    if single_source and fetched and not cached:
+        # Another URL (mirror, redirect, syndicated copy) had the same text
+        duplicate = get_analysis_by_content_hash(session, fetched[0].content_hash)
+        if duplicate:
+            graph = Graph.model_validate(duplicate.graph_data)
+            return AnalyzeResponse(
+                success=True, data=graph, sources=["url1"], analysis_id=duplicate.id
+            )
+
+    for idx, text in enumerate(request.texts, start=1):
+        contents.append({"source": f"text{idx}", "text": text})
+        sources.append(f"text{idx}")
+
+    if not contents:
+        # Every URL failed and there is no text: surface the first failure
+        raise HTTPException(status_code=400, detail=errors[0].detail)
+
+    stage("analyzing")
+    try:
+        # Blocking LLM call: keep the event loop free for other requests
+        async with get_llm_limiter().slot():
+            graph = await asyncio.to_thread(analyze_contents, contents)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+
+    # Save with metadata
+    stage("saving")
+    analysis_ids = []  # Records holding this graph
+    new_ids = []  # ... of which saved just now
+    for result in fetched:
+        url_hash = url_cache_key(result.url)
+        record = get_analysis_by_hash(session, url_hash)
+        if not record:
+            title = extract_title(url=result.url, graph=graph)
+            record = save_analysis(
+                session,
+                url_hash,
+                graph,
+                title=title,
+                original_url=result.url,
+                source_type="url",
+                # Only a single-source graph is "the analysis of this text"
+                content_hash=result.content_hash if single_source else None,
+                source_text=result.text if single_source else None,
+            )
+            background_tasks.add_task(store_node_embeddings, session, record.id, graph)
+            new_ids.append(record.id)
+        elif request.refresh and record.content_hash != result.content_hash:
+            # A multi-source graph is not the analysis of this page: no hash
+            update_analysis_graph(
+                session,
+                record,
+                graph,
+                content_hash=result.content_hash if single_source else None,
+            )
+            background_tasks.add_task(
+                refresh_node_embeddings, session, record.id, graph
+            )
+        analysis_ids.append(record.id)
+
+    for text in request.texts:
+        text_hash = hash_url(text)
+        record = get_analysis_by_hash(session, text_hash)
+        if not record:
+            title = extract_title(text=text, graph=graph)
+            record = save_analysis(
+                session,
+                text_hash,
+                graph,
+                title=title,
+                source_type="text",
+                content_hash=hash_content(text) if single_source else None,
+                source_text=text if single_source else None,
+            )
+            background_tasks.add_task(store_node_embeddings, session, record.id, graph)
+            new_ids.append(record.id)
+        analysis_ids.append(record.id)
+
+    if new_ids and get_settings().prefetch_enabled:
+        background_tasks.add_task(
+            prefetch_node_content, session.get_bind(), new_ids, graph
+        )
+
+    return AnalyzeResponse(
+        success=True,
+        data=graph,
+        sources=sources,
+        errors=errors,
+        analysis_id=analysis_ids[0] if analysis_ids else None,
+    )
+
+
+async def run_batch(
+    engine,
+    request: BatchAnalyzeRequest,
+    background_tasks: BackgroundTasks,
+) -> AsyncIterator[BatchItemResult]:
+    """
+    Analyze every source of a batch independently
+
+    Each source goes through run_analysis on its own, so cached and
+    duplicate sources are answered from the database. At most
+    batch_concurrency sources are processed at once; LLM calls are further
+    limited by the process-wide LLM limiter.
+
+    Args:
+        engine: Database engine; every item gets a session of its own
+        request: Sources to analyze
+        background_tasks: Receives the embedding work of all items
+
+    Yields:
+        One BatchItemResult per source, in completion order
+    """
+    semaphore = asyncio.Semaphore(max(get_settings().batch_concurrency, 1))
+    items = [("url", f"url{idx}", url) for idx, url in enumerate(request.urls, 1)]
+    items += [("text", f"text{idx}", t) for idx, t in enumerate(request.texts, 1)]
+
+    async def analyze_item(index: int, kind: str, source: str, value: str):
+        single = AnalyzeRequest(
+            urls=[value] if kind == "url" else [],
+            texts=[value] if kind == "text" else [],
+            refresh=request.refresh,
+            reuse_similar=request.reuse_similar,
+        )
+        url = value if kind == "url" else None
+        async with semaphore:
+            session = Session(engine)
+            try:
+                result = await run_analysis(session, single, background_tasks)
+            except HTTPException as exc:
+                return BatchItemResult(
+                    index=index, source=source, url=url, success=False, error=exc.detail
+                )
+            except Exception as exc:
+                logger.exception(f"Batch item {source} failed")
+                return BatchItemResult(
+                    index=index,
+                    source=source,
+                    url=url,
+                    success=False,
+                    error=f"分析失败: {exc}",
+                )
+            finally:
+                # After this item's embedding tasks, which use the session
+                background_tasks.add_task(session.close)
+            return BatchItemResult(
+                index=index, source=source, url=url, success=True, data=result.data
+            )
+
+    tasks = [
+        asyncio.create_task(analyze_item(index, kind, source, value))
+        for index, (kind, source, value) in enumerate(items)
+    ]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        # Client went away mid-stream: stop the remaining work
+        for task in tasks:
+            task.cancel()
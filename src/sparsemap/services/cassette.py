@@ -0,0 +1,137 @@
+"""Recorded LLM traffic ("cassettes") for offline, reproducible runs.
+
+With LLM_RECORD=true the real providers append every exchange (operation,
+prompt, raw response text, latency) to the JSON-lines file LLM_CASSETTE,
+and the embedding service every embedded text with its vector.
+LLM_PROVIDER=replay answers from that file instead of the network, so the
+same workload can be rerun to compare our own parsing, persistence and
+export costs across versions.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from pydantic import BaseModel
+
+logger = logging.getLogger(__name__)
+
+
+def prompt_key(prompt: str) -> str:
+    return hashlib.sha256(prompt.encode()).hexdigest()
+
+
+class Exchange(BaseModel):
+    """One recorded LLM call"""
+
+    operation: str  # Provider method, e.g. "generate_graph"
+    prompt_sha256: str
+    prompt: str
+    response: str  # Raw response text, before any JSON repair
+    latency_ms: int
+    provider: str = ""
+    model: str = ""
+    recorded_at: datetime
+
+
+class Cassette:
+    """
+    Recorded exchanges of one file, looked up by operation and prompt
+
+    A prompt recorded several times (e.g. an invalid response and its retry)
+    is answered with its responses in recording order, starting over once
+    all were replayed, so a workload can be replayed repeatedly.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._exchanges: Dict[Tuple[str, str], List[Exchange]] = {}
+        self._positions: Dict[Tuple[str, str], int] = {}
+        self._lock = threading.Lock()
+        if path.exists():
+            with path.open(encoding="utf-8") as file:
+                for line_number, line in enumerate(file, start=1):
+                    if not line.strip():
+                        continue
+                    try:
+                        exchange = Exchange.model_validate_json(line)
+                    except ValueError:
+                        logger.warning(f"Skipping invalid cassette line {line_number}")
+                        continue
+                    key = (exchange.operation, exchange.prompt_sha256)
+                    self._exchanges.setdefault(key, []).append(exchange)
+
+    def __len__(self) -> int:
+        return sum(len(exchanges) for exchanges in self._exchanges.values())
+
+    def next_exchange(self, operation: str, prompt: str) -> Optional[Exchange]:
+        """
+        The next recorded exchange for a prompt
+
+        Returns:
+            The exchange, or None if the prompt was not recorded
+        """
+        key = (operation, prompt_key(prompt))
+        with self._lock:
+            exchanges = self._exchanges.get(key)
+            if not exchanges:
+                return None
+            position = self._positions.get(key, 0)
+            self._positions[key] = (position + 1) % len(exchanges)
+            return exchanges[position]
+
+    def record(
+        self,
+        provider: str,
+        model: str,
+        operation: str,
+        prompt: str,
+        response: str,
+        latency_ms: int,
+    ) -> None:
+        """
+        Append a real provider exchange
+
+        Failures to write are logged and otherwise ignored.
+        """
+        try:
+            self.append(
+                Exchange(
+                    operation=operation,
+                    prompt_sha256=prompt_key(prompt),
+                    prompt=prompt,
+                    response=response,
+                    latency_ms=latency_ms,
+                    provider=provider,
+                    model=model,
+                    recorded_at=datetime.utcnow(),
+                )
+            )
+        except Exception:
+            logger.exception("Recording LLM exchange failed")
+
+    def append(self, exchange: Exchange) -> None:
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with self.path.open("a", encoding="utf-8") as file:
+                file.write(exchange.model_dump_json() + "\n")
+            key = (exchange.operation, exchange.prompt_sha256)
+            self._exchanges.setdefault(key, []).append(exchange)
+
+
+_cassettes: Dict[Path, Cassette] = {}
+_cassettes_lock = threading.Lock()
+
+
+def get_cassette(path: str) -> Cassette:
+    """The process-wide Cassette of a file, loaded once"""
+    resolved = Path(path).resolve()
+    with _cassettes_lock:
+        if resolved not in _cassettes:
+            _cassettes[resolved] = Cassette(resolved)
+        return _cassettes[resolved]
@@ -2,18 +2,35 @@
 
 from __future__ import annotations
 
-from typing import List, Optional
+import json
+import math
+import time
+from typing import Dict, List, Optional
 
 from sqlmodel import Session, select, text
 
 from sparsemap.core.config import get_settings
+from sparsemap.core.metrics import stage_timer
 from sparsemap.domain.models import Graph, Node, NodeEmbedding, EMBEDDING_DIM
+from sparsemap.services.cassette import Cassette, get_cassette
+from sparsemap.services.stub_llm import stub_embedding
+
+# Texts per embedding request; Gemini rejects batches of more than 100
+EMBEDDING_BATCH_SIZE = 100
+# Cassette operation of recorded embeddings (prompt: the text, response: JSON vector)
+EMBED_OPERATION = "embed"
 
 
 def _get_embedding_client():
     """Get the appropriate embedding client based on LLM provider."""
     settings = get_settings()
 
+    if settings.llm_provider == "replay" and settings.llm_cassette:
+        # Vectors recorded with the LLM traffic, so rankings match the recording
+        return ("replay", get_cassette(settings.llm_cassette))
+    if settings.llm_provider in ("stub", "replay"):
+        # No network: deterministic synthetic vectors
+        return ("stub", None)
     if settings.llm_provider == "gemini":
         from google import genai
 
@@ -32,6 +49,14 @@ def _get_embedding_client():
         return ("openai", client)
 
 
+def _replayed_embedding(cassette: Cassette, text: str) -> List[float]:
+    exchange = cassette.next_exchange(EMBED_OPERATION, text)
+    if exchange is None:
+        # Cassette recorded before embeddings were: synthetic vector
+        return stub_embedding(text)
+    return json.loads(exchange.response)
+
+
 def generate_embedding(text: str) -> List[float]:
     """Generate embedding vector for given text.
 
@@ -41,33 +66,119 @@ def generate_embedding(text: str) -> List[float]:
     Returns:
         List of floats representing the embedding vector
     """
+    return generate_embeddings([text])[0]
+
+
+def generate_embeddings(texts: List[str]) -> List[List[float]]:
+    """Generate embedding vectors for many texts in batched requests.
+
+    Texts are sent EMBEDDING_BATCH_SIZE at a time. With LLM_RECORD each
+    vector is appended to the cassette, which the replay provider answers
+    from.
+
+    Args:
+        texts: Texts to embed
+
+    Returns:
+        One embedding vector per text, in order
+    """
+    if not texts:
+        return []
     provider, client = _get_embedding_client()
 
-    if provider == "gemini":
-        # Gemini embedding
-        result = client.models.embed_content(
-            model="text-embedding-004",
-            contents=text,
-        )
-        return list(result.embeddings[0].values)
-    else:
-        # OpenAI embedding
-        response = client.embeddings.create(
-            model="text-embedding-3-small",
-            input=text,
-            dimensions=EMBEDDING_DIM,
-        )
-        return response.data[0].embedding
+    if provider == "stub":
+        return [stub_embedding(text) for text in texts]
+    if provider == "replay":
+        return [_replayed_embedding(client, text) for text in texts]
 
+    settings = get_settings()
+    cassette = (
+        get_cassette(settings.llm_cassette)
+        if settings.llm_record and settings.llm_cassette
+        else None
+    )
+    vectors: List[List[float]] = []
+    for start in range(0, len(texts), EMBEDDING_BATCH_SIZE):
+        batch = texts[start : start + EMBEDDING_BATCH_SIZE]
+        started = time.perf_counter()
+        if provider == "gemini":
+            name, model = "Gemini", "text-embedding-004"
+            result = client.models.embed_content(model=model, contents=batch)
+            batch_vectors = [list(embedding.values) for embedding in result.embeddings]
+        else:
+            name, model = "OpenAI", "text-embedding-3-small"
+            response = client.embeddings.create(
+                model=model,
+                input=batch,
+                dimensions=EMBEDDING_DIM,
+            )
+            data = sorted(response.data, key=lambda d: d.index)
+            batch_vectors = [item.embedding for item in data]
+        latency_ms = int((time.perf_counter() - started) * 1000)
+        if cassette is not None:
+            # One exchange per text, with the latency of the whole request
+            for text, vector in zip(batch, batch_vectors):
+                cassette.record(
+                    name, model, EMBED_OPERATION, text, json.dumps(vector), latency_ms
+                )
+        vectors.extend(batch_vectors)
+    return vectors
+
+
+def cosine_similarity(a: List[float], b: List[float]) -> float:
+    """Cosine similarity of two vectors (0 if either is all zeros)"""
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+def rank_by_similarity(
+    query: str,
+    nodes: List[dict],
+    top_k: int,
+    known_vectors: Optional[Dict[str, List[float]]] = None,
+) -> List[dict]:
+    """Pick the nodes most similar to a query text.
 
-def generate_node_text(node: Node) -> str:
-    """Generate text representation of a node for embedding."""
-    parts = [node.label]
-    if node.description:
-        parts.append(node.description)
-    if node.reason:
-        parts.append(node.reason)
-    return " | ".join(parts)
+    Nodes without a known vector are embedded in one batched request
+    together with the query.
+
+    Args:
+        query: Text to compare against
+        nodes: Dicts with 'id', 'label' and optional 'description' and 'reason'
+        top_k: Number of nodes to keep
+        known_vectors: Precomputed embeddings (e.g. from node_embedding) by node id
+
+    Returns:
+        Up to top_k nodes, most similar first
+    """
+    known_vectors = known_vectors or {}
+    unknown = [node for node in nodes if node["id"] not in known_vectors]
+    # Same text as the stored vectors, so the scores are comparable
+    texts = [query] + [generate_node_text(n) for n in unknown]
+    vectors = generate_embeddings(texts)
+    query_vector = vectors[0]
+    node_vectors = dict(known_vectors)
+    node_vectors.update((n["id"], v) for n, v in zip(unknown, vectors[1:]))
+
+    ranked = sorted(
+        nodes,
+        key=lambda n: cosine_similarity(query_vector, node_vectors[n["id"]]),
+        reverse=True,
+    )
+    return ranked[:top_k]
+
+
+def generate_node_text(node: Node | dict) -> str:
+    """Generate text representation of a node for embedding.
+
+    Node dicts (e.g. from an API request) need only a 'label'.
+    """
+    if isinstance(node, dict):
+        parts = [node["label"], node.get("description"), node.get("reason")]
+    else:
+        parts = [node.label, node.description, node.reason]
+    return " | ".join(part for part in parts if part)
 
 
 def store_node_embeddings(
@@ -85,22 +196,31 @@ def store_node_embeddings(
     """
     embeddings = []
 
-    for node in graph.nodes:
-        node_text = generate_node_text(node)
-        embedding_vector = generate_embedding(node_text)
+    with stage_timer("embed"):
+        for node in graph.nodes:
+            node_text = generate_node_text(node)
+            embedding_vector = generate_embedding(node_text)
+
+            node_embedding = NodeEmbedding(
+                analysis_id=analysis_id,
+                node_id=node.id,
+                node_label=node.label,
+                node_description=node.description,
+                embedding=embedding_vector,
+            )
+            session.add(node_embedding)
+            embeddings.append(node_embedding)
+
+        session.commit()
+    return embeddings
 
-        node_embedding = NodeEmbedding(
-            analysis_id=analysis_id,
-            node_id=node.id,
-            node_label=node.label,
-            node_description=node.description,
-            embedding=embedding_vector,
-        )
-        session.add(node_embedding)
-        embeddings.append(node_embedding)
 
-    session.commit()
-    return embeddings
+def refresh_node_embeddings(
+    session: Session, analysis_id: int, graph: Graph
+) -> List[NodeEmbedding]:
+    """Replace the stored embeddings of an analysis after its graph changed."""
+    delete_embeddings_for_analysis(session, analysis_id)
+    return store_node_embeddings(session, analysis_id, graph)
 
 
 def search_similar_nodes(
@@ -0,0 +1,145 @@
+"""Multi-node, multi-level expansion behind /api/expand-nodes.
+
+Each level of the expansion is one round of batched LLM calls over all
+nodes of that level; the children of one level are the nodes of the next.
+"""
+
+from __future__ import annotations
+
+import asyncio
+from typing import Dict, List
+
+from fastapi import HTTPException
+from sqlmodel import Session
+
+from sparsemap.core.config import get_settings
+from sparsemap.domain.models import (
+    Edge,
+    ExpandedNodeData,
+    ExpandNodesRequest,
+    ExpandNodesResponse,
+    Node,
+)
+from sparsemap.services.limits import get_llm_limiter
+from sparsemap.services.llm import expand_nodes
+from sparsemap.services.repository import (
+    get_analysis_by_id,
+    get_node_expansion,
+    save_node_expansion,
+)
+
+
+async def expand_tree(
+    session: Session, request: ExpandNodesRequest
+) -> ExpandNodesResponse:
+    """
+    Expand the requested nodes, and their descendants down to request.depth
+
+    At most expand_max_nodes nodes are expanded per request; deeper nodes
+    beyond that budget are returned unexpanded. Expansions of a saved
+    analysis are read from and written to storage.
+
+    Args:
+        session: Database session
+        request: Nodes to expand
+
+    Returns:
+        ExpandNodesResponse with the merged children and edges
+
+    Raises:
+        HTTPException: 400 if there is nothing to expand or depth is out of range
+    """
+    settings = get_settings()
+    if not request.nodes:
+        raise HTTPException(status_code=400, detail="至少提供一个节点。")
+    if not 1 <= request.depth <= settings.expand_max_depth:
+        raise HTTPException(
+            status_code=400,
+            detail=f"展开深度必须在 1 到 {settings.expand_max_depth} 之间。",
+        )
+
+    analysis_id = request.analysis_id
+    if analysis_id is not None and get_analysis_by_id(session, analysis_id) is None:
+        analysis_id = None
+
+    nodes: Dict[str, Node] = {}
+    edges: Dict[tuple, Edge] = {}
+    failed: List[str] = []
+    budget = max(settings.expand_max_nodes, 1)
+
+    frontier = []
+    seen = set()
+    for target in request.nodes:
+        label = target.node_label.strip()
+        if target.node_id in seen or not label:
+            continue
+        seen.add(target.node_id)
+        frontier.append(
+            {
+                "id": target.node_id,
+                "label": label,
+                "description": target.node_description,
+                "level": target.level,
+            }
+        )
+
+    for _ in range(request.depth):
+        frontier = frontier[:budget]
+        if not frontier:
+            break
+        budget -= len(frontier)
+
+        results: Dict[str, ExpandedNodeData | str] = {}
+        missing = []
+        for node in frontier:
+            stored = (
+                get_node_expansion(session, analysis_id, node["id"], node["label"])
+                if analysis_id is not None
+                else None
+            )
+            if stored:
+                results[node["id"]] = stored
+            else:
+                missing.append(node)
+        if missing:
+            async with get_llm_limiter().slot():
+                generated = await asyncio.to_thread(
+                    expand_nodes, missing, request.graph_context
+                )
+            for node in missing:
+                expansion = generated.get(node["id"], "展开节点失败")
+                results[node["id"]] = expansion
+                if analysis_id is not None and isinstance(expansion, ExpandedNodeData):
+                    if expansion.child_nodes:
+                        save_node_expansion(
+                            session, analysis_id, node["id"], node["label"], expansion
+                        )
+
+        next_frontier = []
+        for node in frontier:
+            expansion = results[node["id"]]
+            if not isinstance(expansion, ExpandedNodeData):
+                failed.append(node["id"])
+                continue
+            for child in expansion.child_nodes:
+                if child.id in nodes or child.id in seen:
+                    continue
+                nodes[child.id] = child
+                next_frontier.append(
+                    {
+                        "id": child.id,
+                        "label": child.label,
+                        "description": child.description,
+                        "level": child.level,
+                    }
+                )
+            for edge in expansion.new_edges:
+                edges.setdefault((edge.source, edge.target), edge)
+        frontier = next_frontier
+
+    data = ExpandedNodeData(
+        child_nodes=list(nodes.values()), new_edges=list(edges.values())
+    )
+    return ExpandNodesResponse(
+        success=bool(nodes) or not failed, data=data, failed=failed
+    )
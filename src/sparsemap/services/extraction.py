@@ -0,0 +1,216 @@
+"""HTML main-content extraction backends."""
+
+from __future__ import annotations
+
+import re
+from typing import Iterable, List, Optional, Protocol
+
+from bs4 import BeautifulSoup
+
+
+class HtmlExtractor(Protocol):
+    """Protocol for HTML text extraction backends."""
+
+    def extract(
+        self, html: str | bytes, max_chars: int, encoding: Optional[str] = None
+    ) -> str:
+        """Extract readable text, returning at most max_chars characters."""
+        ...
+
+
+def _collect_lines(fragments: Iterable[str], max_chars: int) -> str:
+    """Join text fragments into non-empty lines, stopping once max_chars is reached."""
+    lines = []
+    collected = 0
+    for fragment in fragments:
+        for line in fragment.split("\n"):
+            line = line.strip()
+            if line:
+                lines.append(line)
+                collected += len(line) + 1
+        if collected >= max_chars:
+            break
+
+    return "\n".join(lines)[:max_chars]
+
+
+class SoupExtractor:
+    """BeautifulSoup (html.parser) extractor using a main/article/div.content heuristic."""
+
+    def extract(
+        self, html: str | bytes, max_chars: int, encoding: Optional[str] = None
+    ) -> str:
+        if isinstance(html, str):
+            encoding = None
+        soup = BeautifulSoup(html, "html.parser", from_encoding=encoding)
+        for tag in soup(["script", "style", "nav", "header", "footer"]):
+            tag.decompose()
+
+        root = (
+            soup.find("main")
+            or soup.find("article")
+            or soup.find("div", class_="content")
+            or soup.find("body")
+            or soup
+        )
+        return _collect_lines(root.stripped_strings, max_chars)
+
+
+# Elements that never hold article text
+_BOILERPLATE_TAGS = (
+    "script",
+    "style",
+    "noscript",
+    "template",
+    "iframe",
+    "svg",
+    "form",
+    "button",
+    "nav",
+    "header",
+    "footer",
+    "aside",
+)
+# Containers whose class/id suggests navigation, ads or comments
+_UNLIKELY = re.compile(
+    r"comment|sidebar|footer|header|menu|nav|share|social|advert|\bads?\b|promo|"
+    r"related|cookie|banner|breadcrumb|subscribe|newsletter|popup|disqus",
+    re.IGNORECASE,
+)
+_LIKELY = re.compile(r"article|content|main|post|entry|text|body|story", re.I)
+_PARAGRAPH_TAGS = ("p", "pre", "blockquote", "td", "li", "h2", "h3")
+_CONTAINER_TAGS = {"div", "section", "article", "main", "td", "body"}
+_COMMAS = re.compile(r"[,，、;；。]")
+
+
+class LxmlExtractor:
+    """
+    lxml extractor with density-based main-content scoring
+
+    Paragraph-like elements are scored by length and punctuation and their
+    score is propagated to parent containers. Each container's score is then
+    discounted by its link density, so link farms (menus, tag clouds,
+    "related articles") lose to the block holding the prose.
+    """
+
+    def extract(
+        self, html: str | bytes, max_chars: int, encoding: Optional[str] = None
+    ) -> str:
+        try:
+            import lxml.html
+            from lxml import etree
+        except ImportError as exc:
+            raise ValueError(
+                "The lxml extractor backend requires the 'lxml' package"
+            ) from exc
+
+        if isinstance(html, str):
+            html, encoding = html.encode("utf-8"), "utf-8"
+        parser = lxml.html.HTMLParser(encoding=encoding, remove_comments=True)
+        try:
+            doc = lxml.html.document_fromstring(html, parser=parser)
+        except (etree.ParserError, ValueError):
+            return ""
+
+        etree.strip_elements(doc, *_BOILERPLATE_TAGS, with_tail=False)
+        for element in list(doc.iter("div", "section", "ul", "span", "table")):
+            hint = f"{element.get('class', '')} {element.get('id', '')}"
+            if (
+                _UNLIKELY.search(hint)
+                and not _LIKELY.search(hint)
+                and element.getparent() is not None
+            ):
+                element.drop_tree()
+
+        root = self._best_candidate(doc)
+        if root is None:
+            root = doc.find("body")
+            if root is None:
+                root = doc
+        return _collect_lines(root.itertext(), max_chars)
+
+    def _best_candidate(self, doc):
+        scores: dict = {}
+        for paragraph in doc.iter(*_PARAGRAPH_TAGS):
+            text = paragraph.text_content().strip()
+            if len(text) < 25:
+                continue
+            score = 1 + len(_COMMAS.findall(text)) + min(len(text) // 100, 3)
+            parent = paragraph.getparent()
+            for ancestor, weight in ((parent, 1.0), (_parent(parent), 0.5)):
+                if ancestor is None or ancestor.tag not in _CONTAINER_TAGS:
+                    continue
+                if ancestor not in scores:
+                    scores[ancestor] = self._initial_score(ancestor)
+                scores[ancestor] += score * weight
+
+        best = None
+        best_score = 0.0
+        for element, score in scores.items():
+            score *= 1 - _link_density(element)
+            if score > best_score:
+                best, best_score = element, score
+        return best
+
+    @staticmethod
+    def _initial_score(element) -> float:
+        score = {"article": 10, "main": 10, "section": 5, "div": 5}.get(element.tag, 0)
+        hint = f"{element.get('class', '')} {element.get('id', '')}"
+        if _LIKELY.search(hint):
+            score += 25
+        if _UNLIKELY.search(hint):
+            score -= 25
+        return score
+
+
+def _parent(element):
+    return element.getparent() if element is not None else None
+
+
+def _link_density(element) -> float:
+    text_length = len(element.text_content())
+    if not text_length:
+        return 1.0
+    link_length = sum(len(link.text_content()) for link in element.iter("a"))
+    return link_length / text_length
+
+
+# Backend registry
+_EXTRACTORS: dict[str, HtmlExtractor] = {
+    "bs4": SoupExtractor(),
+    "lxml": LxmlExtractor(),
+}
+
+
+def available_backends() -> List[str]:
+    """Names of the registered extraction backends."""
+    return list(_EXTRACTORS)
+
+
+def extract_text(
+    html: str | bytes,
+    max_chars: int,
+    encoding: Optional[str] = None,
+    backend: str = "bs4",
+) -> str:
+    """Extract readable text from an HTML document.
+
+    Args:
+        html: Raw HTML (bytes are decoded using encoding or <meta> sniffing)
+        max_chars: Maximum characters to return
+        encoding: Charset from the Content-Type header, if any
+        backend: Name of the extraction backend ("bs4" or "lxml")
+
+    Returns:
+        Cleaned text, one non-empty line per text fragment
+
+    Raises:
+        ValueError: If backend is not supported
+    """
+    extractor = _EXTRACTORS.get(backend)
+    if not extractor:
+        raise ValueError(
+            f"Unsupported extractor backend: {backend}. "
+            f"Supported backends: {', '.join(_EXTRACTORS)}"
+        )
+    return extractor.extract(html, max_chars, encoding)
@@ -1,31 +1,261 @@
+import asyncio
 import hashlib
-from typing import Tuple
+import logging
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
 
 import httpx
-from bs4 import BeautifulSoup
 from fastapi import HTTPException
+from pydantic import BaseModel
 
 from sparsemap.core.config import get_settings
+from sparsemap.core.metrics import observe_stage, stage_timer
+from sparsemap.domain.models import FetchCache
+from sparsemap.services.extraction import extract_text
+
+logger = logging.getLogger(__name__)
+
+_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) "
+    "AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8",
+    "Accept-Language": "en-US,en;q=0.9,zh-CN;q=0.8,zh;q=0.7",
+}
+
+# Content types we can extract text from; anything else is rejected unread
+_TEXT_CONTENT_TYPES = {"text/html", "application/xhtml+xml", "text/plain"}
+
+
+class FetchResult(BaseModel):
+    """Outcome of fetching one URL; exactly one of text/error is set"""
+
+    url: str
+    text: Optional[str] = None
+    error: Optional[str] = None
+    content_hash: Optional[str] = None
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    not_modified: bool = False  # Text was served from the fetch cache (HTTP 304)
+    parse_ms: float = 0.0  # Time spent extracting text, excluding queueing
+
+
+# Shared extraction pool, created on first use
+_pool: Optional[Executor] = None
+_pool_pending = 0
+
+
+# Query parameters that only track the visitor and never change the page.
+# Generic names such as "ref" or "from" are kept: sites use them to select
+# content (a branch, a page), and stripping them would share one cache key.
+_TRACKING_PARAMS = {
+    "fbclid",
+    "gclid",
+    "dclid",
+    "msclkid",
+    "yclid",
+    "igshid",
+    "mc_cid",
+    "mc_eid",
+    "_hsenc",
+    "_hsmkt",
+    "ref_src",
+}
+_DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+def canonicalize_url(url: str) -> str:
+    """
+    Normalize a URL so trivial variants of the same page share a cache key
+
+    Lowercases scheme and host, drops default ports, fragments, trailing
+    slashes and tracking parameters (utm_*, fbclid, ...), and sorts the
+    remaining query parameters.
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if parts.port and parts.port != _DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{parts.port}"
+    if parts.username:
+        host = f"{parts.username}@{host}"
+
+    query = sorted(
+        (key, value)
+        for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not key.lower().startswith("utm_") and key.lower() not in _TRACKING_PARAMS
+    )
+    return urlunsplit((scheme, host, parts.path.rstrip("/"), urlencode(query), ""))
 
 
 def hash_url(url: str) -> str:
     return hashlib.sha256(url.encode("utf-8")).hexdigest()
 
 
-async def fetch_url_content(url: str) -> Tuple[str, str]:
+def url_cache_key(url: str) -> str:
+    """Cache key of a URL: the hash of its canonical form"""
+    return hash_url(canonicalize_url(url))
+
+
+def hash_content(text: str) -> str:
+    """Hash extracted text, ignoring differences in whitespace"""
+    return hash_url(" ".join(text.split()))
+
+
+def _new_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(timeout=15.0, headers=_HEADERS, follow_redirects=True)
+
+
+async def _download(
+    client: httpx.AsyncClient,
+    url: str,
+    max_bytes: int,
+    cached: Optional[FetchCache] = None,
+) -> Tuple[Optional[bytes], Optional[str], httpx.Headers]:
+    """
+    Stream the response body, giving up on non-HTML and stopping at max_bytes
+
+    When a cache entry is given the request is conditional; a 304 response
+    is returned with a body of None.
+    """
+    headers = {}
+    if cached is not None:
+        if cached.etag:
+            headers["If-None-Match"] = cached.etag
+        if cached.last_modified:
+            headers["If-Modified-Since"] = cached.last_modified
+
+    async with client.stream("GET", url, headers=headers) as response:
+        if response.status_code == 304 and cached is not None:
+            return None, None, response.headers
+        response.raise_for_status()
+
+        content_type = response.headers.get("content-type", "")
+        mime_type = content_type.split(";")[0].strip().lower()
+        if mime_type and mime_type not in _TEXT_CONTENT_TYPES:
+            raise HTTPException(
+                status_code=400,
+                detail=f"不支持的内容类型: {mime_type}。仅支持 HTML 页面。",
+            )
+
+        chunks = []
+        size = 0
+        async for chunk in response.aiter_bytes():
+            chunks.append(chunk)
+            size += len(chunk)
+            if size >= max_bytes:
+                break
+
+        return (
+            b"".join(chunks)[:max_bytes],
+            response.charset_encoding,
+            response.headers,
+        )
+
+
+def _get_pool() -> Optional[Executor]:
+    """Return the extraction executor, or None when parsing runs inline"""
+    global _pool
+    settings = get_settings()
+    if settings.extractor_pool == "inline":
+        return None
+    if _pool is None:
+        if settings.extractor_pool == "process":
+            _pool = ProcessPoolExecutor(max_workers=settings.extractor_pool_workers)
+        elif settings.extractor_pool == "thread":
+            _pool = ThreadPoolExecutor(
+                max_workers=settings.extractor_pool_workers,
+                thread_name_prefix="extract",
+            )
+        else:
+            raise ValueError(
+                f"Unsupported extractor pool: {settings.extractor_pool}. "
+                f"Supported pools: process, thread, inline"
+            )
+    return _pool
+
+
+def shutdown_extraction_pool() -> None:
+    """Stop the extraction pool workers (called on application shutdown)"""
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def extraction_pending() -> int:
+    """Pages waiting for or undergoing extraction in the pool"""
+    return _pool_pending
+
+
+def _timed_extract(
+    body: bytes, max_chars: int, encoding: Optional[str], backend: str
+) -> Tuple[str, float]:
+    # Module-level so it can be pickled into a worker process
+    start = time.perf_counter()
+    text = extract_text(body, max_chars, encoding, backend=backend)
+    return text, (time.perf_counter() - start) * 1000
+
+
+async def _extract_off_loop(body: bytes, encoding: Optional[str]) -> Tuple[str, float]:
+    """
+    Run HTML extraction in the configured pool so the event loop stays free
+
+    Raises:
+        HTTPException: 503 when more than extractor_pool_queue_limit pages are
+            already waiting for or undergoing extraction
+    """
+    global _pool_pending
+    settings = get_settings()
+    args = (body, settings.extractor_max_chars, encoding, settings.extractor_backend)
+
+    pool = _get_pool()
+    if pool is None:
+        return _timed_extract(*args)
+
+    if _pool_pending >= settings.extractor_pool_queue_limit:
+        raise HTTPException(status_code=503, detail="服务器繁忙，请稍后重试。")
+    _pool_pending += 1
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(pool, _timed_extract, *args)
+    finally:
+        _pool_pending -= 1
+
+
+async def fetch_page(
+    url: str,
+    client: Optional[httpx.AsyncClient] = None,
+    cached: Optional[FetchCache] = None,
+) -> FetchResult:
+    """
+    Download a page and extract its main text
+
+    Args:
+        url: Page URL
+        client: Shared HTTP client; a short-lived one is created if omitted
+        cached: Previous fetch of this URL; makes the request conditional and
+            supplies the text when the server answers 304 Not Modified
+
+    Returns:
+        FetchResult with text, content hash, validators and parse time
+
+    Raises:
+        HTTPException: If the page cannot be fetched or has too little text
+    """
     settings = get_settings()
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) "
-        "AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-        "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8",
-        "Accept-Language": "en-US,en;q=0.9,zh-CN;q=0.8,zh;q=0.7",
-    }
     try:
-        async with httpx.AsyncClient(
-            timeout=15.0, headers=headers, follow_redirects=True
-        ) as client:
-            response = await client.get(url)
-            response.raise_for_status()
+        with stage_timer("fetch"):
+            if client is None:
+                async with _new_client() as own_client:
+                    body, encoding, headers = await _download(
+                        own_client, url, settings.extractor_max_bytes, cached
+                    )
+            else:
+                body, encoding, headers = await _download(
+                    client, url, settings.extractor_max_bytes, cached
+                )
     except httpx.HTTPStatusError as exc:
         if exc.response.status_code == 403:
             raise HTTPException(
@@ -41,28 +271,96 @@ async def fetch_url_content(url: str) -> Tuple[str, str]:
             status_code=400, detail=f"无法抓取 URL 内容: {exc}"
         ) from exc
 
-    soup = BeautifulSoup(response.text, "html.parser")
-    for tag in soup(["script", "style", "nav", "header", "footer"]):
-        tag.decompose()
+    if body is None:
+        logger.info(f"Not modified since last fetch: {url}")
+        return FetchResult(
+            url=url,
+            text=cached.text,
+            content_hash=cached.content_hash,
+            etag=headers.get("etag", cached.etag),
+            last_modified=headers.get("last-modified", cached.last_modified),
+            not_modified=True,
+        )
 
-    main_content = (
-        soup.find("main") or soup.find("article") or soup.find("div", class_="content")
+    start = time.perf_counter()
+    cleaned, parse_ms = await _extract_off_loop(body, encoding)
+    wait_ms = (time.perf_counter() - start) * 1000 - parse_ms
+    # Measured in the worker, which may be another process
+    observe_stage("parse", parse_ms / 1000)
+    logger.info(
+        f"Extracted {len(cleaned)} chars from {url} ({len(body)} bytes): "
+        f"parse {parse_ms:.1f} ms, queue {wait_ms:.1f} ms "
+        f"(backend={settings.extractor_backend}, pool={settings.extractor_pool})"
     )
-    if main_content:
-        text = main_content.get_text(separator="\n", strip=True)
-    else:
-        body = soup.find("body")
-        if body:
-            text = body.get_text(separator="\n", strip=True)
-        else:
-            text = soup.get_text(separator="\n", strip=True)
-
-    lines = [line.strip() for line in text.split("\n") if line.strip()]
-    cleaned = "\n".join(lines)
 
     if len(cleaned) < settings.extractor_min_chars:
         raise HTTPException(
             status_code=400, detail="抓取内容过短，请提供更完整的内容。"
         )
 
-    return cleaned[: settings.extractor_max_chars], hash_url(url)
+    return FetchResult(
+        url=url,
+        text=cleaned,
+        content_hash=hash_content(cleaned),
+        etag=headers.get("etag"),
+        last_modified=headers.get("last-modified"),
+        parse_ms=parse_ms,
+    )
+
+
+async def fetch_url_content(
+    url: str, client: Optional[httpx.AsyncClient] = None
+) -> Tuple[str, str]:
+    page = await fetch_page(url, client=client)
+    return page.text, url_cache_key(url)
+
+
+async def fetch_url_contents(
+    urls: List[str], cached: Optional[Dict[str, FetchCache]] = None
+) -> List[FetchResult]:
+    """
+    Fetch several URLs concurrently over one shared client.
+
+    At most ``extractor_fetch_concurrency`` downloads run at once and the whole
+    batch is bounded by ``extractor_fetch_deadline`` seconds. Failures are
+    reported per URL instead of aborting the batch.
+
+    Args:
+        urls: URLs to fetch
+        cached: Previous fetches keyed by URL, used for conditional requests
+
+    Returns:
+        One FetchResult per input URL, in input order
+    """
+    settings = get_settings()
+    semaphore = asyncio.Semaphore(settings.extractor_fetch_concurrency)
+
+    async with _new_client() as client:
+
+        async def _fetch(url: str) -> FetchResult:
+            async with semaphore:
+                try:
+                    return await fetch_page(
+                        url, client=client, cached=(cached or {}).get(url)
+                    )
+                except HTTPException as exc:
+                    return FetchResult(url=url, error=exc.detail)
+                except Exception as exc:
+                    return FetchResult(url=url, error=f"无法抓取 URL 内容: {exc}")
+
+        tasks = [asyncio.create_task(_fetch(url)) for url in urls]
+        if not tasks:
+            return []
+        _, pending = await asyncio.wait(
+            tasks, timeout=settings.extractor_fetch_deadline
+        )
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+    return [
+        task.result()
+        if task not in pending
+        else FetchResult(url=url, error="抓取超时，请稍后重试或直接粘贴页面内容。")
+        for url, task in zip(urls, tasks)
+    ]
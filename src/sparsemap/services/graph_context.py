@@ -0,0 +1,151 @@
+"""Compact context about one node, built from a stored graph.
+
+Instead of clients sending free text (or the whole graph) with every
+node-details or expand request, the server describes the node through its
+k-hop neighborhood: the node itself, the graph summary, the edges around it
+with their reasons and the neighboring concepts. The result is capped at a
+token budget and depends only on the graph, so the same node always gets
+the same prompt.
+"""
+
+from __future__ import annotations
+
+from typing import Dict, List, Optional
+
+from sparsemap.core.config import get_settings
+from sparsemap.domain.models import Graph, Node
+from sparsemap.services.llm_utils import estimate_tokens
+
+
+def find_node(graph: Graph, node_id: str) -> Optional[Node]:
+    return next((node for node in graph.nodes if node.id == node_id), None)
+
+
+def _distances(graph: Graph, node_id: str, hops: int) -> Dict[str, int]:
+    """Edge distance (ignoring direction) of every node within hops of node_id"""
+    neighbors: Dict[str, List[str]] = {}
+    for edge in graph.edges:
+        neighbors.setdefault(edge.source, []).append(edge.target)
+        neighbors.setdefault(edge.target, []).append(edge.source)
+
+    distances = {node_id: 0}
+    frontier = [node_id]
+    for distance in range(1, hops + 1):
+        next_frontier = []
+        for current in frontier:
+            for neighbor in neighbors.get(current, []):
+                if neighbor not in distances:
+                    distances[neighbor] = distance
+                    next_frontier.append(neighbor)
+        frontier = next_frontier
+    return distances
+
+
+def build_node_context(
+    graph: Graph, node_id: str, hops: int = 2, max_tokens: int = 300
+) -> str:
+    """
+    Describe a node through its neighborhood within a token budget
+
+    Lines are added in order of relevance (the node, the summary, edges
+    and neighbors by distance); lines that would exceed the budget are
+    left out.
+
+    Args:
+        graph: Graph holding the node
+        node_id: ID of the node
+        hops: How many edges away neighbors may be
+        max_tokens: Budget, measured with estimate_tokens
+
+    Returns:
+        Context text, or an empty string if the node is not in the graph
+    """
+    node = find_node(graph, node_id)
+    if node is None:
+        return ""
+
+    distances = _distances(graph, node_id, hops)
+    labels = {n.id: n.label for n in graph.nodes}
+
+    head = [f"节点：{node.label}"]
+    if node.description:
+        head.append(f"描述：{node.description}")
+    if node.reason:
+        head.append(f"作用：{node.reason}")
+    if graph.summary:
+        head.append(f"图谱概述：{graph.summary}")
+
+    # Edges inside the neighborhood, closest first (sorted is stable: ties
+    # keep graph order)
+    edges = [
+        edge
+        for edge in graph.edges
+        if edge.source in distances
+        and edge.target in distances
+        and edge.source in labels
+        and edge.target in labels
+    ]
+    edges = sorted(edges, key=lambda e: min(distances[e.source], distances[e.target]))
+    relations = [
+        f"- {labels[e.source]} --{e.type.value}--> {labels[e.target]}"
+        + (f"：{e.reason}" if e.reason else "")
+        for e in edges
+    ]
+
+    related_nodes = sorted(
+        (n for n in graph.nodes if n.id != node_id and n.id in distances),
+        key=lambda n: distances[n.id],
+    )
+    related = [
+        f"- {n.label}" + (f"：{n.description}" if n.description else "")
+        for n in related_nodes
+    ]
+
+    lines: List[str] = []
+    used = 0
+
+    def add(line: str) -> bool:
+        nonlocal used
+        cost = estimate_tokens(line) + 1  # Newline
+        if used + cost > max_tokens:
+            return False
+        lines.append(line)
+        used += cost
+        return True
+
+    for line in head:
+        add(line)
+    for title, section in (("关系：", relations), ("相关概念：", related)):
+        if section and add(title):
+            added = [add(line) for line in section]
+            if not any(added):
+                # Drop a heading without entries
+                lines.pop()
+                used -= estimate_tokens(title) + 1
+    return "\n".join(lines)
+
+
+def describe_node(graph: Graph, node_id: str, label: str) -> Optional[str]:
+    """
+    Context for a node as configured in settings
+
+    Args:
+        graph: Stored graph
+        node_id: ID of the node
+        label: Label the client knows the node by
+
+    Returns:
+        The context, or None if the stored graph has no such node with that
+        label (e.g. an unsaved edit), in which case the caller's own
+        context should be used
+    """
+    node = find_node(graph, node_id)
+    if node is None or node.label != label:
+        return None
+    settings = get_settings()
+    return build_node_context(
+        graph,
+        node_id,
+        hops=settings.node_context_hops,
+        max_tokens=settings.node_context_max_tokens,
+    )
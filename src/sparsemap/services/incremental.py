@@ -0,0 +1,237 @@
+"""Incremental re-analysis of changed documents.
+
+Instead of re-running the whole document through the LLM when a page or text
+changes slightly, the old and new text are diffed paragraph by paragraph,
+only the changed regions are analyzed, and the resulting sub-graph is merged
+into the stored graph.
+"""
+
+from __future__ import annotations
+
+import difflib
+import logging
+from typing import List, Optional, Tuple
+
+from pydantic import BaseModel
+
+from sparsemap.core.config import get_settings
+from sparsemap.domain.models import Graph, Node
+from sparsemap.services.extractor import hash_content
+from sparsemap.services.llm import analyze_contents
+
+logger = logging.getLogger(__name__)
+
+
+class TextDiff(BaseModel):
+    """Paragraph-level difference between two versions of a text"""
+
+    added: List[str]  # Changed or inserted regions of the new text
+    removed: List[str]  # Changed or deleted regions of the old text
+    change_ratio: float  # Share of the new text's characters that changed
+
+
+class RefreshResult(BaseModel):
+    """Outcome of re-analyzing a changed document"""
+
+    graph: Graph
+    mode: str  # "unchanged", "incremental" or "full"
+    changed_chunks: int = 0
+    added_nodes: int = 0
+    removed_nodes: int = 0
+
+
+def split_paragraphs(text: str) -> List[str]:
+    """Split text into non-empty, stripped paragraphs (one per line)"""
+    return [line.strip() for line in text.splitlines() if line.strip()]
+
+
+def diff_paragraphs(old_text: str, new_text: str) -> TextDiff:
+    """
+    Diff two texts at paragraph granularity
+
+    Args:
+        old_text: Previously analyzed text
+        new_text: Current text
+
+    Returns:
+        TextDiff with one entry per contiguous changed region
+    """
+    old = split_paragraphs(old_text)
+    new = split_paragraphs(new_text)
+    matcher = difflib.SequenceMatcher(None, old, new, autojunk=False)
+
+    added = []
+    removed = []
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag in ("replace", "delete"):
+            removed.append("\n".join(old[i1:i2]))
+        if tag in ("replace", "insert"):
+            added.append("\n".join(new[j1:j2]))
+
+    new_chars = sum(len(p) for p in new) or 1
+    change_ratio = min(sum(len(chunk) for chunk in added) / new_chars, 1.0)
+    return TextDiff(added=added, removed=removed, change_ratio=change_ratio)
+
+
+def _normalize_label(label: str) -> str:
+    return " ".join(label.casefold().split())
+
+
+def _stale_node_ids(graph: Graph, removed: List[str], new_text: str) -> set:
+    """
+    Nodes anchored only in removed text
+
+    A node is considered stale when its label literally occurs in a removed
+    region and nowhere in the new text. Nodes without a textual anchor are
+    kept, erring on the side of not losing knowledge.
+    """
+    removed_text = _normalize_label("\n".join(removed))
+    current_text = _normalize_label(new_text)
+    return {
+        node.id
+        for node in graph.nodes
+        if (label := _normalize_label(node.label))
+        and label in removed_text
+        and label not in current_text
+    }
+
+
+def patch_graph(
+    graph: Graph,
+    delta: Graph,
+    stale_ids: set,
+    id_prefix: str,
+    source: Optional[str] = None,
+) -> Tuple[Graph, int]:
+    """
+    Merge a sub-graph from changed regions into an existing graph
+
+    Delta nodes whose label matches an existing node are merged into it;
+    the rest are added under ids prefixed with id_prefix so they cannot
+    collide with existing ids. Stale nodes and every edge touching them are
+    dropped, as are delta edges whose endpoints are unknown or duplicated.
+
+    Args:
+        graph: Stored graph
+        delta: Graph extracted from the changed regions only
+        stale_ids: Ids of existing nodes to remove
+        id_prefix: Prefix for ids of newly added nodes
+        source: Source label of the document (e.g. "url1") given to added
+            nodes in place of the internal change chunk names
+
+    Returns:
+        Tuple of (patched graph, number of nodes added)
+    """
+    nodes = [node for node in graph.nodes if node.id not in stale_ids]
+    by_label = {_normalize_label(node.label): node.id for node in nodes}
+
+    id_map = {}
+    added: List[Node] = []
+    for node in delta.nodes:
+        existing_id = by_label.get(_normalize_label(node.label))
+        if existing_id:
+            id_map[node.id] = existing_id
+            continue
+        new_id = f"{id_prefix}{node.id}"
+        id_map[node.id] = new_id
+        by_label[_normalize_label(node.label)] = new_id
+        update = {"id": new_id}
+        if source is not None:
+            update["source"] = source
+        added.append(node.model_copy(update=update))
+
+    for node in added:
+        if node.parent_id:
+            node.parent_id = id_map.get(node.parent_id, node.parent_id)
+    nodes.extend(added)
+
+    node_ids = {node.id for node in nodes}
+    edges = [
+        edge
+        for edge in graph.edges
+        if edge.source in node_ids and edge.target in node_ids
+    ]
+    seen = {(edge.source, edge.target, edge.type) for edge in edges}
+    for edge in delta.edges:
+        source = id_map.get(edge.source)
+        target = id_map.get(edge.target)
+        if not source or not target or source == target:
+            continue
+        if (source, target, edge.type) in seen:
+            continue
+        seen.add((source, target, edge.type))
+        edges.append(edge.model_copy(update={"source": source, "target": target}))
+
+    return Graph(nodes=nodes, edges=edges, summary=graph.summary), len(added)
+
+
+def refresh_graph(
+    graph: Optional[Graph],
+    old_text: Optional[str],
+    new_text: str,
+    source: str = "text1",
+) -> RefreshResult:
+    """
+    Re-analyze a document that changed since its graph was built
+
+    Falls back to a full analysis when the old text or graph is unknown, or
+    when more than incremental_max_change_ratio of the text changed.
+
+    Args:
+        graph: Stored graph of the previous version
+        old_text: Text the stored graph was built from
+        new_text: Current text
+        source: Source label of the document, for a full analysis and for
+            nodes an incremental one adds
+
+    Returns:
+        RefreshResult with the new graph and what was done
+
+    Raises:
+        ValueError: If LLM generation or parsing fails
+    """
+    settings = get_settings()
+    if graph is not None and old_text is not None:
+        if hash_content(old_text) == hash_content(new_text):
+            return RefreshResult(graph=graph, mode="unchanged")
+
+        diff = diff_paragraphs(old_text, new_text)
+        if diff.change_ratio <= settings.incremental_max_change_ratio:
+            stale_ids = _stale_node_ids(graph, diff.removed, new_text)
+            delta = Graph(nodes=[], edges=[])
+            if diff.added:
+                contents = [
+                    {"source": f"change{idx}", "text": chunk}
+                    for idx, chunk in enumerate(diff.added, start=1)
+                ]
+                delta = analyze_contents(
+                    contents, known_labels=[node.label for node in graph.nodes]
+                )
+            patched, added_count = patch_graph(
+                graph,
+                delta,
+                stale_ids,
+                id_prefix=f"{hash_content(new_text)[:6]}_",
+                source=source,
+            )
+            logger.info(
+                f"Incremental refresh: {len(diff.added)} changed chunks "
+                f"({diff.change_ratio:.0%} of text), +{added_count} / "
+                f"-{len(stale_ids)} nodes"
+            )
+            return RefreshResult(
+                graph=patched,
+                mode="incremental",
+                changed_chunks=len(diff.added),
+                added_nodes=added_count,
+                removed_nodes=len(stale_ids),
+            )
+
+    new_graph = analyze_contents([{"source": source, "text": new_text}])
+    return RefreshResult(
+        graph=new_graph,
+        mode="full",
+        changed_chunks=1,
+        added_nodes=len(new_graph.nodes),
+        removed_nodes=len(graph.nodes) if graph else 0,
+    )
@@ -0,0 +1,245 @@
+"""Background execution of analysis jobs.
+
+Jobs live in the analysis_job table; the in-process queue only carries their
+ids. Every runner periodically sweeps the table for queued jobs, so jobs
+submitted to a process without workers (JOB_WORKERS=0) or left behind by a
+restart are still executed; claiming a job is atomic, so it runs only once.
+A running job's worker refreshes its heartbeat; jobs whose heartbeat went
+stale (their server stopped or crashed) are requeued by the runners still
+alive, while jobs of other live processes are left alone. A job interrupted
+max_attempts times fails instead of crashing worker after worker.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set
+
+from fastapi import BackgroundTasks, HTTPException
+from sqlmodel import Session
+
+from sparsemap.core.config import get_settings
+from sparsemap.domain.models import (
+    AnalysisJob,
+    AnalyzeRequest,
+    AnalyzeResponse,
+    JobResponse,
+    JobStatus,
+)
+from sparsemap.services.analysis import run_analysis
+from sparsemap.services.repository import (
+    claim_job,
+    finish_job,
+    queued_job_ids,
+    requeue_stale_jobs,
+    set_job_stage,
+    touch_job,
+)
+from sparsemap.services.usage import llm_endpoint
+
+logger = logging.getLogger(__name__)
+
+FINISHED_STATUSES = {JobStatus.succeeded, JobStatus.failed}
+
+
+def job_response(job: AnalysisJob) -> JobResponse:
+    """API view of a job record"""
+    return JobResponse(
+        id=job.id,
+        status=job.status,
+        stage=job.stage,
+        result=AnalyzeResponse.model_validate(job.result_data)
+        if job.result_data
+        else None,
+        error=job.error,
+        created_at=job.created_at,
+        started_at=job.started_at,
+        finished_at=job.finished_at,
+    )
+
+
+class JobRunner:
+    """
+    Pool of asyncio workers executing analysis jobs
+
+    Progress is published to in-process subscribers (the SSE endpoint) as
+    the job moves through its stages.
+    """
+
+    def __init__(
+        self,
+        engine,
+        workers: int,
+        heartbeat_interval: float = 15.0,
+        stale_after: float = 120.0,
+        max_attempts: int = 3,
+    ):
+        self.engine = engine
+        self.workers = workers
+        self.heartbeat_interval = heartbeat_interval
+        self.stale_after = stale_after
+        self.max_attempts = max_attempts
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._pending: Set[int] = set()  # Ids in _queue, not yet taken by a worker
+        self._tasks: List[asyncio.Task] = []
+        self._subscribers: Dict[int, Set[asyncio.Queue]] = {}
+
+    async def start(self) -> None:
+        """Re-enqueue unfinished jobs and start the workers"""
+        job_ids = self._find_queued()
+        for job_id in job_ids:
+            self._enqueue(job_id)
+        if job_ids:
+            logger.info(f"Resuming {len(job_ids)} unfinished analysis jobs")
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._sweep()))
+
+    async def stop(self) -> None:
+        """Cancel the workers; interrupted jobs resume on the next start"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    @property
+    def queued(self) -> int:
+        """Jobs waiting for a worker"""
+        return self._queue.qsize()
+
+    def _find_queued(self) -> List[int]:
+        """Requeue stale running jobs and return all queued ones"""
+        stale_before = datetime.utcnow() - timedelta(seconds=self.stale_after)
+        with Session(self.engine) as session:
+            requeued = requeue_stale_jobs(session, stale_before, self.max_attempts)
+            if requeued:
+                logger.warning(f"Requeued {len(requeued)} jobs of a stopped worker")
+            return queued_job_ids(session)
+
+    def _enqueue(self, job_id: int) -> None:
+        if job_id not in self._pending:
+            self._pending.add(job_id)
+            self._queue.put_nowait(job_id)
+
+    async def _sweep(self) -> None:
+        """Pick up jobs no worker of a live process is going to run"""
+        while True:
+            await asyncio.sleep(self.stale_after / 2)
+            try:
+                job_ids = self._find_queued()
+            except Exception:
+                logger.exception("Sweeping for queued analysis jobs failed")
+                continue
+            for job_id in job_ids:
+                self._enqueue(job_id)
+
+    async def _heartbeat(self, job_id: int) -> None:
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            try:
+                # Own session: the job's session is busy with the analysis
+                with Session(self.engine) as session:
+                    touch_job(session, job_id)
+            except Exception:
+                logger.exception(f"Heartbeat of analysis job {job_id} failed")
+
+    def submit(self, job_id: int) -> None:
+        self._enqueue(job_id)
+
+    def subscribe(self, job_id: int) -> asyncio.Queue:
+        """Receive a JobResponse on the returned queue whenever the job changes"""
+        queue: asyncio.Queue = asyncio.Queue()
+        self._subscribers.setdefault(job_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, job_id: int, queue: asyncio.Queue) -> None:
+        subscribers = self._subscribers.get(job_id)
+        if subscribers is not None:
+            subscribers.discard(queue)
+            if not subscribers:
+                del self._subscribers[job_id]
+
+    def _publish(self, job: AnalysisJob) -> None:
+        for queue in self._subscribers.get(job.id, ()):
+            queue.put_nowait(job_response(job))
+
+    async def _worker(self) -> None:
+        while True:
+            job_id = await self._queue.get()
+            self._pending.discard(job_id)
+            try:
+                with llm_endpoint("job"):
+                    await self.run_job(job_id)
+            except Exception:
+                logger.exception(f"Analysis job {job_id} crashed")
+            finally:
+                self._queue.task_done()
+
+    async def run_job(self, job_id: int) -> None:
+        """Execute one job, unless another worker already claimed it"""
+        with Session(self.engine) as session:
+            job = claim_job(session, job_id)
+            if job is None:
+                return
+            self._publish(job)
+
+            def on_stage(stage: str) -> None:
+                set_job_stage(session, job, stage)
+                self._publish(job)
+
+            background_tasks = BackgroundTasks()
+            heartbeat = asyncio.create_task(self._heartbeat(job_id))
+            try:
+                request = AnalyzeRequest.model_validate(job.request_data)
+                result = await run_analysis(
+                    session, request, background_tasks, on_stage=on_stage
+                )
+            except HTTPException as exc:
+                job = finish_job(session, job, error=str(exc.detail))
+            except Exception as exc:
+                logger.exception(f"Analysis job {job_id} failed")
+                job = finish_job(session, job, error=f"分析失败: {exc}")
+            else:
+                job = finish_job(session, job, result=result)
+            finally:
+                heartbeat.cancel()
+            self._publish(job)
+
+            # Embeddings, which the synchronous endpoint runs after responding
+            try:
+                await background_tasks()
+            except Exception:
+                logger.exception(f"Embedding for analysis job {job_id} failed")
+
+
+_runner: Optional[JobRunner] = None
+
+
+def get_job_runner() -> Optional[JobRunner]:
+    """The runner of this process, or None if jobs are not executed here"""
+    return _runner
+
+
+async def start_job_runner(engine, workers: int) -> Optional[JobRunner]:
+    """Start the process-wide runner (no-op when workers is 0)"""
+    global _runner
+    if workers <= 0 or _runner is not None:
+        return _runner
+    settings = get_settings()
+    _runner = JobRunner(
+        engine,
+        workers,
+        heartbeat_interval=settings.job_heartbeat_interval,
+        stale_after=settings.job_stale_after,
+        max_attempts=settings.job_max_attempts,
+    )
+    await _runner.start()
+    return _runner
+
+
+async def stop_job_runner() -> None:
+    global _runner
+    if _runner is not None:
+        await _runner.stop()
+        _runner = None
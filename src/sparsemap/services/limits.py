@@ -0,0 +1,76 @@
+"""Process-wide limits on analysis LLM calls.
+
+Every analysis path (/api/analyze, jobs, batches) goes through the same
+limiter, so a 200-item batch cannot starve interactive requests or exceed
+the provider's rate limit on its own.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+
+from sparsemap.core.config import get_settings
+
+
+class LLMLimiter:
+    """Caps concurrent LLM calls and spaces out their start times"""
+
+    def __init__(self, max_concurrency: int, requests_per_minute: int = 0):
+        self._semaphore = asyncio.Semaphore(max(max_concurrency, 1))
+        # Background work (prefetching) never holds the last slot, so with a
+        # single slot there is none for it
+        self.background_slots = max(max_concurrency - 1, 0)
+        self._background = asyncio.Semaphore(self.background_slots)
+        self._interval = 60.0 / requests_per_minute if requests_per_minute > 0 else 0
+        self._lock = asyncio.Lock()
+        self._next_start = 0.0
+
+    @asynccontextmanager
+    async def slot(self, background: bool = False) -> AsyncIterator[None]:
+        """
+        Hold one LLM call slot for the duration of the block
+
+        Args:
+            background: Low-priority call; at most max_concurrency - 1 of
+                these run at once, so one slot stays free for users
+
+        Raises:
+            RuntimeError: For a background call when background_slots is 0
+        """
+        if background:
+            if not self.background_slots:
+                raise RuntimeError("No LLM slot can be spared for background work")
+            async with self._background:
+                async with self.slot():
+                    yield
+            return
+
+        async with self._semaphore:
+            if self._interval:
+                async with self._lock:
+                    now = time.monotonic()
+                    delay = self._next_start - now
+                    self._next_start = max(now, self._next_start) + self._interval
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            yield
+
+
+_limiter: Optional[LLMLimiter] = None
+_limiter_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def get_llm_limiter() -> LLMLimiter:
+    """The limiter of the running event loop, created from settings"""
+    global _limiter, _limiter_loop
+    loop = asyncio.get_running_loop()
+    if _limiter is None or _limiter_loop is not loop:
+        settings = get_settings()
+        _limiter = LLMLimiter(
+            settings.llm_max_concurrency, settings.llm_requests_per_minute
+        )
+        _limiter_loop = loop
+    return _limiter
@@ -1,21 +1,47 @@
 from __future__ import annotations
 
 import logging
-from typing import List
+from typing import Dict, List, Optional, Tuple
+
+from pydantic import BaseModel
 
 from sparsemap.core.config import get_settings
-from sparsemap.domain.models import Graph, NodeDetails
+from sparsemap.core.metrics import stage_timer
+from sparsemap.domain.models import (
+    Edge,
+    EdgeType,
+    ExpandedNodeData,
+    Graph,
+    Node,
+    NodeDetails,
+    NodeType,
+    Priority,
+)
+from sparsemap.services.cassette import get_cassette
+from sparsemap.services.embedding import rank_by_similarity
 from sparsemap.services.llm_provider import LLMProvider
-from sparsemap.services.providers import DeepSeekProvider, GeminiProvider
+from sparsemap.services.llm_utils import estimate_tokens, extract_json, repair_json
+from sparsemap.services.providers import (
+    DeepSeekProvider,
+    GeminiProvider,
+    ReplayProvider,
+    StubProvider,
+)
 
 
 logger = logging.getLogger(__name__)
 
 
-def _get_provider() -> LLMProvider:
+def _get_provider(
+    model: Optional[str] = None, max_tokens: Optional[int] = None
+) -> LLMProvider:
     """
     Get LLM provider based on configuration
 
+    Args:
+        model: Model to use instead of llm_model
+        max_tokens: Output budget to use instead of llm_max_tokens
+
     Returns:
         LLMProvider: Configured provider instance
 
@@ -24,33 +50,53 @@ def _get_provider() -> LLMProvider:
     """
     settings = get_settings()
     provider_name = settings.llm_provider.lower()
+    model = model or settings.llm_model
+    max_tokens = max_tokens or settings.llm_max_tokens
+    cassette = (
+        get_cassette(settings.llm_cassette)
+        if settings.llm_record and settings.llm_cassette
+        else None
+    )
 
     if provider_name == "gemini":
         return GeminiProvider(
             api_key=settings.llm_api_key,
             base_url=settings.llm_base_url,
-            model=settings.llm_model,
+            model=model,
             temperature=settings.llm_temperature,
-            max_tokens=settings.llm_max_tokens,
+            max_tokens=max_tokens,
             max_retries=settings.llm_max_retries,
+            cassette=cassette,
+            context_cache_ttl=settings.llm_context_cache_ttl,
         )
     elif provider_name == "deepseek":
         return DeepSeekProvider(
             api_key=settings.llm_api_key,
             base_url=settings.llm_base_url,
-            model=settings.llm_model,
+            model=model,
             temperature=settings.llm_temperature,
-            max_tokens=settings.llm_max_tokens,
+            max_tokens=max_tokens,
+            max_retries=settings.llm_max_retries,
+            cassette=cassette,
+        )
+    elif provider_name == "stub":
+        return StubProvider(model=model)
+    elif provider_name == "replay":
+        if not settings.llm_cassette:
+            raise ValueError("LLM_CASSETTE is required for the replay provider")
+        return ReplayProvider(
+            get_cassette(settings.llm_cassette),
+            replay_latency=settings.llm_replay_latency,
             max_retries=settings.llm_max_retries,
         )
     else:
         raise ValueError(
             f"Unsupported LLM provider: {provider_name}. "
-            f"Supported providers: gemini, deepseek"
+            f"Supported providers: gemini, deepseek, stub, replay"
         )
 
 
-def build_prompt(contents: List[dict]) -> str:
+def build_prompt(contents: List[dict], known_labels: Optional[List[str]] = None) -> str:
     prompt = """你是一位资深的教学专家和知识架构师。请分析以下课程内容，提取逻辑骨架和知识依赖关系。
 
 要求：
@@ -82,20 +128,104 @@ def build_prompt(contents: List[dict]) -> str:
   ],
   "summary": "整体课程逻辑的简要总结"
 }
-
-内容：
 """
+    if known_labels:
+        # Incremental analysis: let the model reuse existing node labels verbatim
+        prompt += (
+            "\n图谱中已有以下节点，涉及相同概念时请使用完全相同的 label：\n"
+            + "、".join(known_labels)
+            + "\n"
+        )
+    prompt += "\n内容：\n"
     for content in contents:
         prompt += f"\n\n=== 来源 {content['source']} ===\n{content['text']}\n"
     return prompt
 
 
-def analyze_contents(contents: List[dict]) -> Graph:
+class ModelRoute(BaseModel):
+    """Model and output budget chosen for one analysis prompt"""
+
+    model: str
+    max_tokens: int
+    input_tokens: int  # Estimated size of the prompt
+
+
+def parse_model_routes(spec: str) -> List[Tuple[Optional[int], str]]:
+    """
+    Parse the llm_model_routes routing table
+
+    The table is a comma-separated list of "max_input_tokens:model" entries,
+    e.g. "3000:gemini-2.0-flash-lite,*:gemini-1.5-pro"; "*" matches any size.
+
+    Args:
+        spec: Routing table; empty for none
+
+    Returns:
+        (bound, model) pairs, smallest bound first and "*" (None) last
+
+    Raises:
+        ValueError: If an entry is malformed
+    """
+    routes: List[Tuple[Optional[int], str]] = []
+    for entry in spec.split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        bound, _, model = entry.partition(":")
+        bound, model = bound.strip(), model.strip()
+        if not model or not (bound == "*" or bound.isdigit()):
+            raise ValueError(
+                f"Unsupported model route: {entry!r}. Expected max_input_tokens:model"
+            )
+        routes.append((None if bound == "*" else int(bound), model))
+    return sorted(routes, key=lambda route: (route[0] is None, route[0] or 0))
+
+
+def route_analysis(prompt: str) -> ModelRoute:
+    """
+    Pre-flight sizing of an analysis call
+
+    Picks the model of the first route whose bound fits the estimated prompt
+    size (llm_model if none does) and sizes the output budget to the graph
+    expected for that much input, capped at llm_max_tokens.
+
+    Args:
+        prompt: Analysis prompt
+
+    Returns:
+        ModelRoute for the call
+    """
+    settings = get_settings()
+    input_tokens = estimate_tokens(prompt)
+
+    model = settings.llm_model
+    for bound, routed in parse_model_routes(settings.llm_model_routes):
+        if bound is None or input_tokens <= bound:
+            model = routed
+            break
+
+    max_tokens = settings.llm_max_tokens
+    if settings.llm_output_tokens_ratio > 0:
+        expected = settings.llm_output_base_tokens + int(
+            input_tokens * settings.llm_output_tokens_ratio
+        )
+        max_tokens = min(expected, max_tokens)
+    return ModelRoute(model=model, max_tokens=max_tokens, input_tokens=input_tokens)
+
+
+def analyze_contents(
+    contents: List[dict], known_labels: Optional[List[str]] = None
+) -> Graph:
     """
     Analyze contents and generate knowledge graph using configured LLM provider
 
+    The model and output budget are chosen per call by route_analysis. If the
+    routed call fails, the analysis is retried once with llm_model and the
+    full llm_max_tokens.
+
     Args:
         contents: List of content dictionaries with 'source' and 'text' keys
+        known_labels: Labels of nodes already in the graph (incremental analysis)
 
     Returns:
         Graph: Parsed knowledge graph
@@ -103,9 +233,29 @@ def analyze_contents(contents: List[dict]) -> Graph:
     Raises:
         ValueError: If generation or parsing fails
     """
-    provider = _get_provider()
-    prompt = build_prompt(contents)
-    return provider.generate_graph(contents, prompt)
+    settings = get_settings()
+    with stage_timer("prompt"):
+        prompt = build_prompt(contents, known_labels)
+    route = route_analysis(prompt)
+    logger.info(
+        f"Analysis of ~{route.input_tokens} input tokens routed to {route.model} "
+        f"(max_tokens={route.max_tokens})"
+    )
+    provider = _get_provider(model=route.model, max_tokens=route.max_tokens)
+    if (
+        route.model == settings.llm_model
+        and route.max_tokens >= settings.llm_max_tokens
+    ):
+        return provider.generate_graph(contents, prompt)
+
+    try:
+        return provider.generate_graph(contents, prompt)
+    except ValueError as exc:
+        # Small model out of its depth, or a graph larger than expected
+        logger.warning(
+            f"Routed analysis failed ({exc}); retrying with {settings.llm_model}"
+        )
+        return _get_provider().generate_graph(contents, prompt)
 
 
 def generate_node_details(node_label: str, context: str) -> NodeDetails:
@@ -123,13 +273,114 @@ def generate_node_details(node_label: str, context: str) -> NodeDetails:
     return provider.generate_node_details(node_label, context)
 
 
-def integrate_concept(new_concept: str, existing_nodes: List[dict]) -> dict:
+def generate_node_details_batch(nodes: List[dict]) -> List[NodeDetails | str]:
+    """
+    Generate detailed explanations for many nodes with as few LLM calls as possible
+
+    Nodes are sent node_details_max_batch at a time in one structured
+    request each. Nodes missing from a batch response, or whose whole batch
+    failed, fall back to a single-node request.
+
+    Args:
+        nodes: List of dicts with 'label' and 'context' keys
+
+    Returns:
+        One entry per node, in order: NodeDetails, or an error message
+    """
+    provider = _get_provider()
+    max_batch = max(get_settings().node_details_max_batch, 1)
+
+    results: List[NodeDetails | str] = []
+    for start in range(0, len(nodes), max_batch):
+        chunk = nodes[start : start + max_batch]
+        batch: List[Optional[NodeDetails]] = [None] * len(chunk)
+        if len(chunk) > 1:
+            try:
+                batch = provider.generate_node_details_batch(chunk)
+            except ValueError as exc:
+                logger.warning(f"Batched node details failed, falling back: {exc}")
+
+        missing = sum(details is None for details in batch)
+        if missing and len(chunk) > 1:
+            logger.info(f"Node details batch: {missing}/{len(chunk)} nodes retried")
+        for node, details in zip(chunk, batch):
+            if details is None:
+                try:
+                    details = provider.generate_node_details(
+                        node["label"], node["context"]
+                    )
+                except ValueError as exc:
+                    results.append(str(exc))
+                    continue
+            results.append(details)
+    return results
+
+
+def _format_existing_nodes(nodes: List[dict]) -> str:
+    return "\n".join(
+        [
+            f"- {n['label']} (id: {n['id']}): {n.get('description', 'No description')}"
+            for n in nodes
+        ]
+    )
+
+
+def select_integration_candidates(
+    new_concept: str,
+    existing_nodes: List[dict],
+    node_vectors: Optional[Dict[str, List[float]]] = None,
+) -> List[dict]:
+    """
+    Keep only the existing nodes most similar to a new concept
+
+    At most integrate_max_candidates nodes, ranked by embedding similarity,
+    are kept. If embedding fails, all nodes are kept.
+
+    Args:
+        new_concept: The new concept to integrate
+        existing_nodes: List of existing nodes with id, label, description
+        node_vectors: Stored node embeddings by node id, to avoid recomputing
+
+    Returns:
+        The candidate nodes, most similar first
+    """
+    top_k = get_settings().integrate_max_candidates
+    if top_k <= 0 or len(existing_nodes) <= top_k:
+        return existing_nodes
+
+    try:
+        candidates = rank_by_similarity(
+            new_concept, existing_nodes, top_k, known_vectors=node_vectors
+        )
+    except Exception as exc:
+        logger.warning(f"Candidate preselection failed, sending all nodes: {exc}")
+        return existing_nodes
+
+    saved = estimate_tokens(_format_existing_nodes(existing_nodes)) - estimate_tokens(
+        _format_existing_nodes(candidates)
+    )
+    logger.info(
+        f"Integrate concept: sent {len(candidates)}/{len(existing_nodes)} nodes, "
+        f"~{saved} prompt tokens saved"
+    )
+    return candidates
+
+
+def integrate_concept(
+    new_concept: str,
+    existing_nodes: List[dict],
+    node_vectors: Optional[Dict[str, List[float]]] = None,
+) -> dict:
     """
     Analyze how a new concept relates to existing graph nodes
 
+    On large graphs only the nodes most similar to the new concept are sent
+    (see select_integration_candidates).
+
     Args:
         new_concept: The new concept to integrate
         existing_nodes: List of existing nodes with id, label, description
+        node_vectors: Stored node embeddings by node id, to avoid recomputing
 
     Returns:
         dict with 'node' and 'edges' representing the new concept and its relationships
@@ -137,20 +388,15 @@ def integrate_concept(new_concept: str, existing_nodes: List[dict]) -> dict:
     provider = _get_provider()
 
     # Build the prompt for integration analysis
-    nodes_text = "\n".join(
-        [
-            f"- {n['label']} (id: {n['id']}): {n.get('description', 'No description')}"
-            for n in existing_nodes
-        ]
+    candidates = select_integration_candidates(
+        new_concept, existing_nodes, node_vectors
     )
+    nodes_text = _format_existing_nodes(candidates)
 
+    # Static instructions first, request data last: a stable prefix the
+    # provider can cache across calls
     prompt = f"""你是一位知识架构专家。用户想要将一个新概念关联到现有知识图谱中。
 
-新概念: {new_concept}
-
-现有图谱节点:
-{nodes_text}
-
 任务:
 1. 分析新概念与现有节点的关系
 2. 创建新节点表示这个概念
@@ -160,7 +406,7 @@ def integrate_concept(new_concept: str, existing_nodes: List[dict]) -> dict:
 {{
   "node": {{
     "id": "linked_1",
-    "label": "{new_concept}",
+    "label": "新概念名称",
     "description": "对这个概念的简短描述",
     "reason": "为什么这个概念与图谱相关"
   }},
@@ -179,6 +425,11 @@ def integrate_concept(new_concept: str, existing_nodes: List[dict]) -> dict:
 - 只连接真正相关的节点，不要强行建立关系
 - 如果找不到明显相关的节点，edges 可以为空数组
 - type 可以是: relates_to, depends_on, supports, implements
+
+新概念: {new_concept}
+
+现有图谱节点:
+{nodes_text}
 """
 
     # Use the provider to generate integration
@@ -220,7 +471,7 @@ def expand_node(
     node_label: str,
     node_description: str | None,
     graph_context: str | None,
-) -> dict:
+) -> ExpandedNodeData:
     """
     Expand a node to reveal its sub-concepts and details.
 
@@ -231,7 +482,7 @@ def expand_node(
         graph_context: Optional context about the current graph
 
     Returns:
-        dict with 'child_nodes' and 'new_edges'
+        ExpandedNodeData with the child nodes and their edges
     """
     provider = _get_provider()
 
@@ -243,9 +494,6 @@ def expand_node(
 
     prompt = f"""你是一位知识架构专家。用户想要展开一个知识节点，查看其包含的子概念。
 
-要展开的节点: {node_label} (id: {node_id})
-{context_text}
-
 任务:
 1. 分析这个概念，找出其包含的 2-4 个核心子概念或组成部分
 2. 为每个子概念创建节点
@@ -255,7 +503,7 @@ def expand_node(
 {{
   "child_nodes": [
     {{
-      "id": "{node_id}_sub1",
+      "id": "父节点id_sub1",
       "label": "子概念名称",
       "type": "dependency",
       "priority": "critical" | "optional",
@@ -263,13 +511,13 @@ def expand_node(
       "description": "简短描述",
       "level": 1,
       "expandable": false,
-      "parent_id": "{node_id}"
+      "parent_id": "父节点id"
     }}
   ],
   "new_edges": [
     {{
-      "source": "{node_id}",
-      "target": "{node_id}_sub1",
+      "source": "父节点id",
+      "target": "父节点id_sub1",
       "type": "implements" | "depends_on" | "supports",
       "reason": "父子关系说明"
     }}
@@ -283,6 +531,8 @@ def expand_node(
 - 子节点的 parent_id 应该是父节点的 id
 - type 应该是 dependency
 - expandable 设为 false（子节点通常不再可展开）
+{context_text}
+要展开的节点: {node_label} (id: {node_id})
 """
 
     import json
@@ -301,9 +551,196 @@ def expand_node(
         result = result.strip()
 
         data = json.loads(result)
-        return data
     except json.JSONDecodeError as e:
         logger.error(f"Failed to parse expand response: {e}")
         logger.error(f"Raw response: {result}")
         # Return empty structure on failure
-        return {"child_nodes": [], "new_edges": []}
+        data = {}
+    return parse_expansion(node_id, data)
+
+
+def parse_expansion(
+    node_id: str, data: dict, level: Optional[int] = None
+) -> ExpandedNodeData:
+    """
+    Build ExpandedNodeData from a raw expand response, skipping invalid entries
+
+    Children get stable IDs {node_id}_sub1, {node_id}_sub2, ... in response
+    order, whatever IDs the model chose, so expanding the same node twice
+    (or two nodes whose children the model named alike) never collides.
+
+    Args:
+        node_id: ID of the expanded node
+        data: dict with 'child_nodes' and 'new_edges'
+        level: Level of the children; taken from the response if omitted
+
+    Returns:
+        ExpandedNodeData
+    """
+    child_nodes = []
+    renamed = {}  # ID chosen by the model -> stable ID
+    for n in data.get("child_nodes", []):
+        try:
+            node = Node(
+                id=f"{node_id}_sub{len(child_nodes) + 1}",
+                label=n.get("label", "Unknown"),
+                type=NodeType(n.get("type", "dependency")),
+                priority=Priority(n.get("priority", "optional")),
+                reason=n.get("reason", ""),
+                description=n.get("description"),
+                level=level if level is not None else n.get("level", 1),
+                expandable=n.get("expandable", False),
+                parent_id=node_id,
+            )
+            if n.get("id"):
+                renamed[n["id"]] = node.id
+            child_nodes.append(node)
+        except Exception:
+            # Skip invalid nodes
+            pass
+
+    new_edges = []
+    for e in data.get("new_edges", []):
+        try:
+            source = e.get("source", node_id)
+            target = e.get("target", "")
+            edge = Edge(
+                source=renamed.get(source, source),
+                target=renamed.get(target, target),
+                type=EdgeType(e.get("type", "implements")),
+                reason=e.get("reason", ""),
+            )
+            if edge.target:  # Only add edges with valid targets
+                new_edges.append(edge)
+        except Exception:
+            # Skip invalid edges
+            pass
+
+    return ExpandedNodeData(child_nodes=child_nodes, new_edges=new_edges)
+
+
+def build_expand_nodes_prompt(nodes: List[dict], graph_context: str | None) -> str:
+    """
+    Build one prompt expanding several nodes
+
+    Args:
+        nodes: List of dicts with 'id', 'label' and optional 'description'
+        graph_context: Optional context about the current graph, shared by all
+
+    Returns:
+        Prompt asking for {"expansions": [{"node_id", "child_nodes", "new_edges"}]}
+    """
+    context_text = f"\n当前图谱概述: {graph_context}\n" if graph_context else ""
+    sections = []
+    for node in nodes:
+        section = f"- {node['label']} (id: {node['id']})"
+        if node.get("description"):
+            section += f": {node['description']}"
+        sections.append(section)
+    nodes_text = "\n".join(sections)
+
+    return f"""你是一位知识架构专家。用户想要展开多个知识节点，查看每个节点包含的子概念。
+
+任务:
+对每个节点分别分析，找出其包含的 2-4 个核心子概念或组成部分，为每个子概念创建节点，并建立从父节点到子节点的边。
+
+返回严格的 JSON 格式，每个要展开的节点对应 expansions 中的一项:
+{{
+  "expansions": [
+    {{
+      "node_id": "父节点id",
+      "child_nodes": [
+        {{
+          "id": "父节点id_sub1",
+          "label": "子概念名称",
+          "type": "dependency",
+          "priority": "critical" | "optional",
+          "reason": "这个子概念的作用",
+          "description": "简短描述",
+          "expandable": false
+        }}
+      ],
+      "new_edges": [
+        {{
+          "source": "父节点id",
+          "target": "父节点id_sub1",
+          "type": "implements" | "depends_on" | "supports",
+          "reason": "父子关系说明"
+        }}
+      ]
+    }}
+  ]
+}}
+
+注意:
+- 每个节点的子节点数量控制在 2-4 个，不要太多
+- 子节点的 id 格式为 父节点id_sub1, 父节点id_sub2 等
+- type 应该是 dependency
+{context_text}
+要展开的节点:
+{nodes_text}
+"""
+
+
+def expand_nodes(
+    nodes: List[dict], graph_context: str | None
+) -> Dict[str, ExpandedNodeData | str]:
+    """
+    Expand several nodes with as few LLM calls as possible
+
+    Nodes are sent expand_max_batch at a time in one request each, sharing
+    the graph context. Nodes missing from a batch response, or whose whole
+    batch failed, fall back to expand_node.
+
+    Args:
+        nodes: List of dicts with 'id', 'label', optional 'description' and
+            'level' (of the node itself; children get level + 1)
+        graph_context: Optional context about the current graph
+
+    Returns:
+        ExpandedNodeData, or an error message, by node ID
+    """
+    provider = _get_provider()
+    max_batch = max(get_settings().expand_max_batch, 1)
+
+    results: Dict[str, ExpandedNodeData | str] = {}
+    for start in range(0, len(nodes), max_batch):
+        chunk = nodes[start : start + max_batch]
+        raw_by_id: Dict[str, dict] = {}
+        if len(chunk) > 1:
+            try:
+                raw = provider.generate_raw(
+                    build_expand_nodes_prompt(chunk, graph_context)
+                )
+                data = repair_json(extract_json(raw))
+                items = data.get("expansions") if isinstance(data, dict) else None
+                if not isinstance(items, list):
+                    raise ValueError("批量展开响应缺少 expansions 列表")
+                raw_by_id = {
+                    item["node_id"]: item
+                    for item in items
+                    if isinstance(item, dict) and isinstance(item.get("node_id"), str)
+                }
+            except Exception as exc:
+                logger.warning(f"Batched expansion failed, falling back: {exc}")
+
+        for node in chunk:
+            level = node.get("level", 0) + 1
+            expansion = None
+            if node["id"] in raw_by_id:
+                expansion = parse_expansion(node["id"], raw_by_id[node["id"]], level)
+            if expansion is None or not expansion.child_nodes:
+                try:
+                    expansion = expand_node(
+                        node["id"],
+                        node["label"],
+                        node.get("description"),
+                        graph_context,
+                    )
+                except Exception as exc:
+                    results[node["id"]] = f"展开节点失败: {exc}"
+                    continue
+                for child in expansion.child_nodes:
+                    child.level = level
+            results[node["id"]] = expansion
+    return results
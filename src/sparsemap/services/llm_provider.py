@@ -9,10 +9,84 @@ LLM Provider 抽象层
 
 from __future__ import annotations
 
+import logging
 from abc import ABC, abstractmethod
-from typing import List
+from typing import List, Optional
+
+from pydantic import BaseModel, ValidationError
 
 from sparsemap.domain.models import Graph, NodeDetails
+from sparsemap.services.llm_utils import extract_json, repair_json
+
+logger = logging.getLogger(__name__)
+
+
+class TokenUsage(BaseModel):
+    """一次调用的 token 用量"""
+
+    prompt_tokens: int = 0
+    cached_tokens: int = 0  # prompt_tokens 中命中提供商缓存的部分
+    completion_tokens: int = 0
+
+    @property
+    def uncached_tokens(self) -> int:
+        return self.prompt_tokens - self.cached_tokens
+
+
+def report_usage(provider: str, operation: str, usage: TokenUsage) -> None:
+    """
+    记录一次调用的 token 用量（缓存命中与未命中分开统计）
+
+    Args:
+        provider: 提供商名称
+        operation: 调用类型，如 generate_graph
+        usage: token 用量
+    """
+    logger.info(
+        f"{provider} {operation} tokens: prompt={usage.prompt_tokens} "
+        f"(cached={usage.cached_tokens}, uncached={usage.uncached_tokens}), "
+        f"completion={usage.completion_tokens}"
+    )
+
+
+def build_node_details_batch_prompt(nodes: List[dict]) -> str:
+    """
+    构建批量节点详情提示词
+
+    Args:
+        nodes: 节点列表，每个包含 label 和 context
+
+    Returns:
+        str: 提示词
+    """
+    prompt = """你是一位资深的教育专家。请为下面每一个知识点分别生成详细的解释卡片。
+每张卡片包含以下字段：
+1. definition: 清晰、学术的定义
+2. analogy: 一个通俗易懂的生活类比
+3. importance: 为什么这个概念很重要（在上下文语境如AP课程或大纲中）
+4. actionable_step: 一个具体的行动步骤或练习
+5. keywords: 3-5个相关关键词列表
+
+返回严格的 JSON 格式，index 与知识点编号一一对应，每个知识点恰好一张卡片：
+{
+  "details": [
+    {
+      "index": 1,
+      "definition": "...",
+      "analogy": "...",
+      "importance": "...",
+      "actionable_step": "...",
+      "keywords": ["key1", "key2"]
+    }
+  ]
+}
+"""
+    for index, node in enumerate(nodes, start=1):
+        prompt += (
+            f"\n=== 知识点 {index}：{node['label']} ===\n"
+            f"上下文/来源内容：\n{node['context']}\n"
+        )
+    return prompt
 
 
 class LLMProvider(ABC):
@@ -61,3 +135,39 @@ class LLMProvider(ABC):
             NodeDetails: 详细信息对象
         """
         pass
+
+    def generate_node_details_batch(
+        self, nodes: List[dict]
+    ) -> List[Optional[NodeDetails]]:
+        """
+        在一次请求中生成多个节点的详细信息
+
+        默认实现通过 generate_raw 发送一个结构化请求；提供商可以覆盖此方法。
+
+        Args:
+            nodes: 节点列表，每个包含 label 和 context
+
+        Returns:
+            List[Optional[NodeDetails]]: 与 nodes 一一对应，未能生成或校验失败的为 None
+
+        Raises:
+            ValueError: 当请求失败或响应无法解析时
+        """
+        raw = self.generate_raw(build_node_details_batch_prompt(nodes))
+        data = repair_json(extract_json(raw))
+        items = data.get("details") if isinstance(data, dict) else None
+        if not isinstance(items, list):
+            raise ValueError("批量节点详情响应缺少 details 列表")
+
+        results: List[Optional[NodeDetails]] = [None] * len(nodes)
+        for position, item in enumerate(items):
+            if not isinstance(item, dict):
+                continue
+            index = item.get("index", position + 1)
+            if not isinstance(index, int) or not 1 <= index <= len(nodes):
+                continue
+            try:
+                results[index - 1] = NodeDetails.model_validate(item)
+            except ValidationError as exc:
+                logger.warning(f"Invalid details for node {index} in batch: {exc}")
+        return results
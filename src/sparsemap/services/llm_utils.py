@@ -150,3 +150,28 @@ def repair_json(payload: str) -> dict:
 
     # Last resort: return minimal structure
     raise ValueError("Unable to repair JSON after multiple attempts")
+
+
+_CJK = re.compile(
+    r"[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uff00-\uffef]"
+)
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Roughly estimate the number of LLM tokens in a text without a tokenizer
+
+    CJK characters count as one token each; everything else as one token per
+    four characters, which is close for English prose on BPE tokenizers.
+
+    Args:
+        text: Text to measure
+
+    Returns:
+        Estimated token count
+    """
+    if not text:
+        return 0
+    cjk = len(_CJK.findall(text))
+    other = len(text) - cjk
+    return cjk + (other + 3) // 4
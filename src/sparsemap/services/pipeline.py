@@ -0,0 +1,399 @@
+"""Offline bulk ingestion: fetch → analyze → save → embed.
+
+Items flow through one asyncio queue per stage and every stage runs its own
+number of workers, so slow LLM calls do not hold up downloads and vice versa.
+Each finished item is appended to a JSONL checkpoint; a rerun with the same
+checkpoint skips everything already ingested.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from fastapi import HTTPException
+from pydantic import BaseModel
+from sqlmodel import Session
+
+from sparsemap.domain.models import Graph
+from sparsemap.services.embedding import has_embeddings, store_node_embeddings
+from sparsemap.services.extractor import (
+    fetch_page,
+    hash_content,
+    hash_url,
+    url_cache_key,
+)
+from sparsemap.services.llm import analyze_contents
+from sparsemap.services.repository import (
+    extract_title,
+    get_analysis_by_content_hash,
+    get_analysis_by_hash,
+    get_fetch_cache,
+    save_analysis,
+    save_fetch_cache,
+)
+
+logger = logging.getLogger(__name__)
+
+STAGES = ("fetch", "analyze", "save", "embed")
+
+
+class IngestItem(BaseModel):
+    """One URL or text to ingest"""
+
+    key: str  # url_hash the analysis is stored under
+    url: Optional[str] = None
+    text: Optional[str] = None
+    title: Optional[str] = None
+
+
+class StageStats(BaseModel):
+    """Latency of one pipeline stage"""
+
+    count: int = 0
+    mean_ms: float = 0.0
+    p50_ms: float = 0.0
+    p95_ms: float = 0.0
+    max_ms: float = 0.0
+
+
+class IngestReport(BaseModel):
+    """Outcome of an ingestion run"""
+
+    total: int  # Items in the input
+    skipped: int = 0  # Already in the checkpoint, or repeated in the input
+    done: int = 0  # Analyzed and saved
+    cached: int = 0  # Already analyzed in the database
+    failed: int = 0
+    elapsed_s: float = 0.0
+    stages: Dict[str, StageStats] = {}
+
+    @property
+    def throughput(self) -> float:
+        """Processed items per second"""
+        processed = self.done + self.cached + self.failed
+        return processed / self.elapsed_s if self.elapsed_s else 0.0
+
+
+def read_items(path: Path) -> List[IngestItem]:
+    """
+    Read ingestion input
+
+    Each non-empty line is either a URL or a JSON object with a "url" or
+    "text" key and an optional "title". Lines starting with # are ignored.
+
+    Args:
+        path: Input file
+
+    Returns:
+        Items in file order
+
+    Raises:
+        ValueError: If a line is malformed
+    """
+    items = []
+    lines = path.read_text(encoding="utf-8").splitlines()
+    for lineno, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        try:
+            data = json.loads(line) if line.startswith("{") else {"url": line}
+        except json.JSONDecodeError as exc:
+            raise ValueError(f"{path}:{lineno}: invalid JSON: {exc}") from exc
+
+        url = data.get("url")
+        text = data.get("text")
+        if bool(url) == bool(text):
+            raise ValueError(f"{path}:{lineno}: expected exactly one of url or text")
+        items.append(
+            IngestItem(
+                key=url_cache_key(url) if url else hash_url(text),
+                url=url,
+                text=text,
+                title=data.get("title"),
+            )
+        )
+    return items
+
+
+class Checkpoint:
+    """Append-only JSONL log of finished items"""
+
+    def __init__(self, path: Optional[Path]):
+        self.path = path
+        self.completed: set = set()
+        self._file = None
+        if path is None:
+            return
+
+        if path.exists():
+            content = path.read_text(encoding="utf-8")
+            for line in content.splitlines():
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # Line torn by a crash
+                if entry.get("status") in ("done", "cached"):
+                    self.completed.add(entry["key"])
+        else:
+            content = ""
+        self._file = path.open("a", encoding="utf-8")
+        if content and not content.endswith("\n"):
+            self._file.write("\n")
+
+    def record(
+        self,
+        key: str,
+        status: str,
+        analysis_id: Optional[int] = None,
+        error: Optional[str] = None,
+    ) -> None:
+        """Persist the outcome of one item; failed items are retried on resume"""
+        if status in ("done", "cached"):
+            self.completed.add(key)
+        if self._file is None:
+            return
+        entry = {"key": key, "status": status, "analysis_id": analysis_id}
+        if error:
+            entry["error"] = error
+        self._file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self._file.flush()
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class _Job(BaseModel):
+    item: IngestItem
+    text: Optional[str] = None
+    graph: Optional[Graph] = None
+    analysis_id: Optional[int] = None
+    reused: bool = False  # An existing analysis was found
+
+
+def _summarize(durations: List[float]) -> StageStats:
+    if not durations:
+        return StageStats()
+    ordered = sorted(durations)
+
+    def percentile(q: float) -> float:
+        return ordered[round(q * (len(ordered) - 1))]
+
+    return StageStats(
+        count=len(ordered),
+        mean_ms=sum(ordered) / len(ordered),
+        p50_ms=percentile(0.5),
+        p95_ms=percentile(0.95),
+        max_ms=ordered[-1],
+    )
+
+
+class IngestPipeline:
+    """
+    Staged ingestion with bounded concurrency per stage
+
+    Database reads and writes happen on the event loop through one session
+    (the save stage has a single worker); LLM and embedding calls, which are
+    blocking, run in threads.
+    """
+
+    def __init__(
+        self,
+        session: Session,
+        checkpoint: Checkpoint,
+        fetch_concurrency: int = 4,
+        analyze_concurrency: int = 2,
+        embed_concurrency: int = 2,
+        embed: bool = True,
+    ):
+        self.session = session
+        self.checkpoint = checkpoint
+        self.embed = embed
+        self.concurrency = {
+            "fetch": max(fetch_concurrency, 1),
+            "analyze": max(analyze_concurrency, 1),
+            "save": 1,
+            "embed": max(embed_concurrency, 1) if embed else 0,
+        }
+        self._handlers = {
+            "fetch": self._fetch,
+            "analyze": self._analyze,
+            "save": self._save,
+            "embed": self._embed,
+        }
+        self._timings: Dict[str, List[float]] = {stage: [] for stage in STAGES}
+        self._report = IngestReport(total=0)
+        self._finished = 0
+        self._pending = 0
+
+    async def run(self, items: List[IngestItem]) -> IngestReport:
+        """
+        Ingest items, skipping those already in the checkpoint
+
+        Args:
+            items: Items to ingest
+
+        Returns:
+            IngestReport with counts and per-stage latency
+        """
+        start = time.perf_counter()
+        self._report = IngestReport(total=len(items))
+
+        pending = []
+        seen = set(self.checkpoint.completed)
+        for item in items:
+            if item.key in seen:
+                self._report.skipped += 1
+                continue
+            seen.add(item.key)
+            pending.append(item)
+        self._pending = len(pending)
+
+        queues = {
+            stage: asyncio.Queue(maxsize=2 * max(count, 1))
+            for stage, count in self.concurrency.items()
+        }
+        workers = [
+            asyncio.create_task(self._worker(stage, queues))
+            for stage, count in self.concurrency.items()
+            for _ in range(count)
+        ]
+        try:
+            for item in pending:
+                await queues["fetch"].put(_Job(item=item))
+            # A stage only feeds later stages, so joining in order drains all
+            for stage in STAGES:
+                await queues[stage].join()
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+        self._report.elapsed_s = time.perf_counter() - start
+        self._report.stages = {
+            stage: _summarize(self._timings[stage]) for stage in STAGES
+        }
+        return self._report
+
+    async def _worker(self, stage: str, queues: Dict[str, asyncio.Queue]) -> None:
+        inbox = queues[stage]
+        while True:
+            job = await inbox.get()
+            start = time.perf_counter()
+            try:
+                next_stage = await self._handlers[stage](job)
+            except HTTPException as exc:
+                next_stage = None
+                self._finish(job, "failed", error=str(exc.detail))
+            except Exception as exc:
+                next_stage = None
+                self._finish(job, "failed", error=str(exc) or type(exc).__name__)
+            self._timings[stage].append((time.perf_counter() - start) * 1000)
+            # Hand over before task_done so run() never sees a gap between stages
+            if next_stage:
+                await queues[next_stage].put(job)
+            inbox.task_done()
+
+    def _finish(self, job: _Job, status: str, error: Optional[str] = None) -> None:
+        item = job.item
+        setattr(self._report, status, getattr(self._report, status) + 1)
+        self.checkpoint.record(item.key, status, job.analysis_id, error)
+        self._finished += 1
+        label = item.url or extract_title(text=item.text)
+        message = f"[{self._finished}/{self._pending}] {status}: {label}"
+        if error:
+            logger.warning(f"{message} ({error})")
+        else:
+            logger.info(message)
+
+    def _reuse(self, job: _Job, record) -> Optional[str]:
+        """Finish with an existing analysis, embedding it if that never happened"""
+        job.analysis_id = record.id
+        job.reused = True
+        if self.embed and not has_embeddings(self.session, record.id):
+            job.graph = Graph.model_validate(record.graph_data)
+            return "embed"
+        self._finish(job, "cached")
+        return None
+
+    async def _fetch(self, job: _Job) -> Optional[str]:
+        item = job.item
+        record = get_analysis_by_hash(self.session, item.key)
+        if record:
+            return self._reuse(job, record)
+
+        if item.url:
+            page = await fetch_page(
+                item.url, cached=get_fetch_cache(self.session, item.key)
+            )
+            save_fetch_cache(self.session, item.key, page)
+            job.text = page.text
+        else:
+            job.text = item.text
+
+        record = get_analysis_by_content_hash(self.session, hash_content(job.text))
+        if record:
+            return self._reuse(job, record)
+        return "analyze"
+
+    async def _analyze(self, job: _Job) -> Optional[str]:
+        source = "url1" if job.item.url else "text1"
+        job.graph = await asyncio.to_thread(
+            analyze_contents, [{"source": source, "text": job.text}]
+        )
+        return "save"
+
+    async def _save(self, job: _Job) -> Optional[str]:
+        item = job.item
+        record = save_analysis(
+            self.session,
+            item.key,
+            job.graph,
+            title=item.title
+            or extract_title(url=item.url, text=item.text, graph=job.graph),
+            original_url=item.url,
+            source_type="url" if item.url else "text",
+            content_hash=hash_content(job.text),
+            source_text=job.text,
+        )
+        job.analysis_id = record.id
+        if self.embed:
+            return "embed"
+        self._finish(job, "done")
+        return None
+
+    async def _embed(self, job: _Job) -> Optional[str]:
+        await asyncio.to_thread(self._store_embeddings, job.analysis_id, job.graph)
+        self._finish(job, "cached" if job.reused else "done")
+        return None
+
+    def _store_embeddings(self, analysis_id: int, graph: Graph) -> None:
+        # Sessions are not thread-safe: embed with a session of its own
+        with Session(self.session.get_bind()) as session:
+            store_node_embeddings(session, analysis_id, graph)
+
+
+def format_report(report: IngestReport) -> str:
+    """Render an IngestReport as a plain-text summary table"""
+    lines = [
+        f"Processed {report.total - report.skipped} of {report.total} items in "
+        f"{report.elapsed_s:.1f} s ({report.throughput:.2f} items/s): "
+        f"{report.done} analyzed, {report.cached} cached, {report.failed} failed, "
+        f"{report.skipped} skipped",
+        "",
+        f"{'stage':<8} {'count':>6} {'mean ms':>10} {'p50 ms':>10} "
+        f"{'p95 ms':>10} {'max ms':>10}",
+    ]
+    for stage, stats in report.stages.items():
+        lines.append(
+            f"{stage:<8} {stats.count:>6} {stats.mean_ms:>10.1f} "
+            f"{stats.p50_ms:>10.1f} {stats.p95_ms:>10.1f} {stats.max_ms:>10.1f}"
+        )
+    return "\n".join(lines)
@@ -0,0 +1,150 @@
+"""Background generation of node content right after an analysis is saved.
+
+Users open the critical nodes of a fresh graph first. Generating their
+details (and, optionally, expansions) in the background while the user
+is still looking at the graph lets /api/node-details and /api/expand-node
+answer those clicks from the database. Prefetch calls go through the LLM
+limiter as background work, so they never take the last slot from users.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import List
+
+from sqlmodel import Session
+
+from sparsemap.core.config import get_settings
+from sparsemap.domain.models import Graph, Node, NodeDetails, NodeType, Priority
+from sparsemap.services.graph_context import describe_node
+from sparsemap.services.limits import get_llm_limiter
+from sparsemap.services.llm import expand_node, generate_node_details_batch
+from sparsemap.services.repository import (
+    get_node_details,
+    get_node_expansion,
+    save_node_details,
+    save_node_expansion,
+)
+from sparsemap.services.usage import llm_endpoint
+
+logger = logging.getLogger(__name__)
+
+
+def select_prefetch_nodes(graph: Graph, top_n: int) -> List[Node]:
+    """
+    Pick the nodes a user is most likely to open
+
+    Only critical nodes qualify: main nodes first, then by number of edges,
+    then in graph order.
+
+    Args:
+        graph: Analyzed graph
+        top_n: Maximum number of nodes
+
+    Returns:
+        Up to top_n nodes, most likely first
+    """
+    degree = {node.id: 0 for node in graph.nodes}
+    for edge in graph.edges:
+        for node_id in (edge.source, edge.target):
+            if node_id in degree:
+                degree[node_id] += 1
+
+    critical = [node for node in graph.nodes if node.priority == Priority.critical]
+    critical.sort(key=lambda node: (node.type != NodeType.main, -degree[node.id]))
+    return critical[: max(top_n, 0)]
+
+
+async def prefetch_node_content(engine, analysis_ids: List[int], graph: Graph) -> None:
+    """
+    Generate and store details, and optionally expansions, for the top nodes
+
+    Failures are logged and otherwise ignored: the content is generated on
+    demand when the user opens the node.
+
+    Args:
+        engine: Database engine
+        analysis_ids: Analyses holding the graph; the content is stored for each
+        graph: Analyzed graph
+    """
+    settings = get_settings()
+    nodes = select_prefetch_nodes(graph, settings.prefetch_top_n)
+    if not nodes or not analysis_ids:
+        return
+    if not get_llm_limiter().background_slots:
+        # llm_max_concurrency is 1: the only slot is kept for users
+        logger.info("Skipping prefetch: no LLM slot to spare")
+        return
+    # Runs after the /api/analyze response; accounted separately from it
+    with llm_endpoint("prefetch"):
+        await _prefetch(
+            engine, analysis_ids, graph, nodes, settings.prefetch_expansions
+        )
+
+
+async def _prefetch(
+    engine, analysis_ids: List[int], graph: Graph, nodes: List[Node], expansions: bool
+) -> None:
+    with Session(engine) as session:
+        missing = [
+            node
+            for node in nodes
+            if get_node_details(session, analysis_ids[0], node.id, node.label) is None
+        ]
+    if missing:
+        await _prefetch_details(engine, analysis_ids, graph, missing)
+
+    if expansions:
+        for node in nodes:
+            if node.expandable:
+                context = describe_node(graph, node.id, node.label)
+                await _prefetch_expansion(engine, analysis_ids, node, context)
+
+
+async def _prefetch_details(
+    engine, analysis_ids: List[int], graph: Graph, nodes: List[Node]
+) -> None:
+    # The same context /api/node-details builds for nodes of a saved analysis
+    requests = [
+        {"label": node.label, "context": describe_node(graph, node.id, node.label)}
+        for node in nodes
+    ]
+    try:
+        async with get_llm_limiter().slot(background=True):
+            generated = await asyncio.to_thread(generate_node_details_batch, requests)
+    except Exception:
+        logger.exception(f"Prefetching node details for {analysis_ids} failed")
+        return
+
+    stored = 0
+    with Session(engine) as session:
+        for node, details in zip(nodes, generated):
+            if not isinstance(details, NodeDetails):
+                continue
+            for analysis_id in analysis_ids:
+                save_node_details(session, analysis_id, node.id, node.label, details)
+            stored += 1
+    logger.info(f"Prefetched details of {stored}/{len(nodes)} nodes for {analysis_ids}")
+
+
+async def _prefetch_expansion(
+    engine, analysis_ids: List[int], node: Node, context: str | None
+) -> None:
+    with Session(engine) as session:
+        if get_node_expansion(session, analysis_ids[0], node.id, node.label):
+            return
+    try:
+        async with get_llm_limiter().slot(background=True):
+            expansion = await asyncio.to_thread(
+                expand_node, node.id, node.label, None, context
+            )
+    except Exception:
+        logger.exception(f"Prefetching expansion of {node.id} failed")
+        return
+    if not expansion.child_nodes:
+        return  # Unparsable response: let the user's click try again
+
+    with Session(engine) as session:
+        for analysis_id in analysis_ids:
+            save_node_expansion(session, analysis_id, node.id, node.label, expansion)
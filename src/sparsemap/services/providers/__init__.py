@@ -2,5 +2,7 @@
 
 from sparsemap.services.providers.gemini import GeminiProvider
 from sparsemap.services.providers.deepseek import DeepSeekProvider
+from sparsemap.services.providers.replay import ReplayProvider
+from sparsemap.services.providers.stub import StubProvider
 
-__all__ = ["GeminiProvider", "DeepSeekProvider"]
+__all__ = ["GeminiProvider", "DeepSeekProvider", "ReplayProvider", "StubProvider"]
@@ -4,17 +4,59 @@ from __future__ import annotations
 
 import json
 import logging
-from typing import List
+import time
+from typing import List, Optional
 
 from openai import OpenAI
 from pydantic import ValidationError
 
+from sparsemap.core.metrics import stage_timer
 from sparsemap.domain.models import Graph, NodeDetails
-from sparsemap.services.llm_provider import LLMProvider
+from sparsemap.services.cassette import Cassette
+from sparsemap.services.llm_provider import LLMProvider, TokenUsage, report_usage
 from sparsemap.services.llm_utils import extract_json, repair_json
+from sparsemap.services.usage import record_llm_call
 
 logger = logging.getLogger(__name__)
 
+# Same system prompt as linklog (proven to work)
+GRAPH_SYSTEM_PROMPT = """你是一位知识架构专家，擅长将复杂的课程内容解构为清晰的逻辑骨架和知识依赖关系。
+
+**重要：JSON 格式要求**
+1. 所有字符串中的特殊字符（引号、换行符、反斜杠等）必须正确转义
+2. 字符串中的双引号必须转义为 \\"
+3. 不要在 JSON 字符串中使用未转义的引号
+4. 不要在对象或数组的最后一个元素后添加逗号
+5. 返回纯 JSON，不要包含 markdown 代码块标记
+
+**边类型严格限制**：
+- 只能使用以下四种边类型：depends_on, references, implements, supports
+- 不要使用 extends, includes, contains 等其他类型
+
+返回格式：
+{
+  "nodes": [{"id": "n1", "label": "节点", "type": "main", "priority": "critical", "reason": "原因", "source": "text1", "description": "描述"}],
+  "edges": [{"source": "n1", "target": "n2", "type": "depends_on", "reason": "原因"}],
+  "summary": "总结"
+}"""
+
+NODE_DETAILS_SYSTEM_PROMPT = """你是一位资深的教育专家。请为给定的知识点生成详细的解释卡片。
+你需要返回严格的 JSON 格式，包含以下字段：
+1. definition: 清晰、学术的定义
+2. analogy: 一个通俗易懂的生活类比
+3. importance: 为什么这个概念很重要（在上下文语境如AP课程或大纲中）
+4. actionable_step: 一个具体的行动步骤或练习
+5. keywords: 3-5个相关关键词列表
+
+返回示例：
+{
+  "definition": "...",
+  "analogy": "...",
+  "importance": "...",
+  "actionable_step": "...",
+  "keywords": ["key1", "key2"]
+}"""
+
 
 class DeepSeekProvider(LLMProvider):
     """DeepSeek Provider (OpenAI-compatible API)"""
@@ -27,6 +69,7 @@ class DeepSeekProvider(LLMProvider):
         temperature: float = 0.2,
         max_tokens: int = 2000,
         max_retries: int = 2,
+        cassette: Cassette | None = None,
     ):
         if not api_key:
             raise ValueError("DeepSeek API key is required")
@@ -37,6 +80,7 @@ class DeepSeekProvider(LLMProvider):
         self.temperature = temperature
         self.max_tokens = max_tokens
         self.max_retries = max_retries
+        self.cassette = cassette  # Records exchanges for ReplayProvider
 
         self.client = OpenAI(
             base_url=base_url,
@@ -48,65 +92,100 @@ class DeepSeekProvider(LLMProvider):
             f"✓ DeepSeekProvider initialized (model: {model}, base_url: {base_url})"
         )
 
-    def generate_graph(self, contents: List[dict], prompt: str) -> Graph:
-        """Generate knowledge graph using DeepSeek API"""
-        # Use exact same system prompt as linklog (proven to work)
-        system_content = """你是一位知识架构专家，擅长将复杂的课程内容解构为清晰的逻辑骨架和知识依赖关系。
-
-**重要：JSON 格式要求**
-1. 所有字符串中的特殊字符（引号、换行符、反斜杠等）必须正确转义
-2. 字符串中的双引号必须转义为 \\"
-3. 不要在 JSON 字符串中使用未转义的引号
-4. 不要在对象或数组的最后一个元素后添加逗号
-5. 返回纯 JSON，不要包含 markdown 代码块标记
-
-**边类型严格限制**：
-- 只能使用以下四种边类型：depends_on, references, implements, supports
-- 不要使用 extends, includes, contains 等其他类型
+    def _complete(
+        self,
+        operation: str,
+        system_prompt: Optional[str],
+        prompt: str,
+        temperature: float,
+        max_tokens: int,
+        attempt: int = 0,
+    ) -> str:
+        """
+        One chat completion with the static instruction as the first message
+
+        DeepSeek (and OpenAI) cache prompt prefixes automatically, so keeping
+        the system prompt byte-identical and first lets repeated calls reuse it.
+        """
+        messages = []
+        if system_prompt:
+            messages.append({"role": "system", "content": system_prompt})
+        messages.append({"role": "user", "content": prompt})
+        started = time.perf_counter()
+        try:
+            response = self.client.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                temperature=temperature,
+                max_tokens=max_tokens,
+            )
+        except Exception:
+            record_llm_call(
+                "DeepSeek",
+                self.model,
+                operation,
+                None,
+                int((time.perf_counter() - started) * 1000),
+                attempt=attempt,
+                success=False,
+            )
+            raise
+        latency_ms = int((time.perf_counter() - started) * 1000)
+
+        tokens = None
+        usage = getattr(response, "usage", None)
+        if usage is not None:
+            # DeepSeek reports prompt_cache_hit_tokens, OpenAI prompt_tokens_details
+            cached = getattr(usage, "prompt_cache_hit_tokens", None)
+            if cached is None:
+                details = getattr(usage, "prompt_tokens_details", None)
+                cached = getattr(details, "cached_tokens", None)
+            tokens = TokenUsage(
+                prompt_tokens=usage.prompt_tokens or 0,
+                cached_tokens=cached or 0,
+                completion_tokens=usage.completion_tokens or 0,
+            )
+            report_usage("DeepSeek", operation, tokens)
+        record_llm_call(
+            "DeepSeek", self.model, operation, tokens, latency_ms, attempt=attempt
+        )
 
-返回格式：
-{
-  "nodes": [{"id": "n1", "label": "节点", "type": "main", "priority": "critical", "reason": "原因", "source": "text1", "description": "描述"}],
-  "edges": [{"source": "n1", "target": "n2", "type": "depends_on", "reason": "原因"}],
-  "summary": "总结"
-}"""
+        content = response.choices[0].message.content or ""
+        if self.cassette is not None:
+            self.cassette.record(
+                "DeepSeek", self.model, operation, prompt, content, latency_ms
+            )
+        return content
 
+    def generate_graph(self, contents: List[dict], prompt: str) -> Graph:
+        """Generate knowledge graph using DeepSeek API"""
         last_error: Exception | None = None
         for attempt in range(self.max_retries + 1):
             try:
-                response = self.client.chat.completions.create(
-                    model=self.model,
-                    messages=[
-                        {"role": "system", "content": system_content},
-                        {"role": "user", "content": prompt},
-                    ],
+                content = self._complete(
+                    "generate_graph",
+                    GRAPH_SYSTEM_PROMPT,
+                    prompt,
                     temperature=0.3,  # Same as linklog
                     max_tokens=self.max_tokens,
+                    attempt=attempt,
                 )
-
-                # Log token usage if available
-                if hasattr(response, "usage"):
-                    usage = response.usage
-                    logger.info(
-                        f"DeepSeek tokens: prompt={usage.prompt_tokens}, "
-                        f"completion={usage.completion_tokens}, total={usage.total_tokens}"
-                    )
-
-                content = response.choices[0].message.content or ""
                 logger.info(f"Response length: {len(content)} chars")
 
                 json_payload = extract_json(content)
 
                 # Use aggressive repair for DeepSeek
                 try:
-                    data = repair_json(json_payload)
+                    with stage_timer("repair"):
+                        data = repair_json(json_payload)
                 except ValueError as ve:
                     logger.warning(f"JSON repair failed: {ve}")
                     # Log the problematic JSON for debugging
                     logger.debug(f"Failed JSON (first 500 chars): {json_payload[:500]}")
                     raise
 
-                return Graph.model_validate(data)
+                with stage_timer("validate"):
+                    return Graph.model_validate(data)
 
             except (json.JSONDecodeError, ValidationError) as exc:
                 last_error = exc
@@ -124,49 +203,29 @@ class DeepSeekProvider(LLMProvider):
     def generate_raw(self, prompt: str) -> str:
         """Generate raw text response from DeepSeek"""
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[{"role": "user", "content": prompt}],
+            return self._complete(
+                "generate_raw",
+                None,
+                prompt,
                 temperature=self.temperature,
                 max_tokens=self.max_tokens,
             )
-            return response.choices[0].message.content or ""
         except Exception as exc:
             logger.exception("DeepSeek raw generation failed")
             raise ValueError(f"DeepSeek 生成失败: {exc}")
 
     def generate_node_details(self, node_label: str, context: str) -> NodeDetails:
         """Generate detailed explanation for a specific node"""
-        system_instruction = """你是一位资深的教育专家。请为给定的知识点生成详细的解释卡片。
-你需要返回严格的 JSON 格式，包含以下字段：
-1. definition: 清晰、学术的定义
-2. analogy: 一个通俗易懂的生活类比
-3. importance: 为什么这个概念很重要（在上下文语境如AP课程或大纲中）
-4. actionable_step: 一个具体的行动步骤或练习
-5. keywords: 3-5个相关关键词列表
-
-返回示例：
-{
-  "definition": "...",
-  "analogy": "...",
-  "importance": "...",
-  "actionable_step": "...",
-  "keywords": ["key1", "key2"]
-}"""
-
         prompt = f"知识点：{node_label}\n\n上下文/来源内容：\n{context}"
 
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": system_instruction},
-                    {"role": "user", "content": prompt},
-                ],
+            content = self._complete(
+                "generate_node_details",
+                NODE_DETAILS_SYSTEM_PROMPT,
+                prompt,
                 temperature=0.3,
                 max_tokens=1000,
             )
-            content = response.choices[0].message.content or ""
             if not content:
                 logger.warning(
                     f"DeepSeek returned empty content for node: {node_label}"
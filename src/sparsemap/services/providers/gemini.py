@@ -2,20 +2,77 @@
 
 from __future__ import annotations
 
+import hashlib
 import json
 import logging
-from typing import List
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
 
 from google import genai
-from google.genai import types
+from google.genai import errors, types
 from pydantic import ValidationError
 
+from sparsemap.core.metrics import stage_timer
 from sparsemap.domain.models import Graph, NodeDetails
-from sparsemap.services.llm_provider import LLMProvider
+from sparsemap.services.cassette import Cassette
+from sparsemap.services.llm_provider import LLMProvider, TokenUsage, report_usage
 from sparsemap.services.llm_utils import extract_json, repair_json
+from sparsemap.services.usage import record_llm_call
 
 logger = logging.getLogger(__name__)
 
+GRAPH_SYSTEM_INSTRUCTION = """你是一位知识架构专家，擅长将复杂的课程内容解构为清晰的逻辑骨架和知识依赖关系。
+
+**重要：JSON 格式要求**
+1. 所有字符串中的特殊字符（引号、换行符、反斜杠等）必须正确转义
+2. 字符串中的双引号必须转义为 \\"
+3. 不要在 JSON 字符串中使用未转义的引号
+4. 不要在对象或数组的最后一个元素后添加逗号
+5. 返回纯 JSON，不要包含 markdown 代码块标记
+
+返回格式：
+{
+  "nodes": [{"id": "n1", "label": "节点", "type": "main", "priority": "critical", "reason": "原因", "source": "text1", "description": "描述"}],
+  "edges": [{"source": "n1", "target": "n2", "type": "depends_on", "reason": "原因"}],
+  "summary": "总结"
+}"""
+
+NODE_DETAILS_SYSTEM_INSTRUCTION = """你是一位资深的教育专家。请为给定的知识点生成详细的解释卡片。
+你需要返回严格的 JSON 格式，包含以下字段：
+1. definition: 清晰、学术的定义
+2. analogy: 一个通俗易懂的生活类比
+3. importance: 为什么这个概念很重要（在上下文语境如AP课程或大纲中）
+4. actionable_step: 一个具体的行动步骤或练习
+5. keywords: 3-5个相关关键词列表
+
+返回示例：
+{
+  "definition": "...",
+  "analogy": "...",
+  "importance": "...",
+  "actionable_step": "...",
+  "keywords": ["key1", "key2"]
+}"""
+
+# Explicit context caches of system instructions, shared by all provider
+# instances of the process: (model, instruction hash) -> (cache name, renew at)
+_context_caches: Dict[Tuple[str, str], Tuple[str, float]] = {}
+# Instructions the API refused to cache (e.g. below the minimum token count)
+_uncacheable: set = set()
+# Guards the two registries; never held during a network call
+_context_cache_lock = threading.Lock()
+# One creation at a time per instruction, so concurrent first calls share it
+_creation_locks: Dict[Tuple[str, str], threading.Lock] = {}
+
+
+def _is_lost_cache(exc: Exception) -> bool:
+    """Whether a call failed because its context cache expired or was deleted"""
+    if not isinstance(exc, errors.ClientError):
+        return False
+    message = (exc.message or "").lower()
+    return "cache" in message and ("not found" in message or "expired" in message)
+
 
 class GeminiProvider(LLMProvider):
     """Google Gemini Provider"""
@@ -28,6 +85,8 @@ class GeminiProvider(LLMProvider):
         temperature: float = 0.2,
         max_tokens: int = 2000,
         max_retries: int = 2,
+        cassette: Cassette | None = None,
+        context_cache_ttl: int = 0,
     ):
         if not api_key:
             raise ValueError("Gemini API key is required")
@@ -38,6 +97,8 @@ class GeminiProvider(LLMProvider):
         self.temperature = temperature
         self.max_tokens = max_tokens
         self.max_retries = max_retries
+        self.cassette = cassette  # Records exchanges for ReplayProvider
+        self.context_cache_ttl = context_cache_ttl
 
         http_options = types.HttpOptions(baseUrl=base_url) if base_url else None
         self.client = genai.Client(api_key=api_key, http_options=http_options)
@@ -45,42 +106,165 @@ class GeminiProvider(LLMProvider):
         base_url_log = f", base_url: {base_url}" if base_url else ""
         logger.info(f"✓ GeminiProvider initialized (model: {model}{base_url_log})")
 
-    def generate_graph(self, contents: List[dict], prompt: str) -> Graph:
-        """Generate knowledge graph using Gemini API"""
-        system_instruction = """你是一位知识架构专家，擅长将复杂的课程内容解构为清晰的逻辑骨架和知识依赖关系。
+    def _cached_instruction(self, system_instruction: str) -> Optional[str]:
+        """
+        Name of an explicit context cache holding the system instruction
 
-**重要：JSON 格式要求**
-1. 所有字符串中的特殊字符（引号、换行符、反斜杠等）必须正确转义
-2. 字符串中的双引号必须转义为 \\"
-3. 不要在 JSON 字符串中使用未转义的引号
-4. 不要在对象或数组的最后一个元素后添加逗号
-5. 返回纯 JSON，不要包含 markdown 代码块标记
+        Returns:
+            The cache name, or None if explicit caching is disabled or the
+            API refused it; the instruction is then sent with every call
+            and only benefits from implicit prefix caching
+        """
+        if self.context_cache_ttl <= 0:
+            return None
+        digest = hashlib.sha256(system_instruction.encode()).hexdigest()
+        key = (self.model, digest)
+        cache_name = self._lookup_cache(key)
+        if cache_name is not False:
+            return cache_name
 
-返回格式：
-{
-  "nodes": [{"id": "n1", "label": "节点", "type": "main", "priority": "critical", "reason": "原因", "source": "text1", "description": "描述"}],
-  "edges": [{"source": "n1", "target": "n2", "type": "depends_on", "reason": "原因"}],
-  "summary": "总结"
-}"""
+        with _context_cache_lock:
+            creation_lock = _creation_locks.setdefault(key, threading.Lock())
+        with creation_lock:
+            # Another thread may have created it while this one waited
+            cache_name = self._lookup_cache(key)
+            if cache_name is not False:
+                return cache_name
+            try:
+                cache = self.client.caches.create(
+                    model=self.model,
+                    config=types.CreateCachedContentConfig(
+                        system_instruction=system_instruction,
+                        ttl=f"{self.context_cache_ttl}s",
+                        display_name=f"sparsemap-{digest[:12]}",
+                    ),
+                )
+            except Exception as exc:
+                logger.info(f"Gemini context caching unavailable, skipping: {exc}")
+                with _context_cache_lock:
+                    _uncacheable.add(key)
+                return None
+            # Renew a little before the server drops it
+            renew_at = time.monotonic() + self.context_cache_ttl * 0.9
+            with _context_cache_lock:
+                _context_caches[key] = (cache.name, renew_at)
+            return cache.name
 
-        last_error: Exception | None = None
-        for attempt in range(self.max_retries + 1):
+    @staticmethod
+    def _lookup_cache(key: Tuple[str, str]):
+        """The live cache name, None if uncacheable, False if it must be created"""
+        with _context_cache_lock:
+            if key in _uncacheable:
+                return None
+            entry = _context_caches.get(key)
+            if entry and entry[1] > time.monotonic():
+                return entry[0]
+        return False
+
+    def _complete(
+        self,
+        operation: str,
+        system_instruction: Optional[str],
+        prompt: str,
+        temperature: float,
+        max_tokens: int,
+        json_mode: bool = False,
+        attempt: int = 0,
+    ):
+        """
+        One generate_content call with the static instruction kept apart
+
+        The instruction goes into system_instruction (or an explicit context
+        cache), never into the contents, so that every call with the same
+        instruction shares a cacheable prefix.
+        """
+        config = types.GenerateContentConfig(
+            temperature=temperature,
+            max_output_tokens=max_tokens,
+            response_mime_type="application/json" if json_mode else None,
+        )
+        cache_name = (
+            self._cached_instruction(system_instruction) if system_instruction else None
+        )
+        if cache_name:
+            config.cached_content = cache_name
+        else:
+            config.system_instruction = system_instruction
+
+        while True:
+            started = time.perf_counter()
             try:
                 response = self.client.models.generate_content(
-                    model=self.model,
-                    contents=f"{system_instruction}\n\n{prompt}",
-                    config=types.GenerateContentConfig(
-                        temperature=self.temperature,
-                        max_output_tokens=self.max_tokens,
-                        response_mime_type="application/json",
+                    model=self.model, contents=prompt, config=config
+                )
+                break
+            except Exception as exc:
+                record_llm_call(
+                    "Gemini",
+                    self.model,
+                    operation,
+                    None,
+                    int((time.perf_counter() - started) * 1000),
+                    attempt=attempt,
+                    success=False,
+                )
+                # Rate limits, timeouts and the like are not the cache's fault
+                if not (config.cached_content and _is_lost_cache(exc)):
+                    raise
+            # Cache expired or deleted server-side: forget it, send in full
+            logger.info("Gemini context cache lost, resending the instruction")
+            with _context_cache_lock:
+                _context_caches.pop(
+                    (
+                        self.model,
+                        hashlib.sha256(system_instruction.encode()).hexdigest(),
                     ),
+                    None,
+                )
+            config.cached_content = None
+            config.system_instruction = system_instruction
+        latency_ms = int((time.perf_counter() - started) * 1000)
+
+        usage = None
+        metadata = response.usage_metadata
+        if metadata is not None:
+            usage = TokenUsage(
+                prompt_tokens=metadata.prompt_token_count or 0,
+                cached_tokens=metadata.cached_content_token_count or 0,
+                completion_tokens=metadata.candidates_token_count or 0,
+            )
+            report_usage("Gemini", operation, usage)
+        record_llm_call(
+            "Gemini", self.model, operation, usage, latency_ms, attempt=attempt
+        )
+        if self.cassette is not None:
+            self.cassette.record(
+                "Gemini", self.model, operation, prompt, response.text or "", latency_ms
+            )
+        return response
+
+    def generate_graph(self, contents: List[dict], prompt: str) -> Graph:
+        """Generate knowledge graph using Gemini API"""
+        last_error: Exception | None = None
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = self._complete(
+                    "generate_graph",
+                    GRAPH_SYSTEM_INSTRUCTION,
+                    prompt,
+                    temperature=self.temperature,
+                    max_tokens=self.max_tokens,
+                    json_mode=True,
+                    attempt=attempt,
                 )
                 content = response.text
 
                 # Use robust repair logic
                 try:
-                    data = repair_json(extract_json(content))
-                    return Graph.model_validate(data)
+                    with stage_timer("repair"):
+                        data = repair_json(extract_json(content))
+                    with stage_timer("validate"):
+                        return Graph.model_validate(data)
                 except ValueError as ve:
                     logger.error(f"JSON repair failed: {ve}")
                     logger.error(
@@ -89,7 +273,7 @@ class GeminiProvider(LLMProvider):
 
                     # Save debug files
                     with open("debug_gemini_prompt.txt", "w", encoding="utf-8") as f:
-                        f.write(f"{system_instruction}\n\n{prompt}")
+                        f.write(f"{GRAPH_SYSTEM_INSTRUCTION}\n\n{prompt}")
                     with open("debug_gemini_response.txt", "w", encoding="utf-8") as f:
                         f.write(content)
                     logger.info(
@@ -114,13 +298,12 @@ class GeminiProvider(LLMProvider):
     def generate_raw(self, prompt: str) -> str:
         """Generate raw text response from Gemini"""
         try:
-            response = self.client.models.generate_content(
-                model=self.model,
-                contents=prompt,
-                config=types.GenerateContentConfig(
-                    temperature=self.temperature,
-                    max_output_tokens=self.max_tokens,
-                ),
+            response = self._complete(
+                "generate_raw",
+                None,
+                prompt,
+                temperature=self.temperature,
+                max_tokens=self.max_tokens,
             )
             return response.text
         except Exception as exc:
@@ -129,34 +312,16 @@ class GeminiProvider(LLMProvider):
 
     def generate_node_details(self, node_label: str, context: str) -> NodeDetails:
         """Generate detailed explanation for a specific node"""
-        system_instruction = """你是一位资深的教育专家。请为给定的知识点生成详细的解释卡片。
-你需要返回严格的 JSON 格式，包含以下字段：
-1. definition: 清晰、学术的定义
-2. analogy: 一个通俗易懂的生活类比
-3. importance: 为什么这个概念很重要（在上下文语境如AP课程或大纲中）
-4. actionable_step: 一个具体的行动步骤或练习
-5. keywords: 3-5个相关关键词列表
-
-返回示例：
-{
-  "definition": "...",
-  "analogy": "...",
-  "importance": "...",
-  "actionable_step": "...",
-  "keywords": ["key1", "key2"]
-}"""
-
         prompt = f"知识点：{node_label}\n\n上下文/来源内容：\n{context}"
 
         try:
-            response = self.client.models.generate_content(
-                model=self.model,
-                contents=f"{system_instruction}\n\n{prompt}",
-                config=types.GenerateContentConfig(
-                    temperature=0.3,
-                    max_output_tokens=1000,
-                    response_mime_type="application/json",
-                ),
+            response = self._complete(
+                "generate_node_details",
+                NODE_DETAILS_SYSTEM_INSTRUCTION,
+                prompt,
+                temperature=0.3,
+                max_tokens=1000,
+                json_mode=True,
             )
             content = response.text
             if not content:
@@ -0,0 +1,109 @@
+"""Replay Provider Implementation (answers from a recorded cassette)"""
+
+from __future__ import annotations
+
+import json
+import logging
+import time
+from typing import List
+
+from pydantic import ValidationError
+
+from sparsemap.core.metrics import stage_timer
+from sparsemap.domain.models import Graph, NodeDetails
+from sparsemap.services.cassette import Cassette
+from sparsemap.services.llm_provider import LLMProvider, TokenUsage, report_usage
+from sparsemap.services.llm_utils import estimate_tokens, extract_json, repair_json
+from sparsemap.services.usage import record_llm_call
+
+logger = logging.getLogger(__name__)
+
+
+class ReplayProvider(LLMProvider):
+    """
+    Answers with the raw responses a real provider gave to the same prompts
+
+    Responses go through the same JSON extraction, repair and validation as
+    live ones, so a replayed workload measures our own processing. With
+    replay_latency the recorded latency is slept as well.
+    """
+
+    def __init__(
+        self, cassette: Cassette, replay_latency: bool = False, max_retries: int = 2
+    ):
+        self.cassette = cassette
+        self.replay_latency = replay_latency
+        self.max_retries = max_retries
+
+    def _complete(self, operation: str, prompt: str, attempt: int = 0) -> str:
+        exchange = self.cassette.next_exchange(operation, prompt)
+        if exchange is None:
+            raise ValueError(
+                f"Replay cassette {self.cassette.path} has no {operation} "
+                f"response for this prompt"
+            )
+        if self.replay_latency:
+            time.sleep(exchange.latency_ms / 1000)
+
+        usage = TokenUsage(
+            prompt_tokens=estimate_tokens(prompt),
+            completion_tokens=estimate_tokens(exchange.response),
+        )
+        report_usage("Replay", operation, usage)
+        record_llm_call(
+            "Replay",
+            exchange.model or "replay",
+            operation,
+            usage,
+            exchange.latency_ms if self.replay_latency else 0,
+            attempt=attempt,
+        )
+        return exchange.response
+
+    def generate_graph(self, contents: List[dict], prompt: str) -> Graph:
+        """
+        Replay a knowledge graph response, retrying like the live providers
+
+        Invalid JSON or a graph failing validation is retried with the next
+        recorded exchange of the prompt; any other failure (an unrepairable
+        response, a prompt missing from the cassette) stops, as it stopped
+        the recorded run, so replay makes the same calls in the same order.
+        """
+        last_error: Exception | None = None
+        for attempt in range(self.max_retries + 1):
+            try:
+                content = self._complete("generate_graph", prompt, attempt)
+                with stage_timer("repair"):
+                    data = repair_json(extract_json(content))
+                with stage_timer("validate"):
+                    return Graph.model_validate(data)
+            except (json.JSONDecodeError, ValidationError) as exc:
+                last_error = exc
+                logger.warning(f"Replayed response invalid on attempt {attempt + 1}")
+            except Exception as exc:
+                last_error = exc
+                logger.warning(f"Replay failed on attempt {attempt + 1}: {exc}")
+                break
+        raise ValueError(f"Replay 返回结果无法通过校验: {last_error}")
+
+    def generate_raw(self, prompt: str) -> str:
+        """Replay a raw text response"""
+        return self._complete("generate_raw", prompt)
+
+    def generate_node_details(self, node_label: str, context: str) -> NodeDetails:
+        """Replay a node details response"""
+        prompt = f"知识点：{node_label}\n\n上下文/来源内容：\n{context}"
+        content = self._complete("generate_node_details", prompt)
+        if not content:
+            # Same fallback as the live providers
+            return NodeDetails(
+                definition="无法生成详细信息 (AI 响应为空)",
+                analogy="可能由于内容安全策略，无法显示。",
+                importance="请稍后重试。",
+                actionable_step="无",
+                keywords=[],
+            )
+        try:
+            return NodeDetails.model_validate(repair_json(extract_json(content)))
+        except Exception as exc:
+            raise ValueError(f"Replay 生成节点详情失败: {exc}")
@@ -0,0 +1,78 @@
+"""Stub Provider Implementation (no network, for benchmarks)"""
+
+from __future__ import annotations
+
+import logging
+import time
+from typing import List
+
+from sparsemap.core.metrics import stage_timer
+from sparsemap.domain.models import Graph, NodeDetails
+from sparsemap.services.llm_provider import LLMProvider, TokenUsage, report_usage
+from sparsemap.services.llm_utils import estimate_tokens, extract_json, repair_json
+from sparsemap.services.stub_llm import StubLLM, StubLLMError, get_stub_llm
+from sparsemap.services.usage import record_llm_call
+
+logger = logging.getLogger(__name__)
+
+
+class StubProvider(LLMProvider):
+    """
+    Answers from StubLLM in-process
+
+    Calls sleep for the configured latency, fail at the configured rate and
+    are accounted like real calls, so the rest of the pipeline can be
+    load-tested without an API key or quota.
+    """
+
+    def __init__(self, model: str = "stub", stub: StubLLM | None = None):
+        self.model = model
+        self.stub = stub or get_stub_llm()
+
+    def _complete(self, operation: str, prompt: str) -> str:
+        started = time.perf_counter()
+        time.sleep(self.stub.next_latency())
+        latency_ms = int((time.perf_counter() - started) * 1000)
+        if self.stub.should_fail():
+            record_llm_call(
+                "Stub", self.model, operation, None, latency_ms, success=False
+            )
+            raise StubLLMError("Injected stub failure")
+
+        content = self.stub.complete(prompt)
+        usage = TokenUsage(
+            prompt_tokens=estimate_tokens(prompt),
+            completion_tokens=estimate_tokens(content),
+        )
+        report_usage("Stub", operation, usage)
+        record_llm_call("Stub", self.model, operation, usage, latency_ms)
+        return content
+
+    def generate_graph(self, contents: List[dict], prompt: str) -> Graph:
+        """Generate a synthetic knowledge graph"""
+        try:
+            content = self._complete("generate_graph", prompt)
+        except StubLLMError as exc:
+            raise ValueError(f"Stub 生成失败: {exc}")
+        # Same processing as live responses, so load tests measure its cost
+        with stage_timer("repair"):
+            data = repair_json(extract_json(content))
+        with stage_timer("validate"):
+            return Graph.model_validate(data)
+
+    def generate_raw(self, prompt: str) -> str:
+        """Generate a synthetic raw response"""
+        try:
+            return self._complete("generate_raw", prompt)
+        except StubLLMError as exc:
+            raise ValueError(f"Stub 生成失败: {exc}")
+
+    def generate_node_details(self, node_label: str, context: str) -> NodeDetails:
+        """Generate synthetic node details"""
+        prompt = f"知识点：{node_label}\n\n上下文/来源内容：\n{context}"
+        try:
+            return NodeDetails.model_validate_json(
+                self._complete("generate_node_details", prompt)
+            )
+        except StubLLMError as exc:
+            raise ValueError(f"Stub 生成节点详情失败: {exc}")
@@ -1,10 +1,39 @@
 from __future__ import annotations
 
-from typing import List, Optional
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlparse
 
-from sqlmodel import Session, select, desc
+from sqlalchemy import and_, case, func, or_
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session, delete, select, desc, update
 
-from sparsemap.domain.models import AnalysisResult, Graph, HistoryItem
+from sparsemap.core.metrics import stage_timer
+from sparsemap.domain.models import (
+    AnalysisJob,
+    AnalysisResult,
+    AnalyzeRequest,
+    AnalyzeResponse,
+    ExpandedNodeData,
+    FetchCache,
+    Graph,
+    HistoryItem,
+    JobStatus,
+    LLMCall,
+    LLMEndpointUsage,
+    NodeDetails,
+    NodeDetailsRecord,
+    NodeExpansionRecord,
+    SimhashBand,
+)
+from sparsemap.services.extractor import FetchResult
+from sparsemap.services.similarity import (
+    from_signed64,
+    hamming_distance,
+    simhash,
+    simhash_bands,
+    to_signed64,
+)
 
 
 def get_analysis_by_hash(session: Session, url_hash: str) -> AnalysisResult | None:
@@ -13,6 +42,63 @@ def get_analysis_by_hash(session: Session, url_hash: str) -> AnalysisResult | No
     ).first()
 
 
+def get_analysis_by_content_hash(
+    session: Session, content_hash: str
+) -> AnalysisResult | None:
+    """Find the oldest analysis of exactly this text (up to whitespace)"""
+    return session.exec(
+        select(AnalysisResult)
+        .where(AnalysisResult.content_hash == content_hash)
+        .order_by(AnalysisResult.id)
+    ).first()
+
+
+def find_near_duplicate(
+    session: Session, text: str, max_distance: int
+) -> AnalysisResult | None:
+    """
+    Find the analysis whose source text is most similar to text
+
+    Args:
+        session: Database session
+        text: Text about to be analyzed
+        max_distance: Maximum SimHash Hamming distance to accept
+
+    Returns:
+        Closest analysis within max_distance, or None
+    """
+    fingerprint = simhash(text)
+    band_matches = or_(
+        *(
+            and_(SimhashBand.band == band, SimhashBand.value == value)
+            for band, value in simhash_bands(fingerprint)
+        )
+    )
+    candidate_ids = select(SimhashBand.analysis_id).where(band_matches)
+    candidates = session.exec(
+        select(AnalysisResult.id, AnalysisResult.simhash).where(
+            AnalysisResult.id.in_(candidate_ids)
+        )
+    ).all()
+
+    matches = sorted(
+        (hamming_distance(fingerprint, from_signed64(stored)), analysis_id)
+        for analysis_id, stored in candidates
+    )
+    if not matches or matches[0][0] > max_distance:
+        return None
+    return get_analysis_by_id(session, matches[0][1])
+
+
+def _index_source_text(session: Session, record: AnalysisResult) -> None:
+    """Fingerprint the record's source text and (re)write its band index"""
+    fingerprint = simhash(record.source_text)
+    record.simhash = to_signed64(fingerprint)
+    session.exec(delete(SimhashBand).where(SimhashBand.analysis_id == record.id))
+    for band, value in simhash_bands(fingerprint):
+        session.add(SimhashBand(analysis_id=record.id, band=band, value=value))
+
+
 def get_analysis_by_id(session: Session, analysis_id: int) -> AnalysisResult | None:
     return session.exec(
         select(AnalysisResult).where(AnalysisResult.id == analysis_id)
@@ -26,20 +112,124 @@ def save_analysis(
     title: str = "Untitled",
     original_url: Optional[str] = None,
     source_type: str = "text",
+    content_hash: Optional[str] = None,
+    source_text: Optional[str] = None,
 ) -> AnalysisResult:
-    record = AnalysisResult(
-        url_hash=url_hash,
-        graph_data=graph.model_dump(),
-        title=title,
-        original_url=original_url,
-        source_type=source_type,
-    )
+    with stage_timer("save"):
+        record = AnalysisResult(
+            url_hash=url_hash,
+            graph_data=graph.model_dump(),
+            title=title,
+            original_url=original_url,
+            source_type=source_type,
+            content_hash=content_hash,
+            source_text=source_text,
+        )
+        session.add(record)
+        if source_text is not None:
+            session.flush()  # Assigns record.id for the band index
+            _index_source_text(session, record)
+        session.commit()
+        session.refresh(record)
+    return record
+
+
+def update_analysis_graph(
+    session: Session,
+    record: AnalysisResult,
+    graph: Graph,
+    content_hash: Optional[str] = None,
+    source_text: Optional[str] = None,
+) -> AnalysisResult:
+    """
+    Replace the graph of an analysis (and its source text/hash, if given)
+
+    Stored details and expansions of nodes that were removed, relabeled or
+    redescribed are deleted.
+    """
+    stale = _edited_node_ids(Graph.model_validate(record.graph_data), graph)
+    if stale:
+        for table in (NodeDetailsRecord, NodeExpansionRecord):
+            session.exec(
+                delete(table).where(
+                    table.analysis_id == record.id, table.node_id.in_(stale)
+                )
+            )
+    record.graph_data = graph.model_dump()
+    if content_hash is not None:
+        record.content_hash = content_hash
+    if source_text is not None:
+        record.source_text = source_text
+        _index_source_text(session, record)
     session.add(record)
     session.commit()
     session.refresh(record)
     return record
 
 
+def _edited_node_ids(old: Graph, new: Graph) -> List[str]:
+    """Nodes of old that are missing from new or have another label/description"""
+    current = {node.id: node for node in new.nodes}
+    return [
+        node.id
+        for node in old.nodes
+        if node.id not in current
+        or (current[node.id].label, current[node.id].description)
+        != (node.label, node.description)
+    ]
+
+
+def extract_title(
+    url: Optional[str] = None,
+    text: Optional[str] = None,
+    graph: Optional[Graph] = None,
+) -> str:
+    """Extract a meaningful title from URL, text, or graph summary"""
+    if url:
+        # Extract domain or path from URL
+        parsed = urlparse(url)
+        path = parsed.path.strip("/")
+        if path:
+            # Use last path segment
+            return path.split("/")[-1][:50] or parsed.netloc
+        return parsed.netloc
+    if graph and graph.summary:
+        # Use first 50 chars of summary
+        return graph.summary[:50] + ("..." if len(graph.summary) > 50 else "")
+    if text:
+        # Use first 50 chars of text
+        clean = text.strip()[:50]
+        return clean + ("..." if len(text) > 50 else "")
+    return "Untitled"
+
+
+def get_fetch_cache(session: Session, url_hash: str) -> FetchCache | None:
+    return session.exec(
+        select(FetchCache).where(FetchCache.url_hash == url_hash)
+    ).first()
+
+
+def save_fetch_cache(
+    session: Session, url_hash: str, result: FetchResult
+) -> FetchCache:
+    """Store (or revalidate) the cached text and validators of a fetched URL"""
+    now = datetime.utcnow()
+    entry = get_fetch_cache(session, url_hash)
+    if entry is None:
+        entry = FetchCache(url_hash=url_hash, url=result.url, content_hash="", text="")
+    if not result.not_modified:
+        entry.text = result.text
+        entry.content_hash = result.content_hash
+        entry.fetched_at = now
+    entry.url = result.url
+    entry.etag = result.etag
+    entry.last_modified = result.last_modified
+    entry.validated_at = now
+    session.add(entry)
+    session.commit()
+    return entry
+
+
 def list_analyses(
     session: Session, limit: int = 50, offset: int = 0
 ) -> List[HistoryItem]:
@@ -78,7 +268,310 @@ def delete_analysis(session: Session, analysis_id: int) -> bool:
     """Delete an analysis by ID"""
     record = get_analysis_by_id(session, analysis_id)
     if record:
+        for table in (SimhashBand, NodeDetailsRecord, NodeExpansionRecord):
+            session.exec(delete(table).where(table.analysis_id == analysis_id))
         session.delete(record)
         session.commit()
         return True
     return False
+
+
+def _get_node_record(session: Session, table, analysis_id: int, node_id: str):
+    return session.exec(
+        select(table).where(table.analysis_id == analysis_id, table.node_id == node_id)
+    ).first()
+
+
+def _save_node_record(
+    session: Session, table, analysis_id: int, node_id: str, node_label: str, **data
+) -> None:
+    """Insert or replace the stored content of one node"""
+    record = _get_node_record(session, table, analysis_id, node_id)
+    if record is None:
+        record = table(analysis_id=analysis_id, node_id=node_id, node_label=node_label)
+    record.node_label = node_label
+    record.created_at = datetime.utcnow()
+    for key, value in data.items():
+        setattr(record, key, value)
+    session.add(record)
+    try:
+        session.commit()
+    except IntegrityError:
+        # Stored concurrently (prefetch racing a click): keep that one
+        session.rollback()
+
+
+def get_node_details(
+    session: Session, analysis_id: int, node_id: str, node_label: str
+) -> NodeDetails | None:
+    """Stored details of a node, unless the node was relabeled since"""
+    record = _get_node_record(session, NodeDetailsRecord, analysis_id, node_id)
+    if record is None or record.node_label != node_label:
+        return None
+    return NodeDetails.model_validate(record.details)
+
+
+def save_node_details(
+    session: Session,
+    analysis_id: int,
+    node_id: str,
+    node_label: str,
+    details: NodeDetails,
+) -> None:
+    _save_node_record(
+        session,
+        NodeDetailsRecord,
+        analysis_id,
+        node_id,
+        node_label,
+        details=details.model_dump(mode="json"),
+    )
+
+
+def get_node_expansion(
+    session: Session, analysis_id: int, node_id: str, node_label: str
+) -> ExpandedNodeData | None:
+    """Stored expansion of a node, unless the node was relabeled since"""
+    record = _get_node_record(session, NodeExpansionRecord, analysis_id, node_id)
+    if record is None or record.node_label != node_label:
+        return None
+    return ExpandedNodeData.model_validate(record.expansion)
+
+
+def save_node_expansion(
+    session: Session,
+    analysis_id: int,
+    node_id: str,
+    node_label: str,
+    expansion: ExpandedNodeData,
+) -> None:
+    _save_node_record(
+        session,
+        NodeExpansionRecord,
+        analysis_id,
+        node_id,
+        node_label,
+        expansion=expansion.model_dump(mode="json"),
+    )
+
+
+def get_node_content(
+    session: Session, analysis_id: int, graph: Graph
+) -> Tuple[Dict[str, NodeDetails], Dict[str, ExpandedNodeData]]:
+    """
+    All stored details and expansions of the nodes of a graph
+
+    Returns:
+        (details, expansions), each keyed by node ID
+    """
+    labels = {node.id: node.label for node in graph.nodes}
+    details = {
+        record.node_id: NodeDetails.model_validate(record.details)
+        for record in session.exec(
+            select(NodeDetailsRecord).where(
+                NodeDetailsRecord.analysis_id == analysis_id
+            )
+        )
+        if labels.get(record.node_id) == record.node_label
+    }
+    expansions = {
+        record.node_id: ExpandedNodeData.model_validate(record.expansion)
+        for record in session.exec(
+            select(NodeExpansionRecord).where(
+                NodeExpansionRecord.analysis_id == analysis_id
+            )
+        )
+        if labels.get(record.node_id) == record.node_label
+    }
+    return details, expansions
+
+
+def create_job(session: Session, request: AnalyzeRequest) -> AnalysisJob:
+    """Persist a queued analysis job"""
+    job = AnalysisJob(request_data=request.model_dump(mode="json"))
+    session.add(job)
+    session.commit()
+    session.refresh(job)
+    return job
+
+
+def get_job(session: Session, job_id: int) -> AnalysisJob | None:
+    return session.exec(select(AnalysisJob).where(AnalysisJob.id == job_id)).first()
+
+
+def claim_job(session: Session, job_id: int) -> AnalysisJob | None:
+    """
+    Move a queued job to running
+
+    The status check and update are one statement, so a job submitted to
+    several workers (or server processes) only runs once.
+
+    Returns:
+        The claimed job, or None if it is not queued (anymore)
+    """
+    result = session.exec(
+        update(AnalysisJob)
+        .where(AnalysisJob.id == job_id, AnalysisJob.status == JobStatus.queued.value)
+        .values(
+            status=JobStatus.running.value,
+            stage=None,
+            started_at=datetime.utcnow(),
+            heartbeat_at=datetime.utcnow(),
+            attempts=AnalysisJob.attempts + 1,
+        )
+    )
+    session.commit()
+    if result.rowcount != 1:
+        return None
+    job = get_job(session, job_id)
+    session.refresh(job)
+    return job
+
+
+def set_job_stage(session: Session, job: AnalysisJob, stage: str) -> None:
+    job.stage = stage
+    session.add(job)
+    session.commit()
+
+
+def finish_job(
+    session: Session,
+    job: AnalysisJob,
+    result: Optional[AnalyzeResponse] = None,
+    error: Optional[str] = None,
+) -> AnalysisJob:
+    """Record the outcome of a job: a result on success, an error otherwise"""
+    job.status = (JobStatus.failed if error else JobStatus.succeeded).value
+    job.stage = None
+    job.result_data = result.model_dump(mode="json") if result else None
+    job.error = error
+    job.finished_at = datetime.utcnow()
+    session.add(job)
+    session.commit()
+    session.refresh(job)
+    return job
+
+
+def touch_job(session: Session, job_id: int) -> None:
+    """Refresh the heartbeat of a job this process is running"""
+    session.exec(
+        update(AnalysisJob)
+        .where(AnalysisJob.id == job_id, AnalysisJob.status == JobStatus.running.value)
+        .values(heartbeat_at=datetime.utcnow())
+    )
+    session.commit()
+
+
+def requeue_stale_jobs(
+    session: Session, stale_before: datetime, max_attempts: int
+) -> List[int]:
+    """
+    Put running jobs whose worker is gone back in the queue
+
+    Jobs other live processes are running keep a fresh heartbeat and are
+    left alone, so a second server process or a rolling restart does not
+    run them twice. Jobs that already started max_attempts times (they keep
+    crashing their worker) fail instead.
+
+    Args:
+        stale_before: Jobs without a heartbeat since then are requeued
+        max_attempts: Executions after which a stale job is given up
+
+    Returns:
+        Ids of the requeued jobs, oldest first
+    """
+    stale = (
+        AnalysisJob.status == JobStatus.running.value,
+        or_(
+            AnalysisJob.heartbeat_at.is_(None),
+            AnalysisJob.heartbeat_at < stale_before,
+        ),
+    )
+    session.exec(
+        update(AnalysisJob)
+        .where(*stale, AnalysisJob.attempts >= max_attempts)
+        .values(
+            status=JobStatus.failed.value,
+            stage=None,
+            error=f"分析中断 {max_attempts} 次，已放弃。",
+            finished_at=datetime.utcnow(),
+        )
+    )
+    job_ids = list(
+        session.exec(
+            select(AnalysisJob.id).where(*stale).order_by(AnalysisJob.id)
+        ).all()
+    )
+    if job_ids:
+        # Conditions repeated so a heartbeat arriving meanwhile wins
+        session.exec(
+            update(AnalysisJob)
+            .where(AnalysisJob.id.in_(job_ids), *stale)
+            .values(status=JobStatus.queued.value, stage=None)
+        )
+    session.commit()
+    return job_ids
+
+
+def queued_job_ids(session: Session) -> List[int]:
+    """Ids of all queued jobs, oldest first"""
+    return list(
+        session.exec(
+            select(AnalysisJob.id)
+            .where(AnalysisJob.status == JobStatus.queued.value)
+            .order_by(AnalysisJob.id)
+        ).all()
+    )
+
+
+def llm_usage_by_endpoint(session: Session, since: datetime) -> List[LLMEndpointUsage]:
+    """
+    Aggregate the LLM calls made since a point in time per endpoint
+
+    Returns:
+        One entry per endpoint, most tokens first
+    """
+    total_tokens = func.sum(LLMCall.prompt_tokens + LLMCall.completion_tokens)
+    rows = session.exec(
+        select(
+            LLMCall.endpoint,
+            func.count(LLMCall.id),
+            func.sum(case((LLMCall.success, 0), else_=1)),
+            func.sum(case((LLMCall.attempt > 0, 1), else_=0)),
+            func.sum(LLMCall.prompt_tokens),
+            func.sum(LLMCall.cached_tokens),
+            func.sum(LLMCall.completion_tokens),
+            func.avg(LLMCall.latency_ms),
+            func.max(LLMCall.latency_ms),
+            func.sum(LLMCall.cost_usd),
+        )
+        .where(LLMCall.created_at >= since)
+        .group_by(LLMCall.endpoint)
+        .order_by(total_tokens.desc())
+    ).all()
+    return [
+        LLMEndpointUsage(
+            endpoint=endpoint,
+            calls=calls,
+            failures=failures or 0,
+            retries=retries or 0,
+            prompt_tokens=prompt or 0,
+            cached_tokens=cached or 0,
+            completion_tokens=completion or 0,
+            avg_latency_ms=round(float(avg_latency or 0), 1),
+            max_latency_ms=max_latency or 0,
+            cost_usd=round(cost or 0.0, 6),
+        )
+        for (
+            endpoint,
+            calls,
+            failures,
+            retries,
+            prompt,
+            cached,
+            completion,
+            avg_latency,
+            max_latency,
+            cost,
+        ) in rows
+    ]
@@ -0,0 +1,89 @@
+"""SimHash fingerprints for near-duplicate text detection.
+
+A SimHash maps a text to 64 bits such that similar texts differ in only a
+few bits. Texts are compared by Hamming distance; to find candidates in the
+database without scanning, the fingerprint is split into SIMHASH_BANDS
+bands that are indexed separately. By the pigeonhole principle two
+fingerprints within SIMHASH_BANDS - 1 bits of each other share at least
+one band exactly.
+
+A single-character edit of a text of a few hundred characters moves its
+fingerprint by up to 7 bits, so the index uses 8 bands of 8 bits. Each band
+value is shared by 1/256 of all texts; the candidates are then filtered by
+their exact Hamming distance.
+"""
+
+from __future__ import annotations
+
+import hashlib
+from typing import List, Tuple
+
+SIMHASH_BITS = 64
+SIMHASH_BANDS = 8
+_BAND_BITS = SIMHASH_BITS // SIMHASH_BANDS
+_SHINGLE_SIZE = 4
+
+
+def _shingles(text: str) -> set:
+    """Character n-grams of the case- and whitespace-normalized text.
+
+    Characters rather than words so that CJK text, which has no spaces,
+    is fingerprinted just as well as English.
+    """
+    normalized = " ".join(text.casefold().split())
+    if len(normalized) <= _SHINGLE_SIZE:
+        return {normalized} if normalized else set()
+    return {
+        normalized[i : i + _SHINGLE_SIZE]
+        for i in range(len(normalized) - _SHINGLE_SIZE + 1)
+    }
+
+
+def simhash(text: str) -> int:
+    """
+    Compute the 64-bit SimHash of a text
+
+    Args:
+        text: Text to fingerprint
+
+    Returns:
+        Unsigned 64-bit fingerprint (0 for empty text)
+    """
+    shingles = _shingles(text)
+    if not shingles:
+        return 0
+
+    # Column-wise bit counts: bits[i] is how many shingle hashes have bit i set
+    digests = [
+        f"{int.from_bytes(hashlib.blake2b(s.encode(), digest_size=8).digest()):064b}"
+        for s in shingles
+    ]
+    threshold = len(digests) / 2
+    fingerprint = 0
+    for column in zip(*digests):
+        fingerprint = (fingerprint << 1) | (column.count("1") > threshold)
+    return fingerprint
+
+
+def hamming_distance(a: int, b: int) -> int:
+    """Number of differing bits between two fingerprints"""
+    return (a ^ b).bit_count()
+
+
+def simhash_bands(fingerprint: int) -> List[Tuple[int, int]]:
+    """Split a fingerprint into (band index, band value) pairs for indexing"""
+    mask = (1 << _BAND_BITS) - 1
+    return [
+        (band, (fingerprint >> (band * _BAND_BITS)) & mask)
+        for band in range(SIMHASH_BANDS)
+    ]
+
+
+def to_signed64(fingerprint: int) -> int:
+    """Map an unsigned fingerprint onto a signed BIGINT column"""
+    return fingerprint - (1 << 64) if fingerprint >= 1 << 63 else fingerprint
+
+
+def from_signed64(value: int) -> int:
+    """Inverse of to_signed64"""
+    return value + (1 << 64) if value < 0 else value
@@ -0,0 +1,239 @@
+"""Deterministic stand-in for the LLM, for load and latency benchmarks.
+
+StubLLM answers every prompt the services send (analysis, node details,
+expansions, concept integration) with synthetic JSON of the expected shape.
+The content depends only on the prompt; latency and failures are drawn from
+a seeded random generator, so a benchmark run is repeatable. It backs both
+the in-process "stub" provider and the OpenAI-compatible stub server.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+from typing import List, Optional
+
+from sparsemap.core.config import get_settings
+from sparsemap.domain.models import EMBEDDING_DIM
+
+LATENCY_DISTRIBUTIONS = ("fixed", "uniform", "exponential", "lognormal")
+
+_EDGE_TYPES = ("depends_on", "references", "implements", "supports")
+_NODE_ID = re.compile(r"^- .*\(id: ([^)]+)\)", re.MULTILINE)
+_SINGLE_EXPAND_ID = re.compile(r"要展开的节点: .*\(id: ([^)]+)\)")
+_BATCH_DETAILS_INDEX = re.compile(r"=== 知识点 (\d+)：")
+
+
+class StubLLMError(RuntimeError):
+    """Injected failure of a stub call"""
+
+
+def _digest(text: str) -> str:
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+class StubLLM:
+    """Synthetic LLM with configurable answer size, latency and error rate"""
+
+    def __init__(
+        self,
+        graph_nodes: int = 12,
+        latency_ms: float = 0.0,
+        distribution: str = "fixed",
+        error_rate: float = 0.0,
+        seed: int = 0,
+    ):
+        if distribution not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(
+                f"Unsupported stub latency distribution: {distribution}. "
+                f"Supported: {', '.join(LATENCY_DISTRIBUTIONS)}"
+            )
+        self.graph_nodes = max(graph_nodes, 1)
+        self.latency_ms = max(latency_ms, 0.0)
+        self.distribution = distribution
+        self.error_rate = min(max(error_rate, 0.0), 1.0)
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls) -> "StubLLM":
+        settings = get_settings()
+        return cls(
+            graph_nodes=settings.stub_graph_nodes,
+            latency_ms=settings.stub_latency_ms,
+            distribution=settings.stub_latency_distribution,
+            error_rate=settings.stub_error_rate,
+            seed=settings.stub_seed,
+        )
+
+    def next_latency(self) -> float:
+        """
+        Seconds the next call should take
+
+        stub_latency_ms is the constant (fixed), mean (uniform over [0, 2x],
+        exponential) or median (lognormal, sigma 0.5: a long tail) latency.
+        """
+        mean = self.latency_ms / 1000
+        if mean == 0:
+            return 0.0
+        with self._lock:
+            if self.distribution == "uniform":
+                return self._random.uniform(0, 2 * mean)
+            if self.distribution == "exponential":
+                return self._random.expovariate(1 / mean)
+            if self.distribution == "lognormal":
+                return self._random.lognormvariate(math.log(mean), 0.5)
+        return mean
+
+    def should_fail(self) -> bool:
+        if self.error_rate <= 0:
+            return False
+        with self._lock:
+            return self._random.random() < self.error_rate
+
+    def complete(self, prompt: str) -> str:
+        """
+        Answer a prompt with JSON of the shape its caller expects
+
+        The kind of request is recognized from the prompt markers of
+        services.llm and the providers.
+        """
+        if '"expansions"' in prompt:
+            ids = _NODE_ID.findall(prompt.split("要展开的节点:")[-1])
+            return json.dumps(
+                {"expansions": [self.expansion(node_id) for node_id in ids]},
+                ensure_ascii=False,
+            )
+        if '"child_nodes"' in prompt:
+            match = _SINGLE_EXPAND_ID.search(prompt)
+            node_id = match.group(1) if match else "n1"
+            return json.dumps(self.expansion(node_id), ensure_ascii=False)
+        if '"linked_1"' in prompt:
+            ids = _NODE_ID.findall(prompt.split("现有图谱节点:")[-1])
+            return json.dumps(self.integration(ids), ensure_ascii=False)
+        indexes = _BATCH_DETAILS_INDEX.findall(prompt)
+        if indexes:
+            details = [
+                {"index": int(index), **self.details(f"{prompt}#{index}")}
+                for index in indexes
+            ]
+            return json.dumps({"details": details}, ensure_ascii=False)
+        if prompt.startswith("知识点："):
+            return json.dumps(self.details(prompt), ensure_ascii=False)
+        return json.dumps(self.graph(prompt), ensure_ascii=False)
+
+    def graph(self, prompt: str) -> dict:
+        """A tree-shaped graph of graph_nodes nodes named after the prompt"""
+        tag = _digest(prompt)[:6]
+        nodes = []
+        edges = []
+        for index in range(1, self.graph_nodes + 1):
+            nodes.append(
+                {
+                    "id": f"n{index}",
+                    "label": f"概念 {index}-{tag}",
+                    "type": "main"
+                    if index <= max(self.graph_nodes // 3, 1)
+                    else "dependency",
+                    "priority": "critical" if index % 2 else "optional",
+                    "reason": f"合成节点 {index}",
+                    "source": "text1",
+                    "description": f"基准测试用的合成概念 {index}",
+                }
+            )
+            if index > 1:
+                edges.append(
+                    {
+                        "source": f"n{index // 2}",
+                        "target": f"n{index}",
+                        "type": _EDGE_TYPES[index % len(_EDGE_TYPES)],
+                        "reason": "合成关系",
+                    }
+                )
+        return {"nodes": nodes, "edges": edges, "summary": f"合成图谱 {tag}"}
+
+    def details(self, prompt: str) -> dict:
+        tag = _digest(prompt)[:6]
+        return {
+            "definition": f"合成定义 {tag}",
+            "analogy": "合成类比",
+            "importance": "合成重要性说明",
+            "actionable_step": "合成练习",
+            "keywords": [f"k{tag[:2]}", f"k{tag[2:4]}", f"k{tag[4:]}"],
+        }
+
+    def expansion(self, node_id: str) -> dict:
+        children = [f"{node_id}_sub{index}" for index in range(1, 4)]
+        return {
+            "node_id": node_id,
+            "child_nodes": [
+                {
+                    "id": child,
+                    "label": f"子概念 {child}",
+                    "type": "dependency",
+                    "priority": "optional",
+                    "reason": "合成子概念",
+                    "description": "基准测试用的合成子概念",
+                    "expandable": False,
+                }
+                for child in children
+            ],
+            "new_edges": [
+                {
+                    "source": node_id,
+                    "target": child,
+                    "type": "implements",
+                    "reason": "合成父子关系",
+                }
+                for child in children
+            ],
+        }
+
+    def integration(self, node_ids: List[str]) -> dict:
+        return {
+            "node": {
+                "id": "linked_1",
+                "label": "合成新概念",
+                "description": "基准测试用的合成概念",
+                "reason": "合成关联",
+            },
+            "edges": [
+                {
+                    "source": "linked_1",
+                    "target": node_id,
+                    "type": "relates_to",
+                    "reason": "合成关系",
+                }
+                for node_id in node_ids[:2]
+            ],
+        }
+
+
+def stub_embedding(text: str) -> List[float]:
+    """Deterministic unit vector of EMBEDDING_DIM dimensions for a text"""
+    values: List[float] = []
+    counter = 0
+    while len(values) < EMBEDDING_DIM:
+        block = hashlib.sha256(f"{counter}:{text}".encode()).digest()
+        values.extend((byte - 127.5) / 127.5 for byte in block)
+        counter += 1
+    values = values[:EMBEDDING_DIM]
+    norm = math.sqrt(sum(value * value for value in values)) or 1.0
+    return [value / norm for value in values]
+
+
+_stub: Optional[StubLLM] = None
+_stub_lock = threading.Lock()
+
+
+def get_stub_llm() -> StubLLM:
+    """The process-wide stub, so latencies and failures follow one seeded sequence"""
+    global _stub
+    with _stub_lock:
+        if _stub is None:
+            _stub = StubLLM.from_settings()
+        return _stub
@@ -0,0 +1,117 @@
+"""Accounting of LLM calls: tokens, latency, retries and cost per endpoint.
+
+Providers report every request they make to the LLM through record_llm_call.
+The call is attributed to the endpoint in the current context (set by the
+API middleware, the job workers and the prefetcher) and stored in the
+llm_call table once recording has been started with an engine.
+"""
+
+from __future__ import annotations
+
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+from sqlmodel import Session
+
+from sparsemap.core.config import get_settings
+from sparsemap.core.metrics import observe_stage
+from sparsemap.domain.models import LLMCall
+from sparsemap.services.llm_provider import TokenUsage
+
+logger = logging.getLogger(__name__)
+
+_endpoint: ContextVar[str] = ContextVar("llm_endpoint", default="other")
+_engine = None
+
+
+def current_endpoint() -> str:
+    """Endpoint LLM calls made in this context are attributed to"""
+    return _endpoint.get()
+
+
+@contextmanager
+def llm_endpoint(name: str) -> Iterator[None]:
+    """Attribute the LLM calls made inside the block to name"""
+    token = _endpoint.set(name)
+    try:
+        yield
+    finally:
+        _endpoint.reset(token)
+
+
+def start_usage_recording(engine) -> None:
+    """Store LLM calls of this process in the llm_call table"""
+    global _engine
+    _engine = engine
+
+
+def stop_usage_recording() -> None:
+    global _engine
+    _engine = None
+
+
+def call_cost(usage: TokenUsage) -> float:
+    """Cost of a call in USD at the configured prices"""
+    settings = get_settings()
+    return (
+        usage.uncached_tokens * settings.llm_price_prompt_per_mtok
+        + usage.cached_tokens * settings.llm_price_cached_per_mtok
+        + usage.completion_tokens * settings.llm_price_completion_per_mtok
+    ) / 1_000_000
+
+
+def record_llm_call(
+    provider: str,
+    model: str,
+    operation: str,
+    usage: Optional[TokenUsage],
+    latency_ms: int,
+    attempt: int = 0,
+    success: bool = True,
+) -> Optional[LLMCall]:
+    """
+    Store one LLM request and observe its latency as the "llm" stage
+
+    Failures to store are logged and otherwise ignored; accounting never
+    fails the call it accounts for.
+
+    Args:
+        provider: Provider name
+        model: Model the request was sent to
+        operation: Provider method, e.g. generate_graph
+        usage: Tokens, if the provider reported them
+        latency_ms: Duration of the request
+        attempt: 0 for the first try, n for the n-th retry
+        success: Whether the provider answered
+
+    Returns:
+        The stored record, or None when recording is off or failed
+    """
+    observe_stage("llm", latency_ms / 1000)
+    if _engine is None:
+        return None
+    usage = usage or TokenUsage()
+    call = LLMCall(
+        endpoint=current_endpoint(),
+        provider=provider,
+        model=model,
+        operation=operation,
+        attempt=attempt,
+        success=success,
+        prompt_tokens=usage.prompt_tokens,
+        cached_tokens=usage.cached_tokens,
+        completion_tokens=usage.completion_tokens,
+        latency_ms=latency_ms,
+        cost_usd=call_cost(usage),
+    )
+    try:
+        with Session(_engine) as session:
+            session.add(call)
+            session.commit()
+            session.refresh(call)
+    except Exception:
+        logger.exception("Recording LLM usage failed")
+        return None
+    return call
@@ -68,7 +68,7 @@ export async function addUrl(url) {
 }
 
 export async function fetchNodeDetails(payload) {
-  // payload: { node_label, node_description, node_context }
+  // payload: { node_label, node_description, node_context, analysis_id?, node_id? }
   return fetchJson(`${API_BASE}/api/node-details`, {
     method: 'POST',
     headers: { 'Content-Type': 'application/json' },
@@ -77,7 +77,7 @@ export async function fetchNodeDetails(payload) {
 }
 
 export async function integrateConcept(payload) {
-  // payload: { new_concept: string, existing_nodes: array }
+  // payload: { new_concept: string, existing_nodes: array, analysis_id?: number }
   return fetchJson(`${API_BASE}/api/integrate-concept`, {
     method: 'POST',
     headers: { 'Content-Type': 'application/json' },
@@ -116,7 +116,13 @@ export async function recallSimilarNodes(query, topK = 5, excludeAnalysisId = nu
   return fetchJson(`${API_BASE}/api/recall?${params.toString()}`);
 }
 
-export async function expandNode(nodeId, nodeLabel, nodeDescription = null, graphContext = null) {
+export async function expandNode(
+  nodeId,
+  nodeLabel,
+  nodeDescription = null,
+  graphContext = null,
+  analysisId = null
+) {
   return fetchJson(`${API_BASE}/api/expand-node`, {
     method: 'POST',
     headers: { 'Content-Type': 'application/json' },
@@ -125,6 +131,7 @@ export async function expandNode(nodeId, nodeLabel, nodeDescription = null, grap
       node_label: nodeLabel,
       node_description: nodeDescription,
       graph_context: graphContext,
+      analysis_id: analysisId,
     }),
   });
 }
@@ -201,9 +201,10 @@ function handleDynamicEvents(e) {
   // Deep Dive
   const deepDiveBtn = e.target.closest('#deep-dive-btn');
   if (deepDiveBtn) {
+    const id = deepDiveBtn.dataset.id;
     const label = deepDiveBtn.dataset.label;
     const desc = deepDiveBtn.dataset.desc;
-    handleDeepDive(label, desc);
+    handleDeepDive(id, label, desc);
     return;
   }
 
@@ -233,7 +234,7 @@ async function handleAnalyze() {
   try {
     const result = await API.analyze({ urls: [url], texts: [] });
     if (result.success) {
-      setGraphData(result.data);
+      setGraphData(result.data, result.analysis_id ?? null);
       UI.switchScreen('canvas');
       setTimeout(() => renderGraph(result.data), 100);
     } else {
@@ -267,7 +268,7 @@ async function handleAnalyzeText() {
   try {
     const result = await API.analyze({ urls: [], texts: [text] });
     if (result.success) {
-      setGraphData(result.data);
+      setGraphData(result.data, result.analysis_id ?? null);
       UI.switchScreen('canvas');
       setTimeout(() => renderGraph(result.data), 100);
     } else {
@@ -358,7 +359,7 @@ async function handleAddUrl() {
   }
 }
 
-async function handleDeepDive(label, desc) {
+async function handleDeepDive(nodeId, label, desc) {
   UI.setDeepDiveLoading();
   try {
     // Fetch node details and similar nodes in parallel
@@ -366,7 +367,10 @@ async function handleDeepDive(label, desc) {
       API.fetchNodeDetails({
         node_label: label,
         node_description: desc,
-        node_context: desc,
+        // Lets the server build the context from the stored graph and
+        // answer from stored (e.g. prefetched) details
+        analysis_id: state.currentAnalysisId,
+        node_id: nodeId,
       }),
       API.recallSimilarNodes(label, 3, state.currentAnalysisId).catch(() => ({
         success: false,
@@ -391,7 +395,13 @@ async function handleExpandNode(nodeId, label, desc) {
 
   try {
     const graphContext = state.currentGraphData?.summary || '';
-    const result = await API.expandNode(nodeId, label, desc, graphContext);
+    const result = await API.expandNode(
+      nodeId,
+      label,
+      desc,
+      graphContext,
+      state.currentAnalysisId
+    );
 
     if (result.success && result.data) {
       addExpandedNodes(result.data, nodeId);
@@ -474,6 +484,7 @@ async function handleIntegrateConcept() {
     const result = await API.integrateConcept({
       new_concept: concept,
       existing_nodes: existingNodes,
+      analysis_id: state.currentAnalysisId,
     });
 
     if (result.success && result.data) {
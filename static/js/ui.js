@@ -182,6 +182,7 @@ export function showNodeInfo(nodeData, currentGraphData) {
   basicHtml += `
         <div class="node-actions" style="margin-top: 16px; display: flex; gap: 8px; flex-wrap: wrap;">
             <button id="deep-dive-btn" class="deep-dive-btn"
+                data-id="${escapeHtml(nodeData.id)}"
                 data-label="${escapeHtml(nodeData.label)}"
                 data-desc="${escapeHtml(nodeData.description || '')}">
                 🔍 Deep Dive (AI 详解)
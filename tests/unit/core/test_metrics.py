@@ -0,0 +1,55 @@
+"""Tests for the Prometheus metrics."""
+
+import pytest
+from fastapi.testclient import TestClient
+
+from sparsemap.api.app import create_app
+from sparsemap.core import metrics
+
+prometheus_client = pytest.importorskip("prometheus_client")
+
+
+def _sample(name: str, labels: dict) -> float:
+    return prometheus_client.REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+class TestMetrics:
+    def test_stage_timer_observes_the_block(self):
+        before = _sample("sparsemap_stage_duration_seconds_count", {"stage": "t1"})
+        with pytest.raises(RuntimeError):
+            with metrics.stage_timer("t1"):
+                raise RuntimeError("failed stages are timed too")
+        with metrics.stage_timer("t1"):
+            pass
+
+        after = _sample("sparsemap_stage_duration_seconds_count", {"stage": "t1"})
+        assert after - before == 2
+
+    def test_gauges_read_their_latest_function(self):
+        metrics.register_gauge("sparsemap_test_gauge", "Test", lambda: 1)
+        metrics.register_gauge("sparsemap_test_gauge", "Test", lambda: 7)
+
+        assert _sample("sparsemap_test_gauge", {}) == 7
+
+    def test_requests_are_labelled_by_route_template(self):
+        client = TestClient(create_app())
+        labels = {"method": "GET", "route": "unmatched", "status": "404"}
+        before = _sample("sparsemap_http_request_duration_seconds_count", labels)
+
+        client.get("/api/analysis/1/no-such-page")
+        client.get("/")
+        response = client.get("/metrics")
+
+        assert response.status_code == 200
+        assert 'route="/",status="200"' in response.text
+        after = _sample("sparsemap_http_request_duration_seconds_count", labels)
+        assert after - before == 1
+
+    def test_endpoint_is_missing_without_prometheus_client(self, monkeypatch):
+        monkeypatch.setattr(metrics, "_get_metrics", lambda: None)
+        client = TestClient(create_app())
+
+        assert client.get("/metrics").status_code == 404
+        # Instrumented code keeps working
+        with metrics.stage_timer("t2"):
+            pass
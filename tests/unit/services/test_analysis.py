@@ -0,0 +1,164 @@
+"""Tests for the shared analysis flow."""
+
+import asyncio
+
+import pytest
+from fastapi import BackgroundTasks, HTTPException
+from fastapi.testclient import TestClient
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine
+
+from sparsemap.api.app import create_app
+from sparsemap.core.config import Settings
+from sparsemap.domain.models import (
+    AnalysisResult,
+    AnalyzeRequest,
+    AnalyzeResponse,
+    BatchAnalyzeRequest,
+    FetchCache,
+    Graph,
+    SimhashBand,
+)
+from sparsemap.services import analysis
+from sparsemap.services.extractor import FetchResult, hash_content, url_cache_key
+from sparsemap.infra.db import get_session
+from sparsemap.services.limits import LLMLimiter
+from sparsemap.services.repository import get_analysis_by_hash, save_analysis
+
+
+@pytest.fixture
+def settings(monkeypatch) -> Settings:
+    settings = Settings(database_url="sqlite://", llm_api_key="test")
+    monkeypatch.setattr(analysis, "get_settings", lambda: settings)
+    return settings
+
+
+@pytest.fixture
+def session():
+    engine = create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+    SQLModel.metadata.create_all(
+        engine,
+        tables=[
+            AnalysisResult.__table__,
+            FetchCache.__table__,
+            SimhashBand.__table__,
+        ],
+    )
+    with Session(engine) as session:
+        yield session
+
+
+def _collect(request: BatchAnalyzeRequest):
+    async def run():
+        tasks = BackgroundTasks()
+        return [r async for r in analysis.run_batch(None, request, tasks)]
+
+    return asyncio.run(run())
+
+
+class TestRunBatch:
+    def test_each_source_is_analyzed_on_its_own(self, settings, monkeypatch):
+        requests = []
+
+        async def fake_run(session, request, background_tasks):
+            requests.append(request)
+            if request.urls == ["https://bad.com"]:
+                raise HTTPException(status_code=400, detail="403")
+            return AnalyzeResponse(
+                success=True, data=Graph(nodes=[], edges=[]), sources=["x"]
+            )
+
+        monkeypatch.setattr(analysis, "run_analysis", fake_run)
+        results = _collect(
+            BatchAnalyzeRequest(
+                urls=["https://a.com", "https://bad.com"], texts=["t"], refresh=True
+            )
+        )
+
+        by_index = {r.index: r for r in results}
+        assert [by_index[i].source for i in range(3)] == ["url1", "url2", "text1"]
+        assert by_index[1].success is False and by_index[1].error == "403"
+        assert by_index[1].url == "https://bad.com"
+        assert by_index[0].success and by_index[2].success
+        assert all(len(r.urls) + len(r.texts) == 1 and r.refresh for r in requests)
+
+    def test_concurrency_is_bounded(self, settings, monkeypatch):
+        settings.batch_concurrency = 2
+        running = 0
+        peak = 0
+
+        async def fake_run(session, request, background_tasks):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+            return AnalyzeResponse(
+                success=True, data=Graph(nodes=[], edges=[]), sources=["x"]
+            )
+
+        monkeypatch.setattr(analysis, "run_analysis", fake_run)
+        results = _collect(BatchAnalyzeRequest(texts=[f"t{i}" for i in range(6)]))
+
+        assert len(results) == 6
+        assert peak == 2
+
+
+class TestRunAnalysis:
+    def test_multi_source_refresh_stores_no_content_hash(
+        self, settings, session, monkeypatch
+    ):
+        old = Graph(nodes=[], edges=[], summary="old")
+        new = Graph(nodes=[], edges=[], summary="new")
+        save_analysis(session, url_cache_key("https://a.com"), old)
+
+        async def fake_fetch(urls, caches):
+            return [
+                FetchResult(url=url, text=f"text of {url}", content_hash=url)
+                for url in urls
+            ]
+
+        monkeypatch.setattr(analysis, "fetch_url_contents", fake_fetch)
+        monkeypatch.setattr(analysis, "analyze_contents", lambda contents: new)
+        monkeypatch.setattr(analysis, "get_llm_limiter", lambda: LLMLimiter(2))
+        request = AnalyzeRequest(urls=["https://a.com", "https://b.com"], refresh=True)
+
+        asyncio.run(analysis.run_analysis(session, request, BackgroundTasks()))
+
+        record = get_analysis_by_hash(session, url_cache_key("https://a.com"))
+        assert record.graph_data["summary"] == "new"
+        assert record.content_hash is None
+
+    def test_near_duplicate_text_reuses_the_stored_graph(
+        self, settings, session, monkeypatch
+    ):
+        text = (
+            "Containers package an application with its dependencies so that it "
+            "runs the same way everywhere. Kubernetes schedules containers onto a "
+            "cluster of machines, restarts them when they fail and scales them "
+            "with load. Services give a stable address to a changing set of pods. "
+        )
+        stored = save_analysis(
+            session,
+            hash_content(text),
+            Graph(nodes=[], edges=[], summary="stored"),
+            content_hash=hash_content(text),
+            source_text=text,
+        )
+
+        def no_llm(contents):
+            raise AssertionError("a near duplicate must not be re-analyzed")
+
+        monkeypatch.setattr(analysis, "analyze_contents", no_llm)
+        app = create_app()
+        app.dependency_overrides[get_session] = lambda: session
+        client = TestClient(app)
+
+        edited = text.replace("stable", "static", 1)
+        response = client.post("/api/analyze", json={"texts": [edited]})
+
+        assert response.status_code == 200
+        assert response.json()["analysis_id"] == stored.id
+        assert response.json()["data"]["summary"] == "stored"
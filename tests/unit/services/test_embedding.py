@@ -0,0 +1,72 @@
+"""Tests for the embedding service."""
+
+from types import SimpleNamespace
+
+import pytest
+
+from sparsemap.core.config import Settings
+from sparsemap.services import embedding
+from sparsemap.services.cassette import get_cassette
+from sparsemap.services.stub_llm import stub_embedding
+
+
+@pytest.fixture
+def settings(monkeypatch) -> Settings:
+    settings = Settings(database_url="sqlite://", llm_api_key="test")
+    monkeypatch.setattr(embedding, "get_settings", lambda: settings)
+    return settings
+
+
+class FakeGeminiModels:
+    def __init__(self):
+        self.batches = []
+
+    def embed_content(self, model, contents):
+        if len(contents) > 100:
+            raise ValueError("at most 100 requests can be in one batch")
+        self.batches.append(contents)
+        return SimpleNamespace(
+            embeddings=[SimpleNamespace(values=[float(text)]) for text in contents]
+        )
+
+
+class TestGenerateEmbeddings:
+    def test_large_inputs_are_split_into_provider_sized_batches(
+        self, settings, monkeypatch
+    ):
+        models = FakeGeminiModels()
+        client = SimpleNamespace(models=models)
+        monkeypatch.setattr(
+            embedding, "_get_embedding_client", lambda: ("gemini", client)
+        )
+        texts = [str(i) for i in range(250)]
+
+        vectors = embedding.generate_embeddings(texts)
+
+        assert [len(batch) for batch in models.batches] == [100, 100, 50]
+        assert vectors == [[float(i)] for i in range(250)]
+
+    def test_no_texts_makes_no_request(self, monkeypatch):
+        def no_client():
+            raise AssertionError("no request expected")
+
+        monkeypatch.setattr(embedding, "_get_embedding_client", no_client)
+
+        assert embedding.generate_embeddings([]) == []
+
+    def test_recorded_vectors_are_replayed(self, settings, monkeypatch, tmp_path):
+        settings.llm_cassette = str(tmp_path / "cassette.jsonl")
+        settings.llm_record = True
+        client = SimpleNamespace(models=FakeGeminiModels())
+        with monkeypatch.context() as patched:
+            patched.setattr(
+                embedding, "_get_embedding_client", lambda: ("gemini", client)
+            )
+            embedding.generate_embeddings(["1", "2"])
+
+        settings.llm_provider = "replay"
+        settings.llm_record = False
+        assert len(get_cassette(settings.llm_cassette)) == 2
+        assert embedding.generate_embeddings(["2", "1"]) == [[2.0], [1.0]]
+        # Not recorded: synthetic vector
+        assert embedding.generate_embedding("3") == stub_embedding("3")
@@ -0,0 +1,128 @@
+"""Tests for multi-node, multi-level expansion."""
+
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine
+
+from sparsemap.core.config import Settings
+from sparsemap.domain.models import (
+    AnalysisResult,
+    Edge,
+    ExpandedNodeData,
+    ExpandNodesRequest,
+    Graph,
+    Node,
+    NodeExpansionRecord,
+    SimhashBand,
+)
+from sparsemap.services import expansion
+from sparsemap.services.limits import LLMLimiter
+from sparsemap.services.repository import save_analysis, save_node_expansion
+
+
+def _children(parent: str, count: int = 2) -> ExpandedNodeData:
+    nodes = [
+        Node(
+            id=f"{parent}_sub{i}",
+            label=f"{parent} child {i}",
+            type="dependency",
+            reason="r",
+            parent_id=parent,
+        )
+        for i in range(1, count + 1)
+    ]
+    edges = [
+        Edge(source=parent, target=node.id, type="implements", reason="r")
+        for node in nodes
+    ]
+    return ExpandedNodeData(child_nodes=nodes, new_edges=edges)
+
+
+@pytest.fixture
+def session(monkeypatch):
+    engine = create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+    SQLModel.metadata.create_all(
+        engine,
+        tables=[
+            AnalysisResult.__table__,
+            SimhashBand.__table__,
+            NodeExpansionRecord.__table__,
+        ],
+    )
+    settings = Settings(database_url="sqlite://", llm_api_key="test")
+    monkeypatch.setattr(expansion, "get_settings", lambda: settings)
+    monkeypatch.setattr(expansion, "get_llm_limiter", lambda: LLMLimiter(2))
+    with Session(engine) as session:
+        session.settings = settings
+        yield session
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    calls = []
+
+    def fake_expand_nodes(nodes, graph_context):
+        calls.append([node["id"] for node in nodes])
+        return {
+            node["id"]: "展开节点失败"
+            if node["label"] == "broken"
+            else _children(node["id"])
+            for node in nodes
+        }
+
+    monkeypatch.setattr(expansion, "expand_nodes", fake_expand_nodes)
+    return calls
+
+
+def _request(*labels, **kwargs) -> ExpandNodesRequest:
+    nodes = [
+        {"node_id": f"n{i}", "node_label": label} for i, label in enumerate(labels, 1)
+    ]
+    return ExpandNodesRequest(nodes=nodes, **kwargs)
+
+
+class TestExpandTree:
+    def test_one_call_per_level(self, session, calls):
+        result = asyncio.run(
+            expansion.expand_tree(session, _request("A", "B", depth=2))
+        )
+
+        assert calls == [
+            ["n1", "n2"],
+            ["n1_sub1", "n1_sub2", "n2_sub1", "n2_sub2"],
+        ]
+        assert len(result.data.child_nodes) == 4 + 8
+        assert len(result.data.new_edges) == 4 + 8
+        assert result.success and result.failed == []
+
+    def test_node_budget_limits_expansion(self, session, calls):
+        session.settings.expand_max_nodes = 3
+        asyncio.run(expansion.expand_tree(session, _request("A", "B", depth=3)))
+
+        assert calls == [["n1", "n2"], ["n1_sub1"]]
+
+    def test_failures_are_reported_per_node(self, session, calls):
+        result = asyncio.run(expansion.expand_tree(session, _request("A", "broken")))
+
+        assert result.failed == ["n2"]
+        assert [node.id for node in result.data.child_nodes] == ["n1_sub1", "n1_sub2"]
+
+    def test_stored_expansions_are_reused_and_new_ones_saved(self, session, calls):
+        record = save_analysis(session, "h", Graph(nodes=[], edges=[]))
+        save_node_expansion(session, record.id, "n1", "A", _children("n1", count=1))
+
+        request = _request("A", "B", analysis_id=record.id)
+        asyncio.run(expansion.expand_tree(session, request))
+        asyncio.run(expansion.expand_tree(session, request))
+
+        assert calls == [["n2"]]
+
+    def test_depth_is_bounded(self, session, calls):
+        with pytest.raises(HTTPException) as exc_info:
+            asyncio.run(expansion.expand_tree(session, _request("A", depth=9)))
+        assert exc_info.value.status_code == 400
@@ -0,0 +1,94 @@
+"""Tests for HTML extraction backends."""
+
+import pytest
+
+from sparsemap.services.extraction import available_backends, extract_text
+
+PAGE = """
+<html>
+  <head><title>t</title><style>body {}</style></head>
+  <body>
+    <nav>Home | About</nav>
+    <main>
+      <h1>Title</h1>
+      <p>First paragraph.</p>
+      <script>var x = 1;</script>
+      <p>Second
+      paragraph.</p>
+    </main>
+    <footer>Copyright</footer>
+  </body>
+</html>
+"""
+
+PROSE = (
+    "Dependency injection decouples construction from use, so components can be "
+    "tested in isolation, swapped at runtime, and configured in one place."
+)
+
+CLUTTERED_PAGE = f"""
+<html><body>
+  <div class="layout">
+    <div class="sidebar">
+      <ul>{"".join(f'<li><a href="/t{i}">Tag number {i} with a long name</a></li>' for i in range(30))}</ul>
+    </div>
+    <div class="story">
+      <p>{PROSE}</p>
+      <p>{PROSE}</p>
+      <p>{PROSE}</p>
+    </div>
+    <div class="links">
+      {"".join(f'<p><a href="/r{i}">Related article {i}: another interesting read for you</a></p>' for i in range(10))}
+    </div>
+  </div>
+</body></html>
+"""
+
+
+@pytest.fixture(params=available_backends())
+def backend(request) -> str:
+    if request.param == "lxml":
+        # Optional extra; a plain `uv sync` does not install it
+        pytest.importorskip("lxml")
+    return request.param
+
+
+class TestExtractText:
+    def test_prefers_main_and_drops_boilerplate(self, backend):
+        text = extract_text(PAGE, max_chars=1000, backend=backend)
+        assert "First paragraph." in text
+        assert "Second\nparagraph." in text
+        assert "Home | About" not in text
+        assert "Copyright" not in text
+        assert "var x" not in text
+
+    def test_falls_back_to_body(self, backend):
+        html = "<html><body><div>Just body</div><footer>x</footer></body></html>"
+        assert extract_text(html, max_chars=1000, backend=backend) == "Just body"
+
+    def test_truncates_to_max_chars(self, backend):
+        html = "<body>" + "<p>line of text</p>" * 1000 + "</body>"
+        text = extract_text(html, max_chars=50, backend=backend)
+        assert len(text) == 50
+        assert text.startswith("line of text\nline of text")
+
+    def test_decodes_bytes_with_charset(self, backend):
+        html = "<body><p>知识图谱</p></body>".encode("gbk")
+        text = extract_text(html, max_chars=100, encoding="gbk", backend=backend)
+        assert text == "知识图谱"
+
+    def test_empty_document(self, backend):
+        assert extract_text("", max_chars=100, backend=backend) == ""
+
+    def test_unknown_backend(self):
+        with pytest.raises(ValueError, match="Unsupported extractor backend"):
+            extract_text(PAGE, max_chars=100, backend="nope")
+
+
+class TestLxmlScoring:
+    def test_picks_prose_over_link_lists(self):
+        pytest.importorskip("lxml")
+        text = extract_text(CLUTTERED_PAGE, max_chars=10_000, backend="lxml")
+        assert text.count("Dependency injection") == 3
+        assert "Tag number" not in text
+        assert "Related article" not in text
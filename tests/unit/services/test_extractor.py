@@ -0,0 +1,270 @@
+"""Tests for the URL content extractor."""
+
+import asyncio
+
+import httpx
+import pytest
+from fastapi import HTTPException
+
+from sparsemap.core.config import Settings
+from sparsemap.domain.models import FetchCache
+from sparsemap.services import extractor
+
+
+@pytest.fixture
+def settings(monkeypatch) -> Settings:
+    settings = Settings(
+        database_url="sqlite://", llm_api_key="test", extractor_pool="inline"
+    )
+    monkeypatch.setattr(extractor, "get_settings", lambda: settings)
+    yield settings
+    extractor.shutdown_extraction_pool()
+
+
+class TestFetchUrlContents:
+    def test_one_failure_does_not_discard_others(self, settings, monkeypatch):
+        async def fake_fetch(url, client=None, cached=None):
+            if "forbidden" in url:
+                raise HTTPException(status_code=400, detail="403")
+            return extractor.FetchResult(url=url, text=f"text of {url}")
+
+        monkeypatch.setattr(extractor, "fetch_page", fake_fetch)
+        urls = ["https://a.com", "https://forbidden.com", "https://b.com"]
+
+        results = asyncio.run(extractor.fetch_url_contents(urls))
+
+        assert [r.url for r in results] == urls
+        assert results[0].text == "text of https://a.com"
+        assert results[1].text is None
+        assert results[1].error == "403"
+        assert results[2].text == "text of https://b.com"
+
+    def test_concurrency_is_bounded(self, settings, monkeypatch):
+        settings.extractor_fetch_concurrency = 2
+        running = 0
+        peak = 0
+
+        async def fake_fetch(url, client=None, cached=None):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+            return extractor.FetchResult(url=url, text="text")
+
+        monkeypatch.setattr(extractor, "fetch_page", fake_fetch)
+        urls = [f"https://site{i}.com" for i in range(6)]
+
+        results = asyncio.run(extractor.fetch_url_contents(urls))
+
+        assert all(r.text == "text" for r in results)
+        assert peak == 2
+
+    def test_deadline_reports_slow_urls(self, settings, monkeypatch):
+        settings.extractor_fetch_deadline = 0.05
+
+        async def fake_fetch(url, client=None, cached=None):
+            if "slow" in url:
+                await asyncio.sleep(5)
+            return extractor.FetchResult(url=url, text="text")
+
+        monkeypatch.setattr(extractor, "fetch_page", fake_fetch)
+
+        results = asyncio.run(
+            extractor.fetch_url_contents(["https://fast.com", "https://slow.com"])
+        )
+
+        assert results[0].text == "text"
+        assert results[1].text is None
+        assert results[1].error
+
+
+def _client(handler) -> httpx.AsyncClient:
+    return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+
+class TestFetchUrlContent:
+    def test_rejects_non_html_content_type(self, settings):
+        def handler(request):
+            return httpx.Response(
+                200, headers={"content-type": "application/pdf"}, content=b"%PDF"
+            )
+
+        async def run():
+            async with _client(handler) as client:
+                await extractor.fetch_url_content("https://x.com/a.pdf", client=client)
+
+        with pytest.raises(HTTPException) as exc_info:
+            asyncio.run(run())
+        assert "application/pdf" in exc_info.value.detail
+
+    def test_stops_reading_at_max_bytes(self, settings):
+        settings.extractor_min_chars = 1
+        settings.extractor_max_bytes = 1000
+        body = b"<body>" + b"<p>word</p>" * 100_000 + b"</body>"
+
+        def handler(request):
+            return httpx.Response(
+                200, headers={"content-type": "text/html"}, content=body
+            )
+
+        async def run():
+            async with _client(handler) as client:
+                return await extractor.fetch_url_content("https://x.com", client=client)
+
+        text, _ = asyncio.run(run())
+        assert 0 < text.count("word") < 100
+
+    def test_maps_403_to_friendly_error(self, settings):
+        async def run():
+            async with _client(lambda request: httpx.Response(403)) as client:
+                await extractor.fetch_url_content("https://x.com", client=client)
+
+        with pytest.raises(HTTPException) as exc_info:
+            asyncio.run(run())
+        assert "403" in exc_info.value.detail
+
+
+HTML = b"<body>" + b"<p>Some page text.</p>" * 20 + b"</body>"
+
+
+def _html_handler(request):
+    return httpx.Response(200, headers={"content-type": "text/html"}, content=HTML)
+
+
+class TestExtractionPool:
+    @pytest.mark.parametrize("pool", ["inline", "thread", "process"])
+    def test_fetch_page_in_pool(self, settings, pool):
+        settings.extractor_pool = pool
+        settings.extractor_min_chars = 1
+
+        async def run():
+            async with _client(_html_handler) as client:
+                return await extractor.fetch_page("https://x.com", client=client)
+
+        page = asyncio.run(run())
+        assert page.text.startswith("Some page text.")
+        assert page.parse_ms > 0
+
+    def test_queue_limit_rejects_with_503(self, settings):
+        settings.extractor_pool = "thread"
+        settings.extractor_pool_queue_limit = 0
+
+        async def run():
+            async with _client(_html_handler) as client:
+                await extractor.fetch_page("https://x.com", client=client)
+
+        with pytest.raises(HTTPException) as exc_info:
+            asyncio.run(run())
+        assert exc_info.value.status_code == 503
+
+    def test_unknown_pool(self, settings):
+        settings.extractor_pool = "gpu"
+        with pytest.raises(ValueError, match="Unsupported extractor pool"):
+            extractor._get_pool()
+
+
+class TestConditionalFetch:
+    def _cache(self) -> FetchCache:
+        return FetchCache(
+            url_hash="h",
+            url="https://x.com",
+            etag='"v1"',
+            last_modified="Mon, 01 Jan 2026 00:00:00 GMT",
+            content_hash="old-hash",
+            text="cached text",
+        )
+
+    def test_sends_validators_and_uses_cache_on_304(self, settings):
+        seen = {}
+
+        def handler(request):
+            seen.update(request.headers)
+            return httpx.Response(304, headers={"etag": '"v1"'})
+
+        async def run():
+            async with _client(handler) as client:
+                return await extractor.fetch_page(
+                    "https://x.com", client=client, cached=self._cache()
+                )
+
+        page = asyncio.run(run())
+        assert seen["if-none-match"] == '"v1"'
+        assert seen["if-modified-since"] == "Mon, 01 Jan 2026 00:00:00 GMT"
+        assert page.not_modified
+        assert page.text == "cached text"
+        assert page.content_hash == "old-hash"
+
+    def test_changed_page_returns_new_validators(self, settings):
+        settings.extractor_min_chars = 1
+
+        def handler(request):
+            return httpx.Response(
+                200,
+                headers={"content-type": "text/html", "etag": '"v2"'},
+                content=HTML,
+            )
+
+        async def run():
+            async with _client(handler) as client:
+                return await extractor.fetch_page(
+                    "https://x.com", client=client, cached=self._cache()
+                )
+
+        page = asyncio.run(run())
+        assert not page.not_modified
+        assert page.etag == '"v2"'
+        assert page.content_hash == extractor.hash_content(page.text)
+
+
+class TestHashContent:
+    def test_ignores_whitespace_differences(self):
+        assert extractor.hash_content("a  b\nc") == extractor.hash_content("a b c ")
+
+    def test_differs_on_content(self):
+        assert extractor.hash_content("a b") != extractor.hash_content("a c")
+
+
+class TestCanonicalizeUrl:
+    @pytest.mark.parametrize(
+        "variant",
+        [
+            "https://x.com/a",
+            "https://x.com/a/",
+            "HTTPS://X.COM/a",
+            "https://x.com:443/a",
+            "https://x.com/a#section-2",
+            "https://x.com/a?utm_source=twitter&utm_medium=social",
+            "https://x.com/a/?fbclid=abc#top",
+            "  https://x.com/a  ",
+        ],
+    )
+    def test_variants_share_canonical_form(self, variant):
+        assert extractor.canonicalize_url(variant) == "https://x.com/a"
+
+    def test_keeps_meaningful_query_sorted(self):
+        url = "https://x.com/search?q=graph&page=2&utm_campaign=x"
+        assert extractor.canonicalize_url(url) == "https://x.com/search?page=2&q=graph"
+
+    @pytest.mark.parametrize(
+        "url",
+        [
+            "https://x.com/repo/blob/README.md?ref=dev",
+            "https://x.com/list?from=20",
+            "https://x.com/item?share_source=a&spm=b",
+        ],
+    )
+    def test_keeps_generic_params_that_may_select_content(self, url):
+        assert extractor.canonicalize_url(url) == url
+
+    def test_keeps_path_case_and_non_default_port(self):
+        url = "http://X.com:8080/Docs/Intro"
+        assert extractor.canonicalize_url(url) == "http://x.com:8080/Docs/Intro"
+
+    def test_root_url_is_unchanged(self):
+        assert extractor.canonicalize_url("https://x.com/") == "https://x.com"
+
+    def test_cache_key_uses_canonical_form(self):
+        assert extractor.url_cache_key(
+            "https://x.com/a/?utm_source=x"
+        ) == extractor.url_cache_key("https://x.com/a")
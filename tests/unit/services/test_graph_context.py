@@ -0,0 +1,45 @@
+"""Tests for the neighborhood context of a node."""
+
+from sparsemap.domain.models import Edge, Graph, Node
+from sparsemap.services.graph_context import build_node_context
+
+
+def _graph() -> Graph:
+    # a - b - c - d, plus an unrelated e
+    return Graph(
+        nodes=[
+            Node(id=i, label=i.upper(), type="dependency", reason="", description=None)
+            for i in "abcde"
+        ],
+        edges=[
+            Edge(source="a", target="b", type="depends_on", reason="a needs b"),
+            Edge(source="c", target="b", type="supports", reason="c helps b"),
+            Edge(source="c", target="d", type="supports", reason="far"),
+        ],
+        summary="About letters",
+    )
+
+
+class TestBuildNodeContext:
+    def test_describes_the_k_hop_neighborhood(self):
+        context = build_node_context(_graph(), "a", hops=2)
+
+        assert context.splitlines()[:2] == ["节点：A", "图谱概述：About letters"]
+        assert "- A --depends_on--> B：a needs b" in context
+        assert "- C --supports--> B：c helps b" in context
+        assert "D" not in context  # Three hops away
+        assert "E" not in context
+
+    def test_closest_relations_come_first_within_budget(self):
+        full = build_node_context(_graph(), "a", hops=3)
+        tight = build_node_context(_graph(), "a", hops=3, max_tokens=30)
+
+        assert "far" in full
+        assert "a needs b" in tight
+        assert "far" not in tight
+
+    def test_is_deterministic(self):
+        assert build_node_context(_graph(), "b") == build_node_context(_graph(), "b")
+
+    def test_unknown_node(self):
+        assert build_node_context(_graph(), "zz") == ""
@@ -0,0 +1,137 @@
+"""Tests for incremental re-analysis of changed documents."""
+
+import pytest
+
+from sparsemap.core.config import Settings
+from sparsemap.domain.models import Edge, Graph, Node
+from sparsemap.services import incremental
+
+
+def _node(node_id: str, label: str) -> Node:
+    return Node(id=node_id, label=label, type="main", reason="r")
+
+
+def _edge(source: str, target: str) -> Edge:
+    return Edge(source=source, target=target, type="depends_on", reason="r")
+
+
+OLD_TEXT = (
+    "Intro to Docker\nContainers share the host kernel.\nKubernetes schedules pods."
+)
+GRAPH = Graph(
+    nodes=[
+        _node("n1", "Docker"),
+        _node("n2", "Containers"),
+        _node("n3", "Kubernetes"),
+    ],
+    edges=[_edge("n3", "n2"), _edge("n2", "n1")],
+    summary="s",
+)
+
+
+@pytest.fixture
+def settings(monkeypatch) -> Settings:
+    settings = Settings(database_url="sqlite://", llm_api_key="test")
+    monkeypatch.setattr(incremental, "get_settings", lambda: settings)
+    return settings
+
+
+class TestDiffParagraphs:
+    def test_reports_changed_regions(self):
+        new_text = OLD_TEXT.replace("Kubernetes schedules pods.", "Nomad runs jobs.")
+        diff = incremental.diff_paragraphs(OLD_TEXT, new_text)
+        assert diff.added == ["Nomad runs jobs."]
+        assert diff.removed == ["Kubernetes schedules pods."]
+        assert 0 < diff.change_ratio < 0.5
+
+    def test_ignores_blank_lines_and_indentation(self):
+        diff = incremental.diff_paragraphs(OLD_TEXT, "\n  " + OLD_TEXT + "\n\n")
+        assert diff.added == [] and diff.removed == []
+        assert diff.change_ratio == 0
+
+
+class TestPatchGraph:
+    def test_merges_by_label_and_prefixes_new_ids(self):
+        delta = Graph(
+            nodes=[_node("n1", "docker"), _node("n2", "Nomad")],
+            edges=[_edge("n2", "n1")],
+        )
+        patched, added = incremental.patch_graph(GRAPH, delta, {"n3"}, "abc_")
+
+        assert added == 1
+        assert [n.id for n in patched.nodes] == ["n1", "n2", "abc_n2"]
+        pairs = [(e.source, e.target) for e in patched.edges]
+        # Edge touching the stale node is gone, delta edge is remapped
+        assert pairs == [("n2", "n1"), ("abc_n2", "n1")]
+        assert patched.summary == "s"
+
+    def test_skips_duplicate_and_dangling_edges(self):
+        delta = Graph(
+            nodes=[_node("x", "Containers"), _node("y", "Docker")],
+            edges=[_edge("x", "y"), _edge("x", "missing")],
+        )
+        patched, added = incremental.patch_graph(GRAPH, delta, set(), "abc_")
+        assert added == 0
+        assert len(patched.edges) == len(GRAPH.edges)
+
+
+class TestRefreshGraph:
+    def test_unchanged_text_skips_llm(self, settings, monkeypatch):
+        def fail(*args, **kwargs):
+            raise AssertionError("LLM should not be called")
+
+        monkeypatch.setattr(incremental, "analyze_contents", fail)
+        result = incremental.refresh_graph(GRAPH, OLD_TEXT, OLD_TEXT + "  ")
+        assert result.mode == "unchanged"
+        assert result.graph == GRAPH
+
+    def test_small_change_analyzes_only_changed_chunks(self, settings, monkeypatch):
+        calls = []
+
+        def fake_analyze(contents, known_labels=None):
+            calls.append((contents, known_labels))
+            nomad = _node("n1", "Nomad").model_copy(update={"source": "change1"})
+            return Graph(nodes=[nomad], edges=[])
+
+        monkeypatch.setattr(incremental, "analyze_contents", fake_analyze)
+        new_text = OLD_TEXT.replace("Kubernetes schedules pods.", "Nomad runs jobs.")
+
+        result = incremental.refresh_graph(GRAPH, OLD_TEXT, new_text, source="url1")
+
+        contents, known_labels = calls[0]
+        assert contents == [{"source": "change1", "text": "Nomad runs jobs."}]
+        assert known_labels == ["Docker", "Containers", "Kubernetes"]
+        assert result.mode == "incremental"
+        assert (result.added_nodes, result.removed_nodes) == (1, 1)
+        assert [n.label for n in result.graph.nodes] == [
+            "Docker",
+            "Containers",
+            "Nomad",
+        ]
+        # The chunk name is internal; added nodes belong to the document
+        assert result.graph.nodes[-1].source == "url1"
+
+    def test_large_change_falls_back_to_full_analysis(self, settings, monkeypatch):
+        settings.incremental_max_change_ratio = 0.1
+        calls = []
+
+        def fake_analyze(contents, known_labels=None):
+            calls.append((contents, known_labels))
+            return Graph(nodes=[_node("n1", "Nomad")], edges=[])
+
+        monkeypatch.setattr(incremental, "analyze_contents", fake_analyze)
+        new_text = "Nomad runs jobs.\nConsul discovers services."
+
+        result = incremental.refresh_graph(GRAPH, OLD_TEXT, new_text, source="url1")
+
+        assert calls == [([{"source": "url1", "text": new_text}], None)]
+        assert result.mode == "full"
+        assert result.removed_nodes == 3
+
+    def test_missing_old_text_falls_back_to_full_analysis(self, settings, monkeypatch):
+        monkeypatch.setattr(
+            incremental,
+            "analyze_contents",
+            lambda contents, known_labels=None: Graph(nodes=[], edges=[]),
+        )
+        assert incremental.refresh_graph(GRAPH, None, OLD_TEXT).mode == "full"
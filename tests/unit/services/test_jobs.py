@@ -0,0 +1,244 @@
+"""Tests for background analysis jobs."""
+
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine
+
+from sparsemap.domain.models import (
+    AnalysisJob,
+    AnalyzeRequest,
+    AnalyzeResponse,
+    Graph,
+    JobStatus,
+)
+from sparsemap.services import jobs
+from sparsemap.services.repository import (
+    create_job,
+    get_job,
+    requeue_stale_jobs,
+    touch_job,
+)
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+    SQLModel.metadata.create_all(engine, tables=[AnalysisJob.__table__])
+    return engine
+
+
+def _submit(engine, text: str = "some text") -> int:
+    with Session(engine) as session:
+        return create_job(session, AnalyzeRequest(texts=[text])).id
+
+
+def _job(engine, job_id: int) -> AnalysisJob:
+    with Session(engine) as session:
+        return get_job(session, job_id)
+
+
+GRAPH = Graph(nodes=[], edges=[], summary="done")
+
+
+class TestJobRunner:
+    def test_successful_job_stores_result_and_publishes_stages(
+        self, engine, monkeypatch
+    ):
+        async def fake_run(session, request, background_tasks, on_stage=None):
+            on_stage("analyzing")
+            return AnalyzeResponse(success=True, data=GRAPH, sources=["text1"])
+
+        monkeypatch.setattr(jobs, "run_analysis", fake_run)
+        job_id = _submit(engine)
+
+        async def run():
+            runner = jobs.JobRunner(engine, workers=1)
+            updates = runner.subscribe(job_id)
+            await runner.run_job(job_id)
+            return [updates.get_nowait() for _ in range(updates.qsize())]
+
+        states = asyncio.run(run())
+
+        assert [(s.status, s.stage) for s in states] == [
+            (JobStatus.running, None),
+            (JobStatus.running, "analyzing"),
+            (JobStatus.succeeded, None),
+        ]
+        job = _job(engine, job_id)
+        assert job.status == "succeeded"
+        assert job.attempts == 1
+        assert jobs.job_response(job).result.data.summary == "done"
+
+    def test_failed_job_records_error(self, engine, monkeypatch):
+        async def fake_run(session, request, background_tasks, on_stage=None):
+            raise HTTPException(status_code=400, detail="抓取内容过短")
+
+        monkeypatch.setattr(jobs, "run_analysis", fake_run)
+        job_id = _submit(engine)
+
+        asyncio.run(jobs.JobRunner(engine, workers=1).run_job(job_id))
+
+        job = _job(engine, job_id)
+        assert job.status == "failed"
+        assert job.error == "抓取内容过短"
+        assert job.finished_at is not None
+
+    def test_job_runs_only_once(self, engine, monkeypatch):
+        calls = []
+
+        async def fake_run(session, request, background_tasks, on_stage=None):
+            calls.append(request)
+            return AnalyzeResponse(success=True, data=GRAPH, sources=["text1"])
+
+        monkeypatch.setattr(jobs, "run_analysis", fake_run)
+        job_id = _submit(engine)
+
+        async def run():
+            runner = jobs.JobRunner(engine, workers=1)
+            await runner.run_job(job_id)
+            await runner.run_job(job_id)
+
+        asyncio.run(run())
+        assert len(calls) == 1
+
+    def test_start_resumes_interrupted_jobs(self, engine, monkeypatch):
+        done = []
+
+        async def fake_run(session, request, background_tasks, on_stage=None):
+            done.append(request.texts[0])
+            return AnalyzeResponse(success=True, data=GRAPH, sources=["text1"])
+
+        monkeypatch.setattr(jobs, "run_analysis", fake_run)
+        queued = _submit(engine, "queued")
+        interrupted = _submit(engine, "interrupted")
+        with Session(engine) as session:
+            job = get_job(session, interrupted)
+            job.status = JobStatus.running.value
+            session.add(job)
+            session.commit()
+
+        async def run():
+            runner = jobs.JobRunner(engine, workers=2)
+            await runner.start()
+            await runner._queue.join()
+            await runner.stop()
+
+        asyncio.run(run())
+
+        assert sorted(done) == ["interrupted", "queued"]
+        assert _job(engine, queued).status == "succeeded"
+        assert _job(engine, interrupted).status == "succeeded"
+
+    def test_start_leaves_jobs_of_live_workers_alone(self, engine, monkeypatch):
+        done = []
+
+        async def fake_run(session, request, background_tasks, on_stage=None):
+            done.append(request.texts[0])
+            return AnalyzeResponse(success=True, data=GRAPH, sources=["text1"])
+
+        monkeypatch.setattr(jobs, "run_analysis", fake_run)
+        live = _submit(engine, "live")
+        with Session(engine) as session:
+            job = get_job(session, live)
+            job.status = JobStatus.running.value
+            job.heartbeat_at = datetime.utcnow()
+            session.add(job)
+            session.commit()
+
+        async def run():
+            runner = jobs.JobRunner(engine, workers=1)
+            await runner.start()
+            await runner._queue.join()
+            await runner.stop()
+
+        asyncio.run(run())
+
+        assert done == []
+        assert _job(engine, live).status == "running"
+
+    def test_sweep_runs_jobs_submitted_elsewhere(self, engine, monkeypatch):
+        done = []
+
+        async def fake_run(session, request, background_tasks, on_stage=None):
+            done.append(request.texts[0])
+            return AnalyzeResponse(success=True, data=GRAPH, sources=["text1"])
+
+        monkeypatch.setattr(jobs, "run_analysis", fake_run)
+
+        async def run():
+            runner = jobs.JobRunner(engine, workers=1, stale_after=0.1)
+            await runner.start()
+            # Submitted by a process without workers: only in the database
+            job_id = _submit(engine, "elsewhere")
+            await asyncio.sleep(0.3)
+            await runner._queue.join()
+            await runner.stop()
+            return job_id
+
+        job_id = asyncio.run(run())
+
+        assert done == ["elsewhere"]
+        assert _job(engine, job_id).status == "succeeded"
+
+
+class TestStaleJobs:
+    def test_only_jobs_without_a_recent_heartbeat_are_requeued(self, engine):
+        now = datetime.utcnow()
+        job_ids = [_submit(engine) for _ in range(3)]
+        with Session(engine) as session:
+            for job_id, heartbeat in zip(
+                job_ids, [None, now - timedelta(minutes=10), now]
+            ):
+                job = get_job(session, job_id)
+                job.status = JobStatus.running.value
+                job.heartbeat_at = heartbeat
+                session.add(job)
+            session.commit()
+
+            requeued = requeue_stale_jobs(session, now - timedelta(minutes=2), 3)
+
+        assert requeued == job_ids[:2]
+        assert [_job(engine, job_id).status for job_id in job_ids] == [
+            "queued",
+            "queued",
+            "running",
+        ]
+
+    def test_heartbeat_keeps_a_running_job(self, engine):
+        job_id = _submit(engine)
+        with Session(engine) as session:
+            job = get_job(session, job_id)
+            job.status = JobStatus.running.value
+            job.heartbeat_at = datetime.utcnow() - timedelta(minutes=10)
+            session.add(job)
+            session.commit()
+
+            touch_job(session, job_id)
+            requeued = requeue_stale_jobs(
+                session, datetime.utcnow() - timedelta(minutes=2), 3
+            )
+
+        assert requeued == []
+
+    def test_jobs_interrupted_too_often_fail(self, engine):
+        job_ids = [_submit(engine) for _ in range(2)]
+        with Session(engine) as session:
+            for job_id, attempts in zip(job_ids, [2, 3]):
+                job = get_job(session, job_id)
+                job.status = JobStatus.running.value
+                job.attempts = attempts
+                session.add(job)
+            session.commit()
+
+            requeued = requeue_stale_jobs(session, datetime.utcnow(), 3)
+
+        assert requeued == job_ids[:1]
+        given_up = _job(engine, job_ids[1])
+        assert given_up.status == "failed"
+        assert given_up.error and given_up.finished_at is not None
@@ -0,0 +1,74 @@
+"""Tests for the process-wide LLM limiter."""
+
+import asyncio
+import time
+
+import pytest
+
+from sparsemap.services.limits import LLMLimiter
+
+
+class TestLLMLimiter:
+    def test_caps_concurrent_calls(self):
+        running = 0
+        peak = 0
+
+        async def call(limiter):
+            nonlocal running, peak
+            async with limiter.slot():
+                running += 1
+                peak = max(peak, running)
+                await asyncio.sleep(0.01)
+                running -= 1
+
+        async def run():
+            limiter = LLMLimiter(max_concurrency=2)
+            await asyncio.gather(*(call(limiter) for _ in range(6)))
+
+        asyncio.run(run())
+        assert peak == 2
+
+    def test_spaces_out_call_starts(self):
+        starts = []
+
+        async def call(limiter):
+            async with limiter.slot():
+                starts.append(time.monotonic())
+
+        async def run():
+            # 1200 per minute = one start every 50 ms
+            limiter = LLMLimiter(max_concurrency=10, requests_per_minute=1200)
+            await asyncio.gather(*(call(limiter) for _ in range(3)))
+
+        asyncio.run(run())
+        gaps = [later - earlier for earlier, later in zip(starts, starts[1:])]
+        assert all(gap >= 0.045 for gap in gaps)
+
+    def test_background_calls_leave_a_slot_free(self):
+        running = 0
+        peak = 0
+
+        async def call(limiter):
+            nonlocal running, peak
+            async with limiter.slot(background=True):
+                running += 1
+                peak = max(peak, running)
+                await asyncio.sleep(0.01)
+                running -= 1
+
+        async def run():
+            limiter = LLMLimiter(max_concurrency=3)
+            await asyncio.gather(*(call(limiter) for _ in range(6)))
+
+        asyncio.run(run())
+        assert peak == 2
+
+    def test_a_single_slot_is_never_given_to_background_calls(self):
+        async def run():
+            limiter = LLMLimiter(max_concurrency=1)
+            assert limiter.background_slots == 0
+            with pytest.raises(RuntimeError):
+                async with limiter.slot(background=True):
+                    pass
+
+        asyncio.run(run())
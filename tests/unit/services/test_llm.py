@@ -0,0 +1,325 @@
+"""Tests for LLM service helpers that do not need a real provider."""
+
+import json
+
+import pytest
+
+from sparsemap.core.config import Settings
+from sparsemap.domain.models import Graph, NodeDetails
+from sparsemap.services import embedding, llm
+from sparsemap.services.llm_provider import LLMProvider
+
+
+def _details(name: str) -> dict:
+    return {
+        "definition": f"{name} definition",
+        "analogy": "a",
+        "importance": "i",
+        "actionable_step": "s",
+        "keywords": [name],
+    }
+
+
+class FakeProvider(LLMProvider):
+    """Answers batches from a canned generate_raw response"""
+
+    def __init__(self, raw_responses):
+        self.raw_responses = list(raw_responses)
+        self.prompts = []
+        self.single_calls = []
+
+    def generate_graph(self, contents, prompt) -> Graph:
+        raise NotImplementedError
+
+    def generate_raw(self, prompt: str) -> str:
+        self.prompts.append(prompt)
+        response = self.raw_responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    def generate_node_details(self, node_label: str, context: str) -> NodeDetails:
+        self.single_calls.append(node_label)
+        if node_label == "broken":
+            raise ValueError("生成节点详情失败")
+        return NodeDetails.model_validate(_details(node_label))
+
+
+@pytest.fixture
+def settings(monkeypatch) -> Settings:
+    settings = Settings(database_url="sqlite://", llm_api_key="test")
+    monkeypatch.setattr(llm, "get_settings", lambda: settings)
+    return settings
+
+
+def _nodes(*labels):
+    return [{"label": label, "context": f"about {label}"} for label in labels]
+
+
+class TestGenerateNodeDetailsBatch:
+    def test_one_request_per_batch(self, settings, monkeypatch):
+        settings.node_details_max_batch = 2
+        responses = [
+            json.dumps(
+                {
+                    "details": [
+                        {"index": 1, **_details("A")},
+                        {"index": 2, **_details("B")},
+                    ]
+                }
+            ),
+            json.dumps({"details": [{"index": 1, **_details("C")}]}),
+        ]
+        provider = FakeProvider(responses)
+        monkeypatch.setattr(llm, "_get_provider", lambda: provider)
+
+        results = llm.generate_node_details_batch(_nodes("A", "B", "C"))
+
+        assert [r.definition for r in results] == [
+            "A definition",
+            "B definition",
+            "C definition",
+        ]
+        # Last chunk holds a single node and goes through the single-node call
+        assert len(provider.prompts) == 1
+        assert "=== 知识点 2：B ===" in provider.prompts[0]
+        assert provider.single_calls == ["C"]
+
+    def test_missing_and_invalid_entries_fall_back_per_node(
+        self, settings, monkeypatch
+    ):
+        response = {
+            "details": [
+                {"index": 1, **_details("A")},
+                {"index": 2, "definition": "incomplete"},
+            ]
+        }
+        provider = FakeProvider([json.dumps(response)])
+        monkeypatch.setattr(llm, "_get_provider", lambda: provider)
+
+        results = llm.generate_node_details_batch(_nodes("A", "B", "broken"))
+
+        assert results[0].definition == "A definition"
+        assert results[1].definition == "B definition"
+        assert results[2] == "生成节点详情失败"
+        assert provider.single_calls == ["B", "broken"]
+
+    def test_failed_batch_falls_back_per_node(self, settings, monkeypatch):
+        provider = FakeProvider([ValueError("timeout")])
+        monkeypatch.setattr(llm, "_get_provider", lambda: provider)
+
+        results = llm.generate_node_details_batch(_nodes("A", "B"))
+
+        assert [r.definition for r in results] == ["A definition", "B definition"]
+        assert provider.single_calls == ["A", "B"]
+
+
+def _existing(*labels):
+    return [{"id": f"n{i}", "label": label} for i, label in enumerate(labels)]
+
+
+# Toy 2-d embeddings: "cat"-like texts point one way, "car"-like the other
+def _fake_embeddings(calls):
+    def generate(texts):
+        calls.append(list(texts))
+        return [[1.0, 0.1] if "cat" in text else [0.1, 1.0] for text in texts]
+
+    return generate
+
+
+class TestSelectIntegrationCandidates:
+    def test_small_graphs_are_sent_whole(self, settings, monkeypatch):
+        calls = []
+        monkeypatch.setattr(embedding, "generate_embeddings", _fake_embeddings(calls))
+        nodes = _existing("cat food", "car parts")
+
+        assert llm.select_integration_candidates("cat", nodes) == nodes
+        assert calls == []
+
+    def test_keeps_most_similar_nodes(self, settings, monkeypatch):
+        settings.integrate_max_candidates = 2
+        calls = []
+        monkeypatch.setattr(embedding, "generate_embeddings", _fake_embeddings(calls))
+        nodes = _existing("car parts", "cat food", "engine", "cat toys")
+
+        candidates = llm.select_integration_candidates("cats", nodes)
+
+        assert sorted(node["label"] for node in candidates) == ["cat food", "cat toys"]
+        assert len(calls) == 1  # Query and nodes embedded in one request
+
+    def test_reuses_known_vectors(self, settings, monkeypatch):
+        settings.integrate_max_candidates = 1
+        calls = []
+        monkeypatch.setattr(embedding, "generate_embeddings", _fake_embeddings(calls))
+        nodes = _existing("car parts", "stored")
+
+        candidates = llm.select_integration_candidates(
+            "cat", nodes, node_vectors={"n1": [1.0, 0.0]}
+        )
+
+        assert [node["label"] for node in candidates] == ["stored"]
+        assert calls == [["cat", "car parts"]]
+
+    def test_nodes_are_embedded_like_stored_vectors(self, settings, monkeypatch):
+        settings.integrate_max_candidates = 1
+        calls = []
+        monkeypatch.setattr(embedding, "generate_embeddings", _fake_embeddings(calls))
+        nodes = [
+            {"id": "n1", "label": "cat", "description": "pet", "reason": "r"},
+            {"id": "n2", "label": "car"},
+        ]
+
+        llm.select_integration_candidates("cats", nodes)
+
+        assert calls == [["cats", "cat | pet | r", "car"]]
+
+    def test_embedding_failure_keeps_all_nodes(self, settings, monkeypatch):
+        settings.integrate_max_candidates = 1
+
+        def failing(texts):
+            raise RuntimeError("no embedding model")
+
+        monkeypatch.setattr(embedding, "generate_embeddings", failing)
+        nodes = _existing("a", "b")
+
+        assert llm.select_integration_candidates("cat", nodes) == nodes
+
+
+def _expansion(parent: str, *labels: str) -> dict:
+    return {
+        "node_id": parent,
+        "child_nodes": [
+            {"id": f"c{i}", "label": label, "type": "dependency", "reason": "r"}
+            for i, label in enumerate(labels)
+        ],
+        "new_edges": [
+            {"source": parent, "target": f"c{i}", "type": "implements", "reason": "r"}
+            for i in range(len(labels))
+        ],
+    }
+
+
+class TestParseExpansion:
+    def test_children_get_stable_ids(self):
+        data = llm.parse_expansion("n1", _expansion("n1", "A", "B"), level=2)
+
+        assert [node.id for node in data.child_nodes] == ["n1_sub1", "n1_sub2"]
+        assert all(
+            node.parent_id == "n1" and node.level == 2 for node in data.child_nodes
+        )
+        assert [(e.source, e.target) for e in data.new_edges] == [
+            ("n1", "n1_sub1"),
+            ("n1", "n1_sub2"),
+        ]
+
+
+class TestExpandNodes:
+    def test_one_request_per_batch(self, settings, monkeypatch):
+        provider = FakeProvider(
+            [json.dumps({"expansions": [_expansion("a", "A1"), _expansion("b", "B1")]})]
+        )
+        monkeypatch.setattr(llm, "_get_provider", lambda: provider)
+        nodes = [{"id": "a", "label": "A"}, {"id": "b", "label": "B", "level": 1}]
+
+        results = llm.expand_nodes(nodes, "summary")
+
+        assert len(provider.prompts) == 1
+        assert "summary" in provider.prompts[0]
+        assert [n.id for n in results["a"].child_nodes] == ["a_sub1"]
+        assert results["b"].child_nodes[0].level == 2
+
+    def test_missing_nodes_fall_back_to_single_expansion(self, settings, monkeypatch):
+        single = {"child_nodes": [{"label": "B1", "reason": "r"}], "new_edges": []}
+        provider = FakeProvider(
+            [
+                json.dumps({"expansions": [_expansion("a", "A1")]}),
+                json.dumps(single),
+            ]
+        )
+        monkeypatch.setattr(llm, "_get_provider", lambda: provider)
+        nodes = [{"id": "a", "label": "A"}, {"id": "b", "label": "B"}]
+
+        results = llm.expand_nodes(nodes, None)
+
+        assert len(provider.prompts) == 2
+        assert [n.id for n in results["b"].child_nodes] == ["b_sub1"]
+
+    def test_prompts_share_a_static_prefix(self):
+        first = llm.build_expand_nodes_prompt([{"id": "a", "label": "A"}], "one")
+        second = llm.build_expand_nodes_prompt([{"id": "b", "label": "B"}], "two")
+
+        prefix = first[: first.index("当前图谱概述")]
+        assert second.startswith(prefix)
+        assert "expansions" in prefix
+
+
+class TestRouteAnalysis:
+    def test_parses_and_orders_routes(self):
+        routes = llm.parse_model_routes("*:big, 4000:small,500:tiny")
+        assert routes == [(500, "tiny"), (4000, "small"), (None, "big")]
+
+    def test_rejects_malformed_routes(self):
+        with pytest.raises(ValueError):
+            llm.parse_model_routes("small")
+
+    def test_picks_the_smallest_fitting_route(self, settings):
+        settings.llm_model_routes = "100:tiny,1000:small"
+        settings.llm_model = "default"
+
+        assert llm.route_analysis("x" * 40).model == "tiny"
+        assert llm.route_analysis("x" * 2000).model == "small"
+        assert llm.route_analysis("x" * 8000).model == "default"
+
+    def test_sizes_output_to_input(self, settings):
+        settings.llm_output_base_tokens = 1000
+        settings.llm_output_tokens_ratio = 0.5
+        settings.llm_max_tokens = 4000
+
+        assert llm.route_analysis("x" * 4000).max_tokens == 1500
+        assert llm.route_analysis("x" * 40000).max_tokens == 4000
+
+        settings.llm_output_tokens_ratio = 0
+        assert llm.route_analysis("x").max_tokens == 4000
+
+    def test_output_sizing_is_opt_in(self, settings, monkeypatch):
+        calls = []
+
+        class GraphProvider(FakeProvider):
+            def generate_graph(self, contents, prompt) -> Graph:
+                calls.append(prompt)
+                raise ValueError("truncated graph")
+
+        monkeypatch.setattr(
+            llm, "_get_provider", lambda model=None, max_tokens=None: GraphProvider([])
+        )
+
+        assert llm.route_analysis("x").max_tokens == settings.llm_max_tokens
+        # Already the full budget: no second attempt
+        with pytest.raises(ValueError):
+            llm.analyze_contents([{"source": "text1", "text": "t"}])
+        assert len(calls) == 1
+
+    def test_failed_routed_call_retries_with_default_model(self, settings, monkeypatch):
+        settings.llm_model_routes = "*:small"
+        calls = []
+        graph = Graph(nodes=[], edges=[])
+
+        class GraphProvider(FakeProvider):
+            def __init__(self, model):
+                super().__init__([])
+                self.model = model
+
+            def generate_graph(self, contents, prompt) -> Graph:
+                calls.append(self.model)
+                if self.model == "small":
+                    raise ValueError("invalid graph")
+                return graph
+
+        monkeypatch.setattr(
+            llm,
+            "_get_provider",
+            lambda model=None, max_tokens=None: GraphProvider(model or "default"),
+        )
+
+        assert llm.analyze_contents([{"source": "text1", "text": "t"}]) is graph
+        assert calls == ["small", "default"]
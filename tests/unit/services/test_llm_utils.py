@@ -4,6 +4,7 @@ from sparsemap.services.llm_utils import (
     fix_json,
     escape_newlines_in_strings,
     repair_json,
+    estimate_tokens,
 )
 
 
@@ -74,3 +75,17 @@ class TestRepairJson:
         payload = "invalid json"
         with pytest.raises(ValueError, match="Unable to repair JSON"):
             repair_json(payload)
+
+
+class TestEstimateTokens:
+    def test_estimate_tokens_empty(self):
+        assert estimate_tokens("") == 0
+
+    def test_estimate_tokens_english(self):
+        assert estimate_tokens("abcd" * 25) == 25
+
+    def test_estimate_tokens_cjk(self):
+        assert estimate_tokens("知识图谱") == 4
+
+    def test_estimate_tokens_mixed(self):
+        assert estimate_tokens("FastAPI 框架") == 2 + 2
@@ -0,0 +1,169 @@
+"""Tests for the offline ingestion pipeline."""
+
+import asyncio
+import json
+import threading
+import time
+
+import pytest
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine
+
+from sparsemap.domain.models import (
+    AnalysisResult,
+    FetchCache,
+    Graph,
+    Node,
+    SimhashBand,
+)
+from sparsemap.services import pipeline
+
+
+@pytest.fixture
+def session(monkeypatch):
+    engine = create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+    SQLModel.metadata.create_all(
+        engine,
+        tables=[AnalysisResult.__table__, FetchCache.__table__, SimhashBand.__table__],
+    )
+    embedded = []
+    monkeypatch.setattr(pipeline, "has_embeddings", lambda s, analysis_id: False)
+    monkeypatch.setattr(
+        pipeline,
+        "store_node_embeddings",
+        lambda s, analysis_id, graph: embedded.append(analysis_id),
+    )
+    with Session(engine) as session:
+        session.embedded = embedded
+        yield session
+
+
+def _graph(label: str) -> Graph:
+    return Graph(nodes=[Node(id="n1", label=label, type="main", reason="r")], edges=[])
+
+
+def _items(*texts: str):
+    return [
+        pipeline.IngestItem(key=pipeline.hash_url(text), text=text) for text in texts
+    ]
+
+
+class TestReadItems:
+    def test_parses_urls_and_json_lines(self, tmp_path):
+        path = tmp_path / "input.txt"
+        path.write_text(
+            "# comment\n"
+            "https://x.com/a\n"
+            "\n"
+            '{"text": "some text", "title": "T"}\n'
+            '{"url": "https://x.com/b?utm_source=x"}\n'
+        )
+        items = pipeline.read_items(path)
+        assert [(i.url, i.text, i.title) for i in items] == [
+            ("https://x.com/a", None, None),
+            (None, "some text", "T"),
+            ("https://x.com/b?utm_source=x", None, None),
+        ]
+        assert items[2].key == pipeline.url_cache_key("https://x.com/b")
+
+    def test_rejects_line_without_url_or_text(self, tmp_path):
+        path = tmp_path / "input.txt"
+        path.write_text('{"title": "T"}\n')
+        with pytest.raises(ValueError, match=":1:"):
+            pipeline.read_items(path)
+
+
+class TestIngestPipeline:
+    def test_analyzes_saves_and_embeds(self, session, monkeypatch):
+        monkeypatch.setattr(
+            pipeline, "analyze_contents", lambda contents: _graph(contents[0]["text"])
+        )
+        checkpoint = pipeline.Checkpoint(None)
+
+        report = asyncio.run(
+            pipeline.IngestPipeline(session, checkpoint).run(
+                _items("first text", "second text", "first text")
+            )
+        )
+
+        assert (report.done, report.skipped, report.failed) == (2, 1, 0)
+        assert report.stages["analyze"].count == 2
+        assert len(session.embedded) == 2
+        record = session.get(AnalysisResult, 1)
+        assert record.source_text == "first text"
+
+    def test_resume_skips_finished_and_retries_failed(
+        self, session, monkeypatch, tmp_path
+    ):
+        def flaky_analyze(contents):
+            if contents[0]["text"] == "bad":
+                raise ValueError("LLM 调用失败")
+            return _graph("ok")
+
+        monkeypatch.setattr(pipeline, "analyze_contents", flaky_analyze)
+        path = tmp_path / "checkpoint.jsonl"
+
+        checkpoint = pipeline.Checkpoint(path)
+        report = asyncio.run(
+            pipeline.IngestPipeline(session, checkpoint, embed=False).run(
+                _items("good", "bad")
+            )
+        )
+        checkpoint.close()
+        assert (report.done, report.failed) == (1, 1)
+        entries = [json.loads(line) for line in path.read_text().splitlines()]
+        assert {e["status"] for e in entries} == {"done", "failed"}
+
+        monkeypatch.setattr(pipeline, "analyze_contents", lambda contents: _graph("x"))
+        checkpoint = pipeline.Checkpoint(path)
+        report = asyncio.run(
+            pipeline.IngestPipeline(session, checkpoint, embed=False).run(
+                _items("good", "bad")
+            )
+        )
+        checkpoint.close()
+        assert (report.done, report.skipped, report.failed) == (1, 1, 0)
+
+    def test_existing_analysis_is_reused(self, session, monkeypatch):
+        monkeypatch.setattr(pipeline, "analyze_contents", lambda contents: _graph("x"))
+        items = _items("same text")
+        asyncio.run(
+            pipeline.IngestPipeline(session, pipeline.Checkpoint(None)).run(items)
+        )
+
+        def fail(contents):
+            raise AssertionError("should not re-analyze")
+
+        monkeypatch.setattr(pipeline, "analyze_contents", fail)
+        monkeypatch.setattr(pipeline, "has_embeddings", lambda s, analysis_id: True)
+        report = asyncio.run(
+            pipeline.IngestPipeline(session, pipeline.Checkpoint(None)).run(items)
+        )
+        assert report.cached == 1
+
+    def test_analyze_concurrency_is_bounded(self, session, monkeypatch):
+        lock = threading.Lock()
+        running = 0
+        peak = 0
+
+        def slow_analyze(contents):
+            nonlocal running, peak
+            with lock:
+                running += 1
+                peak = max(peak, running)
+            time.sleep(0.02)
+            with lock:
+                running -= 1
+            return _graph(contents[0]["text"])
+
+        monkeypatch.setattr(pipeline, "analyze_contents", slow_analyze)
+        report = asyncio.run(
+            pipeline.IngestPipeline(
+                session, pipeline.Checkpoint(None), analyze_concurrency=3, embed=False
+            ).run(_items(*(f"text {i}" for i in range(9))))
+        )
+
+        assert report.done == 9
+        assert peak == 3
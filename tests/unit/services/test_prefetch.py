@@ -0,0 +1,161 @@
+"""Tests for prefetching critical node content after analysis."""
+
+import asyncio
+
+import pytest
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine
+
+from sparsemap.core.config import Settings
+from sparsemap.domain.models import (
+    Edge,
+    ExpandedNodeData,
+    Graph,
+    Node,
+    NodeDetails,
+    NodeDetailsRecord,
+    NodeExpansionRecord,
+)
+from sparsemap.services import graph_context, prefetch
+from sparsemap.services.limits import LLMLimiter
+from sparsemap.services.repository import get_node_details, get_node_expansion
+
+
+def _details(label: str) -> NodeDetails:
+    return NodeDetails(
+        definition=f"{label} def",
+        analogy="a",
+        importance="i",
+        actionable_step="s",
+        keywords=[label],
+    )
+
+
+def _graph() -> Graph:
+    return Graph(
+        nodes=[
+            Node(id="d1", label="Dep", type="dependency", reason="r"),
+            Node(id="m1", label="Main", type="main", reason="r", expandable=True),
+            Node(id="d2", label="Hub", type="dependency", reason="r"),
+            Node(
+                id="o1", label="Opt", type="dependency", priority="optional", reason="r"
+            ),
+        ],
+        edges=[
+            Edge(source="d2", target="m1", type="depends_on", reason="r"),
+            Edge(source="d2", target="d1", type="supports", reason="r"),
+            Edge(source="o1", target="d2", type="supports", reason="r"),
+        ],
+        summary="S",
+    )
+
+
+@pytest.fixture
+def engine(monkeypatch):
+    engine = create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+    SQLModel.metadata.create_all(
+        engine, tables=[NodeDetailsRecord.__table__, NodeExpansionRecord.__table__]
+    )
+    return engine
+
+
+@pytest.fixture
+def settings(monkeypatch):
+    settings = Settings(
+        database_url="sqlite://", llm_api_key="test", prefetch_enabled=True
+    )
+    monkeypatch.setattr(prefetch, "get_settings", lambda: settings)
+    monkeypatch.setattr(graph_context, "get_settings", lambda: settings)
+    monkeypatch.setattr(prefetch, "get_llm_limiter", lambda: LLMLimiter(2))
+    return settings
+
+
+class TestSelectPrefetchNodes:
+    def test_main_first_then_by_degree_critical_only(self):
+        nodes = prefetch.select_prefetch_nodes(_graph(), top_n=10)
+        assert [node.id for node in nodes] == ["m1", "d2", "d1"]
+
+    def test_limits_to_top_n(self):
+        nodes = prefetch.select_prefetch_nodes(_graph(), top_n=2)
+        assert [node.id for node in nodes] == ["m1", "d2"]
+
+
+class TestPrefetchNodeContent:
+    def test_stores_details_for_every_analysis(self, engine, settings, monkeypatch):
+        calls = []
+
+        def fake_batch(nodes):
+            assert all(node["context"].startswith("节点：") for node in nodes)
+            calls.append([node["label"] for node in nodes])
+            return [_details(node["label"]) for node in nodes[:-1]] + ["failed"]
+
+        monkeypatch.setattr(prefetch, "generate_node_details_batch", fake_batch)
+        asyncio.run(prefetch.prefetch_node_content(engine, [1, 2], _graph()))
+
+        assert calls == [["Main", "Hub", "Dep"]]
+        with Session(engine) as session:
+            for analysis_id in (1, 2):
+                stored = get_node_details(session, analysis_id, "m1", "Main")
+                assert stored.definition == "Main def"
+                assert get_node_details(session, analysis_id, "d1", "Dep") is None
+            # Relabeled since: not served
+            assert get_node_details(session, 1, "m1", "Other") is None
+
+    def test_skips_nodes_already_stored(self, engine, settings, monkeypatch):
+        calls = []
+
+        def fake_batch(nodes):
+            calls.append([node["label"] for node in nodes])
+            return [_details(node["label"]) for node in nodes]
+
+        monkeypatch.setattr(prefetch, "generate_node_details_batch", fake_batch)
+        asyncio.run(prefetch.prefetch_node_content(engine, [1], _graph()))
+        asyncio.run(prefetch.prefetch_node_content(engine, [1], _graph()))
+
+        assert calls == [["Main", "Hub", "Dep"]]
+
+    def test_expands_expandable_nodes_when_enabled(self, engine, settings, monkeypatch):
+        settings.prefetch_expansions = True
+        expanded = []
+
+        def fake_expand(node_id, label, description, context):
+            expanded.append((node_id, "图谱概述：S" in context))
+            child = Node(
+                id=f"{node_id}_sub1", label="Child", type="dependency", reason="r"
+            )
+            return ExpandedNodeData(child_nodes=[child], new_edges=[])
+
+        monkeypatch.setattr(
+            prefetch,
+            "generate_node_details_batch",
+            lambda nodes: [_details(node["label"]) for node in nodes],
+        )
+        monkeypatch.setattr(prefetch, "expand_node", fake_expand)
+        asyncio.run(prefetch.prefetch_node_content(engine, [1], _graph()))
+
+        assert expanded == [("m1", True)]
+        with Session(engine) as session:
+            stored = get_node_expansion(session, 1, "m1", "Main")
+            assert [node.id for node in stored.child_nodes] == ["m1_sub1"]
+
+    def test_failures_are_swallowed(self, engine, settings, monkeypatch):
+        def failing_batch(nodes):
+            raise RuntimeError("provider down")
+
+        monkeypatch.setattr(prefetch, "generate_node_details_batch", failing_batch)
+        asyncio.run(prefetch.prefetch_node_content(engine, [1], _graph()))
+
+        with Session(engine) as session:
+            assert get_node_details(session, 1, "m1", "Main") is None
+
+    def test_skipped_when_the_only_slot_is_kept_for_users(
+        self, engine, settings, monkeypatch
+    ):
+        calls = []
+        monkeypatch.setattr(prefetch, "get_llm_limiter", lambda: LLMLimiter(1))
+        monkeypatch.setattr(prefetch, "generate_node_details_batch", calls.append)
+        asyncio.run(prefetch.prefetch_node_content(engine, [1], _graph()))
+
+        assert calls == []
@@ -0,0 +1,221 @@
+"""Tests for prompt layout and token usage reporting of the LLM providers."""
+
+import threading
+from types import SimpleNamespace
+
+import pytest
+from google.genai import errors
+
+from sparsemap.services.providers import deepseek, gemini
+from sparsemap.services.providers.deepseek import DeepSeekProvider
+from sparsemap.services.providers.gemini import GeminiProvider
+
+DETAILS_JSON = (
+    '{"definition": "d", "analogy": "a", "importance": "i", '
+    '"actionable_step": "s", "keywords": []}'
+)
+
+
+def _api_error(code: int, message: str) -> errors.ClientError:
+    return errors.ClientError(code, {"error": {"code": code, "message": message}})
+
+
+class FakeModels:
+    def __init__(self, fail_cached: Exception | None = None):
+        self.configs = []
+        self.fail_cached = fail_cached
+
+    def generate_content(self, model, contents, config):
+        self.configs.append((contents, config.cached_content))
+        if config.cached_content and self.fail_cached:
+            raise self.fail_cached
+        usage = SimpleNamespace(
+            prompt_token_count=120,
+            cached_content_token_count=100 if config.cached_content else None,
+            candidates_token_count=30,
+        )
+        return SimpleNamespace(text=DETAILS_JSON, usage_metadata=usage)
+
+
+class FakeCaches:
+    def __init__(self, fail: bool = False):
+        self.created = 0
+        self.fail = fail
+        self.started = threading.Event()
+        self.release = None  # Event create waits for, if set
+
+    def create(self, model, config):
+        self.started.set()
+        if self.release is not None:
+            self.release.wait(timeout=5)
+        self.created += 1
+        if self.fail:
+            raise RuntimeError("cached content is too small")
+        return SimpleNamespace(name=f"cachedContents/{self.created}")
+
+
+@pytest.fixture(autouse=True)
+def clear_context_caches(monkeypatch):
+    monkeypatch.setattr(gemini, "_context_caches", {})
+    monkeypatch.setattr(gemini, "_uncacheable", set())
+    monkeypatch.setattr(gemini, "_creation_locks", {})
+
+
+def _gemini(ttl=0, fail_create=False, fail_cached=None):
+    provider = GeminiProvider(api_key="k", context_cache_ttl=ttl)
+    provider.client = SimpleNamespace(
+        models=FakeModels(fail_cached), caches=FakeCaches(fail_create)
+    )
+    return provider
+
+
+def _record_usage(monkeypatch, module):
+    reported = []
+    monkeypatch.setattr(
+        module,
+        "report_usage",
+        lambda provider, operation, usage: reported.append((operation, usage)),
+    )
+    return reported
+
+
+class TestGeminiProvider:
+    def test_instruction_is_sent_apart_from_the_prompt(self):
+        provider = _gemini()
+        provider.generate_node_details("A", "ctx")
+
+        contents, cached_content = provider.client.models.configs[0]
+        assert gemini.NODE_DETAILS_SYSTEM_INSTRUCTION not in contents
+        assert cached_content is None
+
+    def test_explicit_cache_is_created_once_and_reused(self, monkeypatch):
+        reported = _record_usage(monkeypatch, gemini)
+        first, second = _gemini(ttl=600), _gemini(ttl=600)
+        second.client.caches = first.client.caches
+
+        first.generate_node_details("A", "ctx")
+        second.generate_node_details("B", "ctx")
+
+        assert first.client.caches.created == 1
+        assert second.client.models.configs[0][1] == "cachedContents/1"
+        assert reported[-1][1].cached_tokens == 100
+        assert reported[-1][1].uncached_tokens == 20
+
+    def test_refused_cache_falls_back_to_system_instruction(self):
+        provider = _gemini(ttl=600, fail_create=True)
+        provider.generate_node_details("A", "ctx")
+        provider.generate_node_details("B", "ctx")
+
+        assert provider.client.caches.created == 1
+        assert provider.client.models.configs[-1][1] is None
+
+    def test_call_is_retried_without_a_lost_cache(self, monkeypatch):
+        calls = []
+        monkeypatch.setattr(
+            gemini, "record_llm_call", lambda *args, **kw: calls.append(kw)
+        )
+        provider = _gemini(
+            ttl=600, fail_cached=_api_error(404, "CachedContent not found")
+        )
+        details = provider.generate_node_details("A", "ctx")
+
+        assert details.definition == "d"
+        assert [cached for _, cached in provider.client.models.configs] == [
+            "cachedContents/1",
+            None,
+        ]
+        assert gemini._context_caches == {}
+        # The failed cached call is accounted too
+        assert [kw.get("success", True) for kw in calls] == [False, True]
+
+    def test_other_errors_keep_the_cache_and_are_not_retried(self):
+        provider = _gemini(ttl=600, fail_cached=_api_error(429, "Quota exceeded"))
+
+        with pytest.raises(errors.ClientError):
+            provider._complete(
+                "generate_raw", "instruction", "prompt", temperature=0, max_tokens=10
+            )
+
+        assert len(provider.client.models.configs) == 1
+        assert len(gemini._context_caches) == 1
+
+    def test_cache_creation_does_not_block_other_instructions(self):
+        provider = _gemini(ttl=600)
+        slow = provider.client.caches
+        slow.release = threading.Event()
+        creating = threading.Thread(
+            target=provider._cached_instruction, args=("slow instruction",)
+        )
+        creating.start()
+        assert slow.started.wait(timeout=5)
+
+        other = _gemini(ttl=600)
+        names = []
+        lookup = threading.Thread(
+            target=lambda: names.append(other._cached_instruction("other"))
+        )
+        lookup.start()
+        # Would wait for the slow creation if that held the registry lock
+        lookup.join(timeout=2)
+        assert names == ["cachedContents/1"]
+
+        slow.release.set()
+        creating.join()
+        assert slow.created == 1
+
+
+class FakeCompletions:
+    def __init__(self, usage):
+        self.calls = []
+        self.usage = usage
+
+    def create(self, model, messages, temperature, max_tokens):
+        self.calls.append(messages)
+        message = SimpleNamespace(content=DETAILS_JSON)
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=message)], usage=self.usage
+        )
+
+
+def _deepseek(usage):
+    provider = DeepSeekProvider(api_key="k")
+    completions = FakeCompletions(usage)
+    provider.client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+    return provider, completions
+
+
+class TestDeepSeekProvider:
+    def test_system_prompt_is_the_first_message(self):
+        provider, completions = _deepseek(None)
+        provider.generate_node_details("A", "ctx")
+
+        messages = completions.calls[0]
+        assert messages[0] == {
+            "role": "system",
+            "content": deepseek.NODE_DETAILS_SYSTEM_PROMPT,
+        }
+        assert messages[1]["role"] == "user"
+
+    def test_reports_deepseek_cache_hits(self, monkeypatch):
+        reported = _record_usage(monkeypatch, deepseek)
+        usage = SimpleNamespace(
+            prompt_tokens=200, prompt_cache_hit_tokens=150, completion_tokens=40
+        )
+        provider, _ = _deepseek(usage)
+        provider.generate_raw("hi")
+
+        operation, tokens = reported[0]
+        assert operation == "generate_raw"
+        assert (tokens.cached_tokens, tokens.uncached_tokens) == (150, 50)
+
+    def test_reports_openai_cached_tokens(self, monkeypatch):
+        reported = _record_usage(monkeypatch, deepseek)
+        usage = SimpleNamespace(
+            prompt_tokens=200,
+            prompt_tokens_details=SimpleNamespace(cached_tokens=128),
+            completion_tokens=40,
+        )
+        provider, _ = _deepseek(usage)
+        provider.generate_raw("hi")
+
+        assert reported[0][1].cached_tokens == 128
@@ -0,0 +1,140 @@
+"""Tests for recording provider traffic and replaying it offline."""
+
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from sparsemap.core.config import Settings
+from sparsemap.services import embedding, llm
+from sparsemap.services.cassette import Cassette, get_cassette
+from sparsemap.services.providers.deepseek import DeepSeekProvider
+from sparsemap.services.providers.replay import ReplayProvider
+
+GRAPH = {
+    "nodes": [{"id": "n1", "label": "A", "type": "main", "reason": "r"}],
+    "edges": [],
+    "summary": "s",
+}
+
+
+class FakeCompletions:
+    def __init__(self, contents):
+        self.contents = list(contents)
+
+    def create(self, model, messages, temperature, max_tokens):
+        message = SimpleNamespace(content=self.contents.pop(0))
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None)
+
+
+def _record(path, *contents) -> DeepSeekProvider:
+    provider = DeepSeekProvider(api_key="k", cassette=Cassette(path))
+    completions = FakeCompletions(contents)
+    provider.client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+    return provider
+
+
+class TestReplayProvider:
+    def test_replays_recorded_graphs(self, tmp_path):
+        path = tmp_path / "cassette.jsonl"
+        recorded = _record(path, json.dumps(GRAPH)).generate_graph([], "prompt")
+
+        replayed = ReplayProvider(Cassette(path)).generate_graph([], "prompt")
+
+        assert replayed == recorded
+
+    def test_replays_the_recorded_retry(self, tmp_path):
+        path = tmp_path / "cassette.jsonl"
+        _record(path, '{"nodes": "broken"}', json.dumps(GRAPH)).generate_graph(
+            [], "prompt"
+        )
+
+        replay = ReplayProvider(Cassette(path))
+        assert replay.generate_graph([], "prompt").nodes[0].label == "A"
+        # The workload can be replayed again
+        assert replay.generate_graph([], "prompt").nodes[0].label == "A"
+
+    def test_stops_on_unrepairable_responses_like_the_live_run(self, tmp_path):
+        path = tmp_path / "cassette.jsonl"
+        live = _record(path, "not json", json.dumps(GRAPH))
+        with pytest.raises(ValueError):
+            live.generate_graph([], "prompt")
+
+        cassette = Cassette(path)
+        replayed = []
+
+        def next_exchange(operation, prompt):
+            replayed.append(operation)
+            return Cassette.next_exchange(cassette, operation, prompt)
+
+        cassette.next_exchange = next_exchange
+        with pytest.raises(ValueError):
+            ReplayProvider(cassette).generate_graph([], "prompt")
+
+        # One recorded call, one replayed call
+        assert len(cassette) == len(replayed) == 1
+
+    def test_unrecorded_prompts_fail(self, tmp_path):
+        path = tmp_path / "cassette.jsonl"
+        _record(path, "raw").generate_raw("known")
+
+        replay = ReplayProvider(Cassette(path))
+        assert replay.generate_raw("known") == "raw"
+        with pytest.raises(ValueError):
+            replay.generate_raw("unknown")
+
+    def test_skips_invalid_lines(self, tmp_path):
+        path = tmp_path / "cassette.jsonl"
+        _record(path, "raw").generate_raw("known")
+        with path.open("a") as file:
+            file.write("not json\n")
+
+        assert len(Cassette(path)) == 1
+
+
+class FakeEmbeddings:
+    """Live embeddings that rank nodes unlike the synthetic replay vectors"""
+
+    def create(self, model, input, dimensions):
+        data = [
+            SimpleNamespace(index=i, embedding=[1.0, float(len(text) % 7)])
+            for i, text in enumerate(input)
+        ]
+        return SimpleNamespace(data=data)
+
+
+class TestReplayedWorkloads:
+    def test_integrate_concept_on_a_large_graph(self, tmp_path, monkeypatch):
+        path = tmp_path / "cassette.jsonl"
+        settings = Settings(
+            database_url="sqlite://",
+            llm_api_key="k",
+            llm_provider="deepseek",
+            llm_cassette=str(path),
+            llm_record=True,
+        )
+        monkeypatch.setattr(llm, "get_settings", lambda: settings)
+        monkeypatch.setattr(embedding, "get_settings", lambda: settings)
+        nodes = [
+            {"id": f"n{i}", "label": f"Concept {'x' * i}", "description": "d"}
+            for i in range(40)
+        ]
+        response = json.dumps({"node": {"id": "linked_1", "label": "New"}, "edges": []})
+
+        # Record: live chat and embedding calls
+        live = DeepSeekProvider(api_key="k", cassette=get_cassette(str(path)))
+        live.client = SimpleNamespace(
+            chat=SimpleNamespace(completions=FakeCompletions([response]))
+        )
+        with monkeypatch.context() as patched:
+            patched.setattr(llm, "_get_provider", lambda: live)
+            patched.setattr(
+                embedding,
+                "_get_embedding_client",
+                lambda: ("openai", SimpleNamespace(embeddings=FakeEmbeddings())),
+            )
+            recorded = llm.integrate_concept("New", nodes)
+
+        settings.llm_provider = "replay"
+        settings.llm_record = False
+        assert llm.integrate_concept("New", nodes) == recorded
@@ -0,0 +1,151 @@
+"""Tests for stored analyses, near-duplicate lookup and node content."""
+
+import pytest
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine
+
+from sparsemap.domain.models import (
+    AnalysisResult,
+    ExpandedNodeData,
+    Graph,
+    Node,
+    NodeDetails,
+    NodeDetailsRecord,
+    NodeExpansionRecord,
+    SimhashBand,
+)
+from sparsemap.services import repository
+from sparsemap.services.extractor import hash_content
+from sparsemap.services.similarity import hamming_distance, simhash
+
+ARTICLE = (
+    "Containers package an application with its dependencies so that it runs "
+    "the same way everywhere. Kubernetes schedules containers onto a cluster "
+    "of machines, restarts them when they fail and scales them with load. "
+    "Services give a stable address to a changing set of pods. "
+)
+
+
+@pytest.fixture
+def session():
+    engine = create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+    SQLModel.metadata.create_all(
+        engine,
+        tables=[
+            AnalysisResult.__table__,
+            SimhashBand.__table__,
+            NodeDetailsRecord.__table__,
+            NodeExpansionRecord.__table__,
+        ],
+    )
+    with Session(engine) as session:
+        yield session
+
+
+def _node(node_id: str, label: str, description: str = "d") -> Node:
+    return Node(
+        id=node_id, label=label, type="main", reason="r", description=description
+    )
+
+
+def _details(label: str) -> NodeDetails:
+    return NodeDetails(
+        definition=f"{label} def",
+        analogy="a",
+        importance="i",
+        actionable_step="s",
+        keywords=[],
+    )
+
+
+def _store(session, record, *node_ids):
+    graph = Graph.model_validate(record.graph_data)
+    for node in graph.nodes:
+        if node.id in node_ids:
+            repository.save_node_details(
+                session, record.id, node.id, node.label, _details(node.label)
+            )
+            repository.save_node_expansion(
+                session,
+                record.id,
+                node.id,
+                node.label,
+                ExpandedNodeData(child_nodes=[], new_edges=[]),
+            )
+
+
+def _save_text(session, text: str):
+    return repository.save_analysis(
+        session, hash_content(text), Graph(nodes=[], edges=[]), source_text=text
+    )
+
+
+class TestFindNearDuplicate:
+    @pytest.mark.parametrize(
+        "old, new", [("load", "loads"), ("machines", "machine"), ("stable", "static")]
+    )
+    def test_finds_a_single_word_edit(self, session, old, new):
+        record = _save_text(session, ARTICLE)
+        edited = ARTICLE.replace(old, new, 1)
+        # Farther apart than one 16-bit band of four would have found
+        assert 3 < hamming_distance(simhash(ARTICLE), simhash(edited)) <= 7
+
+        assert repository.find_near_duplicate(session, edited, 7).id == record.id
+
+    def test_returns_the_closest_analysis(self, session):
+        _save_text(session, ARTICLE.replace("load", "loads", 1))
+        closest = _save_text(session, ARTICLE.replace("restarts", "restart", 1))
+
+        assert repository.find_near_duplicate(session, ARTICLE, 7).id == closest.id
+
+    def test_ignores_analyses_beyond_max_distance(self, session):
+        _save_text(session, ARTICLE)
+        edited = ARTICLE.replace("load", "loads", 1)
+
+        assert repository.find_near_duplicate(session, edited, 3) is None
+        assert repository.find_near_duplicate(session, "向量数据库" * 40, 7) is None
+
+
+class TestNodeContent:
+    def test_save_replaces_previous_content(self, session):
+        repository.save_node_details(session, 1, "n1", "A", _details("A"))
+        repository.save_node_details(session, 1, "n1", "A", _details("B"))
+
+        stored = repository.get_node_details(session, 1, "n1", "A")
+        assert stored.definition == "B def"
+
+    def test_edited_nodes_are_invalidated(self, session):
+        graph = Graph(
+            nodes=[_node("n1", "A"), _node("n2", "B"), _node("n3", "C")], edges=[]
+        )
+        record = repository.save_analysis(session, "h", graph)
+        _store(session, record, "n1", "n2", "n3")
+
+        edited = Graph(
+            nodes=[_node("n1", "A"), _node("n2", "B", description="new")], edges=[]
+        )
+        repository.update_analysis_graph(session, record, edited)
+
+        details, expansions = repository.get_node_content(session, record.id, edited)
+        assert list(details) == ["n1"]
+        assert list(expansions) == ["n1"]
+        assert repository.get_node_details(session, record.id, "n3", "C") is None
+
+    def test_content_of_relabeled_nodes_is_not_returned(self, session):
+        graph = Graph(nodes=[_node("n1", "A")], edges=[])
+        repository.save_node_details(session, 1, "n1", "Old", _details("Old"))
+
+        details, _ = repository.get_node_content(session, 1, graph)
+        assert details == {}
+
+    def test_deleting_an_analysis_deletes_its_content(self, session):
+        record = repository.save_analysis(
+            session, "h", Graph(nodes=[_node("n1", "A")], edges=[])
+        )
+        _store(session, record, "n1")
+
+        assert repository.delete_analysis(session, record.id)
+        assert repository.get_node_details(session, record.id, "n1", "A") is None
+        assert repository.get_node_expansion(session, record.id, "n1", "A") is None
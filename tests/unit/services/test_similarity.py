@@ -0,0 +1,66 @@
+"""Tests for SimHash near-duplicate fingerprints."""
+
+import random
+
+import pytest
+
+from sparsemap.services import similarity
+
+ARTICLE = (
+    "Containers package an application with its dependencies so that it runs "
+    "the same way everywhere. Kubernetes schedules containers onto a cluster "
+    "of machines, restarts them when they fail and scales them with load. "
+    "Services give a stable address to a changing set of pods. "
+) * 4
+
+
+class TestSimhash:
+    def test_is_stable_across_whitespace_and_case(self):
+        assert similarity.simhash(ARTICLE) == similarity.simhash(
+            "  " + ARTICLE.upper().replace(" ", "\n")
+        )
+
+    def test_small_edit_changes_few_bits(self):
+        edited = ARTICLE.replace("restarts", "restart", 1)
+        distance = similarity.hamming_distance(
+            similarity.simhash(ARTICLE), similarity.simhash(edited)
+        )
+        assert distance <= 3
+
+    @pytest.mark.parametrize("length", [300, 1000])
+    def test_single_character_edits_are_within_the_band_guarantee(self, length):
+        rng = random.Random(length)
+        text = ARTICLE[:length]
+        fingerprint = similarity.simhash(text)
+        for _ in range(50):
+            i = rng.randrange(length)
+            edited = text[:i] + rng.choice("xyz") + text[i + 1 :]
+            distance = similarity.hamming_distance(
+                fingerprint, similarity.simhash(edited)
+            )
+            assert distance < similarity.SIMHASH_BANDS
+
+    def test_unrelated_texts_are_far_apart(self):
+        other = "向量数据库通过近似最近邻索引加速相似度搜索，适合语义检索场景。" * 6
+        distance = similarity.hamming_distance(
+            similarity.simhash(ARTICLE), similarity.simhash(other)
+        )
+        assert distance > 10
+
+    def test_empty_text(self):
+        assert similarity.simhash("   ") == 0
+
+
+class TestBands:
+    def test_bands_reassemble_fingerprint(self):
+        fingerprint = similarity.simhash(ARTICLE)
+        bands = similarity.simhash_bands(fingerprint)
+        assert [band for band, _ in bands] == list(range(similarity.SIMHASH_BANDS))
+        width = similarity.SIMHASH_BITS // similarity.SIMHASH_BANDS
+        assert sum(value << (band * width) for band, value in bands) == fingerprint
+
+    @pytest.mark.parametrize("fingerprint", [0, 1, (1 << 63) - 1, 1 << 63, 2**64 - 1])
+    def test_signed_round_trip(self, fingerprint):
+        signed = similarity.to_signed64(fingerprint)
+        assert -(1 << 63) <= signed < 1 << 63
+        assert similarity.from_signed64(signed) == fingerprint
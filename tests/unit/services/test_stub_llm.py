@@ -0,0 +1,111 @@
+"""Tests for the stub LLM used in load tests."""
+
+import pytest
+from fastapi.testclient import TestClient
+
+from sparsemap.api.stub import create_stub_app
+from sparsemap.core.config import Settings
+from sparsemap.domain.models import Graph
+from sparsemap.services import llm
+from sparsemap.services.providers.stub import StubProvider
+from sparsemap.services.stub_llm import StubLLM
+
+
+@pytest.fixture
+def stub(monkeypatch) -> StubLLM:
+    stub = StubLLM(graph_nodes=7)
+    settings = Settings(database_url="sqlite://", llm_api_key="stub")
+    monkeypatch.setattr(llm, "get_settings", lambda: settings)
+    monkeypatch.setattr(
+        llm,
+        "_get_provider",
+        lambda model=None, max_tokens=None: StubProvider(stub=stub),
+    )
+    return stub
+
+
+class TestStubLLM:
+    def test_graph_has_the_configured_size_and_is_deterministic(self, stub):
+        first = llm.analyze_contents([{"source": "text1", "text": "hello"}])
+        again = llm.analyze_contents([{"source": "text1", "text": "hello"}])
+        other = llm.analyze_contents([{"source": "text1", "text": "bye"}])
+
+        assert len(first.nodes) == 7
+        assert len(first.edges) == 6
+        assert first == again
+        assert first.nodes[0].label != other.nodes[0].label
+
+    def test_answers_every_prompt_kind(self, stub):
+        batch = llm.generate_node_details_batch(
+            [{"label": "A", "context": "a"}, {"label": "B", "context": "b"}]
+        )
+        expansions = llm.expand_nodes(
+            [{"id": "n1", "label": "A"}, {"id": "n2", "label": "B"}], None
+        )
+        integration = llm.integrate_concept(
+            "C", [{"id": "n1", "label": "A"}, {"id": "n2", "label": "B"}]
+        )
+
+        assert all(not isinstance(details, str) for details in batch)
+        assert [n.id for n in expansions["n2"].child_nodes] == [
+            "n2_sub1",
+            "n2_sub2",
+            "n2_sub3",
+        ]
+        assert [e["target"] for e in integration["edges"]] == ["n1", "n2"]
+
+    @pytest.mark.parametrize(
+        "distribution", ["fixed", "uniform", "exponential", "lognormal"]
+    )
+    def test_latency_sequence_is_seeded(self, distribution):
+        first = StubLLM(latency_ms=100, distribution=distribution, seed=3)
+        second = StubLLM(latency_ms=100, distribution=distribution, seed=3)
+
+        latencies = [first.next_latency() for _ in range(50)]
+        assert latencies == [second.next_latency() for _ in range(50)]
+        assert 0.05 < sum(latencies) / len(latencies) < 0.2
+
+    def test_rejects_unknown_distributions(self):
+        with pytest.raises(ValueError):
+            StubLLM(distribution="pareto")
+
+    def test_injected_failures_surface_as_value_errors(self):
+        provider = StubProvider(stub=StubLLM(error_rate=1.0))
+        with pytest.raises(ValueError):
+            provider.generate_raw("prompt")
+
+
+class TestStubServer:
+    def test_chat_completion_returns_a_graph(self):
+        client = TestClient(create_stub_app(StubLLM(graph_nodes=3)))
+        response = client.post(
+            "/v1/chat/completions",
+            json={
+                "model": "deepseek",
+                "messages": [
+                    {"role": "system", "content": "system"},
+                    {"role": "user", "content": "analyze this"},
+                ],
+            },
+        )
+
+        body = response.json()
+        graph = Graph.model_validate_json(body["choices"][0]["message"]["content"])
+        assert len(graph.nodes) == 3
+        assert body["usage"]["prompt_tokens"] > 0
+
+    def test_injected_failures_are_server_errors(self):
+        client = TestClient(create_stub_app(StubLLM(error_rate=1.0)))
+        response = client.post(
+            "/v1/chat/completions",
+            json={"messages": [{"role": "user", "content": "x"}]},
+        )
+        assert response.status_code == 500
+
+    def test_embeddings_are_unit_vectors(self):
+        client = TestClient(create_stub_app(StubLLM()))
+        response = client.post("/v1/embeddings", json={"input": ["a", "b"]})
+
+        data = response.json()["data"]
+        assert [item["index"] for item in data] == [0, 1]
+        assert sum(v * v for v in data[0]["embedding"]) == pytest.approx(1.0)
@@ -0,0 +1,78 @@
+"""Tests for LLM call accounting."""
+
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine, select
+
+from sparsemap.core.config import Settings
+from sparsemap.domain.models import LLMCall
+from sparsemap.services import repository, usage
+from sparsemap.services.llm_provider import TokenUsage
+
+
+@pytest.fixture
+def engine(monkeypatch):
+    engine = create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+    SQLModel.metadata.create_all(engine, tables=[LLMCall.__table__])
+    settings = Settings(
+        llm_api_key="k",
+        database_url="sqlite://",
+        llm_price_prompt_per_mtok=1.0,
+        llm_price_cached_per_mtok=0.25,
+        llm_price_completion_per_mtok=4.0,
+    )
+    monkeypatch.setattr(usage, "get_settings", lambda: settings)
+    usage.start_usage_recording(engine)
+    yield engine
+    usage.stop_usage_recording()
+
+
+def _tokens(prompt: int, cached: int, completion: int) -> TokenUsage:
+    return TokenUsage(
+        prompt_tokens=prompt, cached_tokens=cached, completion_tokens=completion
+    )
+
+
+class TestRecordLLMCall:
+    def test_is_a_no_op_until_recording_starts(self):
+        assert usage.record_llm_call("Gemini", "m", "generate_raw", None, 5) is None
+
+    def test_attributes_calls_to_the_current_endpoint(self, engine):
+        with usage.llm_endpoint("POST /api/analyze"):
+            usage.record_llm_call(
+                "Gemini", "m", "generate_graph", _tokens(1000, 400, 200), 1500
+            )
+        usage.record_llm_call("Gemini", "m", "generate_raw", None, 10)
+
+        with Session(engine) as session:
+            calls = session.exec(select(LLMCall).order_by(LLMCall.id)).all()
+        assert [call.endpoint for call in calls] == ["POST /api/analyze", "other"]
+        # 600 uncached at $1, 400 cached at $0.25, 200 completion at $4 per 1M
+        assert calls[0].cost_usd == pytest.approx(0.0015)
+
+    def test_usage_is_aggregated_per_endpoint(self, engine):
+        with usage.llm_endpoint("job"):
+            usage.record_llm_call(
+                "Gemini", "m", "generate_graph", _tokens(100, 0, 50), 100
+            )
+            usage.record_llm_call(
+                "Gemini", "m", "generate_graph", None, 300, attempt=1, success=False
+            )
+        with usage.llm_endpoint("prefetch"):
+            usage.record_llm_call("Gemini", "m", "generate_raw", _tokens(10, 0, 5), 20)
+
+        with Session(engine) as session:
+            stats = repository.llm_usage_by_endpoint(
+                session, datetime.utcnow() - timedelta(hours=1)
+            )
+
+        assert [entry.endpoint for entry in stats] == ["job", "prefetch"]
+        job = stats[0]
+        assert (job.calls, job.failures, job.retries) == (2, 1, 1)
+        assert (job.prompt_tokens, job.completion_tokens) == (100, 50)
+        assert job.avg_latency_ms == 200
+        assert job.max_latency_ms == 300